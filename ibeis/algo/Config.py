@@ -233,7 +233,7 @@ class NNConfig(ConfigBase):
         # number of annots before a new multi-indexer is built
         # nn_cfg.max_subindexers = 2
         # nn_cfg.valid_index_methods = ['single', 'multi', 'name']
-        nn_cfg.valid_index_methods = ['single']
+        nn_cfg.valid_index_methods = ['single', 'sharded']
         nn_cfg.update(**kwargs)
 
     def make_feasible(nn_cfg):
@@ -246,6 +246,9 @@ class NNConfig(ConfigBase):
         param_info_list = ut.flatten([
             [
                 ut.ParamInfo('index_method', 'single', ''),
+                # number of consecutive aids covered by each sharded subindex
+                ut.ParamInfo('shard_size', 2000, 'shsz', type_=int,
+                             hideif=lambda cfg: cfg['index_method'] != 'sharded'),
                 ut.ParamInfo('K', 4, type_=int),
                 ut.ParamInfo('Knorm', 1, 'Kn='),
                 ut.ParamInfo('use_k_padding', False, 'padk='),
@@ -284,6 +287,9 @@ class SpatialVerifyConfig(ConfigBase):
         sv_cfg.refine_method = 'homog'
         # weight feature scores with sver errors
         sv_cfg.weight_inliers = True
+        # number of worker processes (does not change results, so it is not
+        # part of the cfgstr)
+        sv_cfg.sver_workers = 0
         sv_cfg.update(**kwargs)
 
     def get_cfgstr_list(sv_cfg, **kwargs):
@@ -62,9 +62,61 @@ class Feedback(object):
         if aid2 not in infr.aids_set:
             raise ValueError('aid2=%r is not part of the graph' % (aid2,))
 
-    def add_feedback_from(infr, items, verbose=None, **kwargs):
+    def add_feedback_from(infr, items, verbose=None, batch=False, **kwargs):
+        """
+        Adds multiple reviews.
+
+        Args:
+            items (list or pd.DataFrame): edges, (edge, decision) tuples, or
+                a frame indexed by (aid1, aid2)
+            batch (bool): if True, each review is recorded but dynamic
+                inference is deferred. It is then recomputed once for all
+                PCCs touched by the reviews. The result is the state that
+                apply_nondynamic_update gives after sequential application.
+
+        Doctest:
+            >>> from ibeis.algo.graph.core import *  # NOQA
+            >>> from ibeis.algo.graph import demo
+            >>> kwargs = dict(num_pccs=6, size=5, p_incon=.3)
+            >>> infr1 = demo.demodata_infr(**kwargs)
+            >>> infr2 = demo.demodata_infr(**kwargs)
+            >>> ccs = list(map(sorted, infr1.positive_components()))
+            >>> items = [((ccs[0][0], ccs[1][0]), POSTV),
+            >>>          ((ccs[0][1], ccs[0][2]), NEGTV),
+            >>>          ((ccs[2][0], ccs[3][0]), NEGTV),
+            >>>          ((ccs[4][0], ccs[4][1]), INCMP)]
+            >>> infr1.add_feedback_from(items)
+            >>> infr1.apply_nondynamic_update()
+            >>> infr2.add_feedback_from(items, batch=True)
+            >>> assert (sorted(map(sorted, infr1.positive_components())) ==
+            >>>         sorted(map(sorted, infr2.positive_components())))
+            >>> assert infr1.pos_redun_nids == infr2.pos_redun_nids
+            >>> assert infr1.nid_to_errors == infr2.nid_to_errors
+            >>> assert (set(ut.estarmap(nxu.e_, infr1.neg_redun_metagraph.edges())) ==
+            >>>         set(ut.estarmap(nxu.e_, infr2.neg_redun_metagraph.edges())))
+            >>> assert (infr1.get_edge_attrs('inferred_state') ==
+            >>>         infr2.get_edge_attrs('inferred_state'))
+        """
         if verbose is None:
             verbose = infr.verbose > 5
+        batch = (batch and infr.params['inference.enabled'] and
+                 not infr.test_mode and infr._batch_nodes is None)
+        if batch:
+            infr._batch_nodes = set()
+            infr._batch_old_nids = set()
+            try:
+                infr._add_feedback_from(items, verbose, **kwargs)
+            finally:
+                nodes = infr._batch_nodes
+                old_nids = infr._batch_old_nids
+                infr._batch_nodes = None
+                infr._batch_old_nids = None
+                nids = set(infr.pos_graph.node_labels(*nodes))
+                infr.apply_component_update(nids, old_nids)
+        else:
+            infr._add_feedback_from(items, verbose, **kwargs)
+
+    def _add_feedback_from(infr, items, verbose, **kwargs):
         if isinstance(items, pd.DataFrame):
             if list(items.index.names) == ['aid1', 'aid2']:
                 for edge, data in items.iterrows():
@@ -242,7 +294,13 @@ class Feedback(object):
         # must happen after dynamic test callback
         infr.set_edge_attr(edge, {'decision': decision})
 
-        if infr.params['inference.enabled']:
+        if infr._batch_nodes is not None:
+            # Inference is deferred until the end of add_feedback_from
+            infr._batch_old_nids.update(infr.pos_graph.node_labels(*edge))
+            infr._batch_nodes.update(edge)
+            action = None
+            infr._add_review_edge(edge, decision)
+        elif infr.params['inference.enabled']:
             assert infr.dirty is False, (
                 'need to recompute before dynamic inference continues')
             # Update priority queue based on the new edge
@@ -256,7 +314,7 @@ class Feedback(object):
             infr.dirty = True
             infr._add_review_edge(edge, decision)
 
-        if infr.params['inference.enabled'] and infr.refresh:
+        if infr.params['inference.enabled'] and infr.refresh and action:
             # only add to criteria if this wasn't requested as a fix edge
             if priority is not None and priority <= 1.0:
                 meaningful = bool({'merge', 'split'} & set(action))
@@ -1198,6 +1256,9 @@ class AnnotInference(ut.NiceRepr,
         # NEW VERSION: metagraph of PCCs with ANY number of negative edges
         # between them. The weight on the edge should represent the strength.
         infr.neg_metagraph = infr._graph_cls()
+        # Nodes and prior PCC labels touched by a batch of feedback
+        infr._batch_nodes = None
+        infr._batch_old_nids = None
 
         infr.print('__init__ feedback', level=1)
 
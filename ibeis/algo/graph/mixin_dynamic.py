@@ -820,6 +820,19 @@ class _RedundancyComputers(object):
             return True  # assumes cc is connected
         if relax is None:
             relax = True
+        label = infr.pos_graph.get_component_label(cc)
+        if label is not None:
+            # The pos graph maintains a connectivity certificate of each PCC
+            if infr.pos_graph.is_component_k_edge_connected(label, k):
+                return True
+            if relax:
+                n_incomp = sum(1 for _ in nxu.edges_inside(infr.incomp_graph,
+                                                           cc))
+                n_pos = sum(len(infr.pos_graph.adj[u]) for u in cc) // 2
+                n_nodes = len(cc)
+                n_max = (n_nodes * (n_nodes - 1)) // 2
+                return n_max == (n_pos + n_incomp)
+            return False
         pos_subgraph = infr.pos_graph.subgraph(cc, dynamic=False)
         if relax:
             # If we cannot add any more edges to the subgraph then we consider
@@ -1294,37 +1307,7 @@ class NonDynamicUpdate(object):
         # Cluster edges by category
         ne_to_edges = infr.collapsed_meta_edges()
         categories = infr.categorize_edges(graph, ne_to_edges)
-
-        infr.set_edge_attrs(
-            'inferred_state',
-            ut.dzip(ut.flatten(categories[POSTV].values()), ['same'])
-        )
-        infr.set_edge_attrs(
-            'inferred_state',
-            ut.dzip(ut.flatten(categories[NEGTV].values()), ['diff'])
-        )
-        infr.set_edge_attrs(
-            'inferred_state',
-            ut.dzip(ut.flatten(categories[INCMP].values()), [INCMP])
-        )
-        infr.set_edge_attrs(
-            'inferred_state',
-            ut.dzip(ut.flatten(categories[UNKWN].values()), [UNKWN])
-        )
-        infr.set_edge_attrs(
-            'inferred_state',
-            ut.dzip(ut.flatten(categories[UNREV].values()), [None])
-        )
-        infr.set_edge_attrs(
-            'inferred_state',
-            ut.dzip(ut.flatten(categories['inconsistent_internal'].values()),
-                    ['inconsistent_internal'])
-        )
-        infr.set_edge_attrs(
-            'inferred_state',
-            ut.dzip(ut.flatten(categories['inconsistent_external'].values()),
-                    ['inconsistent_external'])
-        )
+        infr._set_inferred_states(categories)
 
         # Ensure bookkeeping is taken care of
         # * positive redundancy
@@ -1368,6 +1351,135 @@ class NonDynamicUpdate(object):
         if graph is None:
             infr.dirty = False
 
+    def _set_inferred_states(infr, categories):
+        """ sets the inferred_state of the edges in each category """
+        category_states = [
+            (POSTV, 'same'),
+            (NEGTV, 'diff'),
+            (INCMP, INCMP),
+            (UNKWN, UNKWN),
+            (UNREV, None),
+            ('inconsistent_internal', 'inconsistent_internal'),
+            ('inconsistent_external', 'inconsistent_external'),
+        ]
+        for key, state in category_states:
+            infr.set_edge_attrs(
+                'inferred_state',
+                ut.dzip(ut.flatten(categories[key].values()), [state])
+            )
+
+    @profile
+    def apply_component_update(infr, nids, old_nids=()):
+        r"""
+        Recomputes the dynamic bookkeeping of a few PCCs after their reviews
+        were changed without dynamic inference. This has the same result as
+        apply_nondynamic_update, but only touches the PCCs labeled by `nids`
+        and the edges incident to them.
+
+        Args:
+            nids (set): current labels of all PCCs with changed reviews
+            old_nids (set): labels these PCCs had before the changes
+
+        CommandLine:
+            python -m ibeis.algo.graph.mixin_dynamic apply_component_update
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from ibeis.algo.graph.mixin_dynamic import *  # NOQA
+            >>> from ibeis.algo.graph import demo
+            >>> infr = demo.demodata_infr(num_pccs=5, size=5, p_incon=.5)
+            >>> cc1, cc2 = list(map(sorted, infr.positive_components()))[0:2]
+            >>> edge1, edge2 = (cc1[0], cc2[0]), (cc1[1], cc1[2])
+            >>> old_nids = set(infr.pos_graph.node_labels(*(edge1 + edge2)))
+            >>> infr.ensure_edges_from([edge1, edge2])
+            >>> infr._add_review_edge(edge1, POSTV)
+            >>> infr._add_review_edge(edge2, NEGTV)
+            >>> nids = set(infr.pos_graph.node_labels(*(edge1 + edge2)))
+            >>> infr.apply_component_update(nids, old_nids)
+            >>> states1 = infr.get_edge_attrs('inferred_state')
+            >>> errors1 = infr.nid_to_errors.copy()
+            >>> redun1 = infr.pos_redun_nids.copy()
+            >>> infr.apply_nondynamic_update()
+            >>> assert states1 == infr.get_edge_attrs('inferred_state')
+            >>> assert errors1 == infr.nid_to_errors
+            >>> assert redun1 == infr.pos_redun_nids
+        """
+        pos_graph = infr.pos_graph
+        nids = set(nids)
+        stale_nids = nids.union(old_nids)
+        ccs = {nid: pos_graph.component(nid) for nid in nids}
+        nodes = set(ut.flatten(ccs.values()))
+        infr.print('apply_component_update nPCCs={} nNodes={}'.format(
+            len(nids), len(nodes)), 1)
+
+        # Cluster the edges incident to the PCCs by category. Unchanged PCCs
+        # keep their inconsistency status.
+        states = (POSTV, NEGTV, INCMP, UNREV, UNKWN)
+        ne_to_edges = {key: ut.ddict(set) for key in states}
+        for key in states:
+            for u, v in infr.review_graphs[key].edges(nodes):
+                nid1, nid2 = pos_graph.node_labels(u, v)
+                ne_to_edges[key][infr.e_(nid1, nid2)].add(infr.e_(u, v))
+        categories = infr.categorize_edges(ne_to_edges=ne_to_edges)
+        other_incon_nids = set(infr.nid_to_errors) - stale_nids
+        incon_external = categories['inconsistent_external']
+        for key in (NEGTV,) + UNINFERABLE:
+            for ne in list(categories[key].keys()):
+                if not other_incon_nids.isdisjoint(ne):
+                    edges = categories[key].pop(ne)
+                    incon_external[ne] = incon_external.get(ne, set()) | edges
+        infr._set_inferred_states(categories)
+
+        if infr.params['inference.update_attrs']:
+            for nid, cc in ccs.items():
+                infr.set_node_attrs('name_label', ut.dzip(cc, [nid]))
+
+        # Negative metagraph
+        nmg = infr.neg_metagraph
+        nmg.remove_nodes_from([n for n in stale_nids if nmg.has_node(n)])
+        nmg.add_nodes_from(nids)
+        for (nid1, nid2), edges in ne_to_edges[NEGTV].items():
+            nmg.add_edge(nid1, nid2, weight=len(edges))
+
+        # Inconsistency
+        for nid in stale_nids:
+            if nid in infr.nid_to_errors:
+                infr._purge_error_edges(nid)
+        recover_graph = infr.recover_graph
+        recover_graph.remove_nodes_from(
+            [n for n in nodes if recover_graph.has_node(n)])
+        for nid in categories['inconsistent_internal'].keys():
+            cc = ccs[nid]
+            pos_subgraph = pos_graph.subgraph(cc, dynamic=False).copy()
+            neg_edges = list(nxu.edges_inside(infr.neg_graph, cc))
+            hypothesis = dict(infr.hypothesis_errors(pos_subgraph, neg_edges))
+            infr._set_error_edges(nid, set(hypothesis.keys()))
+            recover_graph.add_edges_from(pos_subgraph.edges())
+
+        # Redundancy
+        infr.pos_redun_nids.difference_update(stale_nids)
+        nrmg = infr.neg_redun_metagraph
+        nrmg.remove_nodes_from([n for n in stale_nids if nrmg.has_node(n)])
+        for nid, cc in ccs.items():
+            is_consistent = nid not in infr.nid_to_errors
+            if is_consistent and infr.is_pos_redundant(cc):
+                infr.pos_redun_nids.add(nid)
+            for nid2 in infr.find_neg_redun_nids_to(cc):
+                # Like find_neg_redun_nids, the lower nid must be consistent
+                if nid2 != nid and min(nid, nid2) not in infr.nid_to_errors:
+                    nrmg.add_edge(nid, nid2)
+
+        # Priority of the unreviewed edges touching the PCCs
+        if infr.queue is not None:
+            maybe_error_edges = set(infr.maybe_error_edges())
+            unrev_edges = [
+                infr.e_(u, v) for u, v in infr.unreviewed_graph.edges(nodes)]
+            unrev_edges = [e for e in unrev_edges if e not in maybe_error_edges]
+            flags = list(map(infr.is_flagged_as_redun, unrev_edges))
+            infr._remove_edge_priority(ut.compress(unrev_edges, flags))
+            infr._reinstate_edge_priority(
+                ut.compress(unrev_edges, ut.not_list(flags)))
+
     @profile
     def collapsed_meta_edges(infr, graph=None):
         """
@@ -1389,10 +1501,7 @@ class NonDynamicUpdate(object):
                 else:
                     rev_graph[key] = rev_graph[key].subgraph(nodes)
 
-        # TODO: Rebalance union find to ensure parents is a single lookup
-        # infr.pos_graph._union_find.rebalance(nodes)
-        # node_to_label = infr.pos_graph._union_find.parents
-        node_to_label = infr.pos_graph._union_find
+        node_to_label = infr.pos_graph.node_label_lookup()
 
         # Get reviewed edges using fast lookup structures
         ne_to_edges = {
@@ -3,7 +3,8 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import utool as ut
 import networkx as nx
 import itertools as it
-from ibeis.algo.graph.nx_utils import edges_inside, e_
+from collections import defaultdict
+from ibeis.algo.graph.nx_utils import edges_inside, e_, is_k_edge_connected
 print, rrr, profile = ut.inject2(__name__)
 
 
@@ -116,6 +117,479 @@ class nx_UnionFind(object):
                 self.parents[x] = x
 
 
+class _EulerTourNode(object):
+    """
+    Element of an Euler tour sequence stored in a treap. Elements are either
+    vertex loops (one per node) or arcs (two per tree edge). Each element
+    aggregates over its subtree the number of elements, the number of
+    vertices, the minimum vertex and whether any element is flagged.
+    """
+    __slots__ = ('key', 'is_vert', 'prio', 'left', 'right', 'parent', 'size',
+                 'nverts', 'minkey', 'own_t', 'own_n', 'flag_t', 'flag_n')
+
+    def __init__(node, key, is_vert, prio):
+        node.key = key
+        node.is_vert = is_vert
+        node.prio = prio
+        node.left = None
+        node.right = None
+        node.parent = None
+        node.own_t = False
+        node.own_n = False
+        node._update()
+
+    def _update(node):
+        node.size = 1
+        if node.is_vert:
+            node.nverts = 1
+            node.minkey = node.key
+        else:
+            node.nverts = 0
+            node.minkey = None
+        node.flag_t = node.own_t
+        node.flag_n = node.own_n
+        for child in (node.left, node.right):
+            if child is not None:
+                node.size += child.size
+                node.nverts += child.nverts
+                if child.minkey is not None and (
+                      node.minkey is None or child.minkey < node.minkey):
+                    node.minkey = child.minkey
+                node.flag_t |= child.flag_t
+                node.flag_n |= child.flag_n
+
+
+def _treap_merge(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a.prio > b.prio:
+        a.right = _treap_merge(a.right, b)
+        a.right.parent = a
+        a._update()
+        return a
+    else:
+        b.left = _treap_merge(a, b.left)
+        b.left.parent = b
+        b._update()
+        return b
+
+
+def _treap_split(node, k):
+    """ splits the first k elements from the rest """
+    if node is None:
+        return None, None
+    lsize = 0 if node.left is None else node.left.size
+    if k <= lsize:
+        left, right = _treap_split(node.left, k)
+        node.left = right
+        if right is not None:
+            right.parent = node
+        node._update()
+        return left, node
+    else:
+        left, right = _treap_split(node.right, k - lsize - 1)
+        node.right = left
+        if left is not None:
+            left.parent = node
+        node._update()
+        return node, right
+
+
+def _treap_index(node):
+    idx = 0 if node.left is None else node.left.size
+    while node.parent is not None:
+        parent = node.parent
+        if node is parent.right:
+            idx += 1 + (0 if parent.left is None else parent.left.size)
+        node = parent
+    return idx
+
+
+def _treap_root(node):
+    while node.parent is not None:
+        node = node.parent
+    return node
+
+
+def _detach(*roots):
+    for root in roots:
+        if root is not None:
+            root.parent = None
+    return roots
+
+
+class _EulerTourForest(object):
+    """
+    A spanning forest where each tree is stored as its Euler tour in a
+    balanced binary search tree (treap). Link, cut and connectivity checks
+    are O(lg(n)).
+    """
+
+    def __init__(forest, rng):
+        forest.rng = rng
+        forest.verts = {}
+        forest.arcs = {}
+
+    def vert(forest, u):
+        try:
+            return forest.verts[u]
+        except KeyError:
+            loop = _EulerTourNode(u, True, forest.rng.random())
+            forest.verts[u] = loop
+            return loop
+
+    def root(forest, u):
+        return _treap_root(forest.vert(u))
+
+    def connected(forest, u, v):
+        return forest.root(u) is forest.root(v)
+
+    def tree_size(forest, u):
+        return forest.root(u).nverts
+
+    def _reroot(forest, u):
+        """ rotates the tour of u's tree so it starts at u """
+        loop = forest.vert(u)
+        root = _treap_root(loop)
+        left, right = _detach(*_treap_split(root, _treap_index(loop)))
+        return _treap_merge(right, left)
+
+    def link(forest, u, v):
+        tour_u = forest._reroot(u)
+        tour_v = forest._reroot(v)
+        arc_uv = _EulerTourNode((u, v), False, forest.rng.random())
+        arc_vu = _EulerTourNode((v, u), False, forest.rng.random())
+        forest.arcs[(u, v)] = arc_uv
+        forest.arcs[(v, u)] = arc_vu
+        tour = _treap_merge(_treap_merge(tour_u, arc_uv),
+                            _treap_merge(tour_v, arc_vu))
+        tour.parent = None
+        return arc_uv, arc_vu
+
+    def cut(forest, u, v):
+        arc_uv = forest.arcs.pop((u, v))
+        arc_vu = forest.arcs.pop((v, u))
+        idx1 = _treap_index(arc_uv)
+        idx2 = _treap_index(arc_vu)
+        if idx1 > idx2:
+            idx1, idx2 = idx2, idx1
+        root = _treap_root(arc_uv)
+        # tour = A + [arc1] + B + [arc2] + C
+        rest, right = _detach(*_treap_split(root, idx2))
+        _, part_c = _detach(*_treap_split(right, 1))
+        part_a, rest = _detach(*_treap_split(rest, idx1))
+        _, part_b = _detach(*_treap_split(rest, 1))
+        tour = _treap_merge(part_a, part_c)
+        if tour is not None:
+            tour.parent = None
+
+    def set_flag(forest, node, attr, flag):
+        if getattr(node, attr) == flag:
+            return
+        setattr(node, attr, flag)
+        while node is not None:
+            node._update()
+            node = node.parent
+
+    def iter_flagged(forest, root, kind):
+        """ all elements in a tree with their own flag of kind t or n set """
+        flag_attr, own_attr = 'flag_' + kind, 'own_' + kind
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node is None or not getattr(node, flag_attr):
+                continue
+            if getattr(node, own_attr):
+                yield node
+            stack.append(node.left)
+            stack.append(node.right)
+
+    def first_flagged(forest, root, kind):
+        flag_attr, own_attr = 'flag_' + kind, 'own_' + kind
+        node = root
+        if node is None or not getattr(node, flag_attr):
+            return None
+        while True:
+            if node.left is not None and getattr(node.left, flag_attr):
+                node = node.left
+            elif getattr(node, own_attr):
+                return node
+            else:
+                node = node.right
+
+    def iter_tree_nodes(forest, u):
+        """ all vertices in the tree of u """
+        stack = [forest.root(u)]
+        while stack:
+            node = stack.pop()
+            if node is None or node.nverts == 0:
+                continue
+            if node.is_vert:
+                yield node.key
+            stack.append(node.left)
+            stack.append(node.right)
+
+
+class DynamicConnectivity(object):
+    """
+    Fully dynamic connectivity of Holm, de Lichtenberg and Thorup.
+
+    Each edge has a level. Forest F_i is a spanning forest of the edges with
+    level >= i, and F_0 is a spanning forest of the entire graph. When a tree
+    edge is deleted the smaller half of the split tree is searched for a
+    replacement edge, and every edge examined without success has its level
+    increased. Edges are promoted at most lg(n) times, which gives
+    amortized O(lg^2(n)) insertion and deletion and O(lg(n)) connectivity
+    checks.
+
+    References:
+        http://www.cs.princeton.edu/courses/archive/spr10/cos423/handouts/NearOpt.pdf
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.graph.nx_dynamic_graph import *  # NOQA
+        >>> dyncon = DynamicConnectivity()
+        >>> assert dyncon.insert(1, 2) and dyncon.insert(2, 3)
+        >>> assert not dyncon.insert(1, 3)
+        >>> assert not dyncon.delete(1, 2)
+        >>> assert dyncon.connected(1, 2)
+        >>> assert dyncon.delete(2, 3)
+        >>> assert dyncon.connected(1, 3) and not dyncon.connected(1, 2)
+    """
+
+    def __init__(dyncon, seed=0):
+        import random
+        dyncon.rng = random.Random(seed)
+        dyncon.forests = [_EulerTourForest(dyncon.rng)]
+        dyncon.level = {}
+        dyncon.tree_edges = set()
+        dyncon.nontree = [defaultdict(set)]
+
+    def _ensure_level(dyncon, i):
+        while len(dyncon.forests) <= i:
+            dyncon.forests.append(_EulerTourForest(dyncon.rng))
+            dyncon.nontree.append(defaultdict(set))
+
+    def add_node(dyncon, u):
+        dyncon.forests[0].vert(u)
+
+    def remove_node(dyncon, u):
+        """ the node must not have any edges """
+        for i, forest in enumerate(dyncon.forests):
+            forest.verts.pop(u, None)
+            dyncon.nontree[i].pop(u, None)
+
+    def connected(dyncon, u, v):
+        return dyncon.forests[0].connected(u, v)
+
+    def root(dyncon, u):
+        return dyncon.forests[0].root(u)
+
+    def _set_tree_flag(dyncon, i, e, flag):
+        forest = dyncon.forests[i]
+        forest.set_flag(forest.arcs[e], 'own_t', flag)
+
+    def _update_nontree_flag(dyncon, i, u):
+        forest = dyncon.forests[i]
+        flag = bool(dyncon.nontree[i].get(u))
+        forest.set_flag(forest.vert(u), 'own_n', flag)
+
+    def _add_nontree(dyncon, i, u, v):
+        dyncon._ensure_level(i)
+        dyncon.level[e_(u, v)] = i
+        dyncon.nontree[i][u].add(v)
+        dyncon.nontree[i][v].add(u)
+        dyncon._update_nontree_flag(i, u)
+        dyncon._update_nontree_flag(i, v)
+
+    def _remove_nontree(dyncon, i, u, v):
+        dyncon.nontree[i][u].discard(v)
+        dyncon.nontree[i][v].discard(u)
+        dyncon._update_nontree_flag(i, u)
+        dyncon._update_nontree_flag(i, v)
+
+    def _add_tree(dyncon, i, e):
+        dyncon._ensure_level(i)
+        dyncon.level[e] = i
+        dyncon.tree_edges.add(e)
+        for j in range(i + 1):
+            dyncon.forests[j].link(*e)
+        dyncon._set_tree_flag(i, e, True)
+
+    def insert(dyncon, u, v):
+        """
+        Adds an edge. Returns True if it connects two components.
+        """
+        if u == v:
+            return False
+        e = e_(u, v)
+        if e in dyncon.level:
+            return False
+        if dyncon.forests[0].connected(u, v):
+            dyncon._add_nontree(0, u, v)
+            return False
+        else:
+            dyncon._add_tree(0, e)
+            return True
+
+    def delete(dyncon, u, v):
+        """
+        Removes an edge. Returns True if it splits a component.
+        """
+        e = e_(u, v)
+        if e not in dyncon.level:
+            return False
+        lvl = dyncon.level.pop(e)
+        if e not in dyncon.tree_edges:
+            dyncon._remove_nontree(lvl, u, v)
+            return False
+        dyncon.tree_edges.remove(e)
+        for i in range(lvl + 1):
+            dyncon.forests[i].cut(*e)
+        for i in range(lvl, -1, -1):
+            if dyncon._replace(i, u, v):
+                return False
+        return True
+
+    def _replace(dyncon, i, u, v):
+        """
+        Searches the smaller side of the cut at level i for a replacement
+        edge and pushes the examined edges to level i + 1.
+        """
+        forest = dyncon.forests[i]
+        if forest.tree_size(u) > forest.tree_size(v):
+            u, v = v, u
+        dyncon._ensure_level(i + 1)
+        small = forest.root(u)
+        # The smaller tree becomes a tree in F_{i + 1}
+        promote = [arc.key for arc in forest.iter_flagged(small, 't')]
+        for e in promote:
+            dyncon._set_tree_flag(i, e, False)
+            dyncon.level[e] = i + 1
+            dyncon.forests[i + 1].link(*e)
+            dyncon._set_tree_flag(i + 1, e, True)
+        nontree = dyncon.nontree[i]
+        while True:
+            loop = forest.first_flagged(small, 'n')
+            if loop is None:
+                return False
+            x = loop.key
+            for y in list(nontree[x]):
+                if forest.root(y) is small:
+                    dyncon._remove_nontree(i, x, y)
+                    dyncon._add_nontree(i + 1, x, y)
+                else:
+                    dyncon._remove_nontree(i, x, y)
+                    dyncon._add_tree(i, e_(x, y))
+                    return True
+
+
+class SparseCertificate(object):
+    """
+    Sparse certificate for k-edge-connectivity (Nagamochi and Ibaraki).
+
+    The certificate is the union of k forests, where F_i is a maximal spanning
+    forest of the graph without the edges of F_1, ..., F_{i - 1}. It has at
+    most k * (n - 1) edges, and the certificate of a connected component is
+    k-edge-connected if and only if the component is.
+
+    Inserting an edge adds it to the first forest where it joins two trees,
+    which is O(k lg(n)). Deleting a certificate edge leaves the forests
+    non-maximal until the affected component is rebuilt.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.graph.nx_dynamic_graph import *  # NOQA
+        >>> G = nx.complete_graph(6)
+        >>> cert = SparseCertificate(k=2)
+        >>> cert.rebuild(G.nodes(), G.edges())
+        >>> H = cert.subgraph(G.nodes())
+        >>> # the second forest cannot reach the center of the first star
+        >>> assert H.number_of_edges() == 2 * (6 - 1) - 1
+        >>> assert is_k_edge_connected(H, k=2)
+    """
+
+    def __init__(cert, k, seed=0):
+        import random
+        rng = random.Random(seed)
+        cert.k = k
+        cert.forests = [_EulerTourForest(rng) for _ in range(k)]
+        cert.edge_forest = {}
+        cert.adj = defaultdict(set)
+
+    def add_edge(cert, u, v):
+        """ Returns True if the edge becomes part of the certificate """
+        if u == v:
+            return False
+        e = e_(u, v)
+        if e in cert.edge_forest:
+            return False
+        for i, forest in enumerate(cert.forests):
+            if not forest.connected(u, v):
+                forest.link(*e)
+                cert.edge_forest[e] = i
+                cert.adj[u].add(v)
+                cert.adj[v].add(u)
+                return True
+        return False
+
+    def remove_edge(cert, u, v):
+        """ Returns True if the edge was part of the certificate """
+        e = e_(u, v)
+        i = cert.edge_forest.pop(e, None)
+        if i is None:
+            return False
+        cert.forests[i].cut(*e)
+        cert.adj[u].discard(v)
+        cert.adj[v].discard(u)
+        return True
+
+    def rebuild(cert, nodes, edges):
+        """
+        Recomputes the forests over a set of nodes that is closed under the
+        graph (e.g. a connected component), given all edges inside it.
+        """
+        for u in nodes:
+            for v in list(cert.adj.get(u, ())):
+                cert.remove_edge(u, v)
+        for u, v in edges:
+            cert.add_edge(u, v)
+
+    def remove_node(cert, n):
+        """ the node must not have any edges """
+        for forest in cert.forests:
+            forest.verts.pop(n, None)
+        cert.adj.pop(n, None)
+
+    def subgraph(cert, nodes):
+        """ the certificate edges inside nodes """
+        H = nx.Graph()
+        H.add_nodes_from(nodes)
+        H.add_edges_from((u, v) for u in nodes for v in cert.adj.get(u, ()))
+        return H
+
+
+class _Component(object):
+    """ the node set of a connected component and its label """
+    __slots__ = ('label', 'nodes')
+
+    def __init__(cc, label, nodes):
+        cc.label = label
+        cc.nodes = nodes
+
+
+class _NodeLabelLookup(object):
+    """ read-only mapping from a node to its component label """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, node):
+        return self.graph.node_label(node)
+
+
 class DynConnGraph(nx.Graph, GraphHelperMixin):
     """
     Dynamically connected graph.
@@ -131,7 +605,15 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
     * UnionFind2       |    n*     |    n     |  1
     * EulerTourForest  | lg^2(n)   | lg^2(n)  |  lg(n) / lglg(n) - - Ammortized
 
-    * it seems to be very quick
+    This uses the EulerTourForest levels of DynamicConnectivity. Each
+    component is labeled by its smallest node. A merge moves the nodes of the
+    smaller component into the larger one and a split only enumerates the
+    nodes on the smaller side of the cut, so neither operation touches the
+    entire component.
+
+    Queries for the k-edge-connectivity of a component use a SparseCertificate
+    that is maintained with the edges once k has been asked for. Results are
+    cached per component until its certificate changes.
 
     References:
         https://courses.csail.mit.edu/6.851/spring14/lectures/L20.pdf
@@ -167,15 +649,35 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
     # todo: check if nodes exist when adding
     """
     def __init__(self, *args, **kwargs):
-        # raise NotImplementedError('unfinished')
-        self._ccs = {}
-        self._union_find = nx_UnionFind()
+        self._init_dyncon()
         super(DynConnGraph, self).__init__(*args, **kwargs)
 
+    def _init_dyncon(self):
+        self._ccs = {}
+        self._node_cc = {}
+        self._dyncon = DynamicConnectivity()
+        self._certs = {}
+        self._kconn_cache = {}
+
     def clear(self):
         super(DynConnGraph, self).clear()
-        self._ccs = {}
-        self._union_find.clear()
+        self._init_dyncon()
+
+    def __getstate__(self):
+        # The connectivity structures are rebuilt from the edges. Copying the
+        # linked trees directly would recurse once per tree node.
+        state = self.__dict__.copy()
+        for key in ['_ccs', '_node_cc', '_dyncon', '_certs', '_kconn_cache']:
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_dyncon()
+        for n in self.nodes():
+            self._add_node(n)
+        for u, v in self.edges():
+            self._union(u, v)
 
     def __nice__(self):
         return 'nNodes={}, nEdges={}, nCCs={}'.format(
@@ -193,7 +695,7 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
     component_nodes = component
 
     def connected_to(self, node):
-        return self._ccs[self._union_find[node]]
+        return self._node_cc[node].nodes
 
     def node_label(self, node):
         """
@@ -205,10 +707,73 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
             >>> assert self.node_label(2) == self.node_label(1)
             >>> assert self.node_label(2) != self.node_label(4)
         """
-        return self._union_find[node]
+        try:
+            return self._node_cc[node].label
+        except KeyError:
+            # unknown nodes are their own component
+            return node
 
     def node_labels(self, *nodes):
-        return [self._union_find[node] for node in nodes]
+        return [self.node_label(node) for node in nodes]
+
+    def get_component_label(self, nodes):
+        """
+        Returns the label of the component consisting of exactly `nodes` or
+        None if `nodes` is not a component.
+        """
+        for node in nodes:
+            break
+        else:
+            return None
+        cc = self._node_cc.get(node)
+        if cc is None or len(cc.nodes) != len(nodes):
+            return None
+        if not cc.nodes.issuperset(nodes):
+            return None
+        return cc.label
+
+    def is_component_k_edge_connected(self, label, k):
+        """
+        Tests if the component with `label` is k-edge-connected.
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from ibeis.algo.graph.nx_dynamic_graph import *  # NOQA
+            >>> self = DynConnGraph()
+            >>> self.add_edges_from([(1, 2), (2, 3), (3, 4), (4, 5), (6, 7)])
+            >>> flag1 = self.is_component_k_edge_connected(1, k=2)
+            >>> self.add_edge(1, 5)
+            >>> flag2 = self.is_component_k_edge_connected(1, k=2)
+            >>> self.remove_edge(2, 3)
+            >>> flag3 = self.is_component_k_edge_connected(1, k=2)
+            >>> flags = [flag1, flag2, flag3]
+            >>> print('flags = %r' % (flags,))
+            flags = [False, True, False]
+        """
+        try:
+            return self._kconn_cache[k][label]
+        except KeyError:
+            pass
+        cert = self._certs.get(k)
+        if cert is None:
+            # Start maintaining a certificate for this k
+            cert = self._certs[k] = SparseCertificate(k)
+            self._kconn_cache[k] = {}
+            for u, v in self.edges():
+                cert.add_edge(u, v)
+        flag = is_k_edge_connected(cert.subgraph(self._ccs[label]), k=k)
+        self._kconn_cache[k][label] = flag
+        return flag
+
+    def _forget_kconn(self, label, ks=None):
+        if ks is None:
+            ks = self._kconn_cache.keys()
+        for k in ks:
+            self._kconn_cache[k].pop(label, None)
+
+    def node_label_lookup(self):
+        """ returns an object where lookup[node] is the label of node """
+        return _NodeLabelLookup(self)
 
     def are_nodes_connected(self, u, v):
         return ut.allsame(self.node_labels(u, v))
@@ -235,49 +800,84 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
     # -----
 
     def _cut(self, u, v):
-        """ Decremental connectivity (slow) """
-        old_nid1 = self._union_find[u]
-        old_nid2 = self._union_find[v]
-        if old_nid1 != old_nid2:
-            return
-        # Need to break appart entire component and then reconstruct it
-        old_cc = self._ccs[old_nid1]
-        del self._ccs[old_nid1]
-        self._union_find.remove_entire_cc(old_cc)
-        # Might be faster to just do DFS to find the CC
-        internal_edges = edges_inside(self, old_cc)
-        # Add nodes in case there are no edges to it
-        for n in old_cc:
-            self._add_node(n)
-        for edge in internal_edges:
-            self._union(*edge)
+        """ Decremental connectivity """
+        if self._dyncon.delete(u, v):
+            self._split(u, v)
+        changed = [k for k, cert in self._certs.items()
+                   if cert.remove_edge(u, v)]
+        if changed:
+            nodes = self._node_cc[u].nodes | self._node_cc[v].nodes
+            edges = list(edges_inside(self, nodes))
+            for k in changed:
+                self._certs[k].rebuild(nodes, edges)
+            self._forget_kconn(self.node_label(u), changed)
+            self._forget_kconn(self.node_label(v), changed)
+
+    def _split(self, u, v):
+        # The edge was a bridge. Move the nodes on the smaller side of the cut
+        # into a new component.
+        forest = self._dyncon.forests[0]
+        root_u = forest.root(u)
+        root_v = forest.root(v)
+        if root_u.nverts > root_v.nverts:
+            u, v = v, u
+            root_u, root_v = root_v, root_u
+        old_cc = self._node_cc[u]
+        del self._ccs[old_cc.label]
+        new_cc = _Component(root_u.minkey, set(forest.iter_tree_nodes(u)))
+        old_cc.nodes.difference_update(new_cc.nodes)
+        old_cc.label = root_v.minkey
+        for n in new_cc.nodes:
+            self._node_cc[n] = new_cc
+        self._ccs[old_cc.label] = old_cc.nodes
+        self._ccs[new_cc.label] = new_cc.nodes
+        self._forget_kconn(old_cc.label)
+        self._forget_kconn(new_cc.label)
 
     def _union(self, u, v):
-        """ Incremental connectivity (fast) """
+        """ Incremental connectivity """
         # print('Union ({})'.format((u, v)))
         self._add_node(u)
         self._add_node(v)
-        old_nid1 = self._union_find[u]
-        old_nid2 = self._union_find[v]
-        self._union_find.union(u, v)
-        new_nid = self._union_find[u]
-        for old_nid in [old_nid1, old_nid2]:
-            if new_nid != old_nid:
-                parts = self._ccs.pop(old_nid)
-                # FIXME: this step can be quite bad for time complexity.
-                # An Euler Tour Tree might solve the issue
-                self._ccs[new_nid].update(parts)
+        if self._dyncon.insert(u, v):
+            self._merge(u, v)
+        for k, cert in self._certs.items():
+            if cert.add_edge(u, v):
+                self._forget_kconn(self.node_label(u), [k])
+
+    def _merge(self, u, v):
+        cc1 = self._node_cc[u]
+        cc2 = self._node_cc[v]
+        # Move the nodes of the smaller component into the larger one
+        if len(cc1.nodes) < len(cc2.nodes):
+            cc1, cc2 = cc2, cc1
+        del self._ccs[cc1.label]
+        del self._ccs[cc2.label]
+        for n in cc2.nodes:
+            self._node_cc[n] = cc1
+        cc1.nodes.update(cc2.nodes)
+        cc1.label = min(cc1.label, cc2.label)
+        self._ccs[cc1.label] = cc1.nodes
+        self._forget_kconn(cc1.label)
 
     def _add_node(self, n):
-        if self._union_find.add_element(n):
+        if n not in self._node_cc:
             # print('Add ({})'.format((n)))
-            self._ccs[n] = {n}
+            self._dyncon.add_node(n)
+            cc = _Component(n, {n})
+            self._node_cc[n] = cc
+            self._ccs[n] = cc.nodes
+            self._forget_kconn(n)
 
     def _remove_node(self, n):
-        if n in self._union_find.parents:
-            del self._union_find.weights[n]
-            del self._union_find.parents[n]
-            del self._ccs[n]
+        # all edges of n must be removed beforehand
+        cc = self._node_cc.pop(n, None)
+        if cc is not None:
+            self._dyncon.remove_node(n)
+            for cert in self._certs.values():
+                cert.remove_node(n)
+            del self._ccs[cc.label]
+            self._forget_kconn(cc.label)
 
     def add_edge(self, u, v, **attr):
         """
@@ -297,7 +897,7 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
         ebunch = list(ebunch)
         # print('add_edges_from %r' % (ebunch,))
         for e in ebunch:
-            self._union(*e)
+            self._union(e[0], e[1])
         super(DynConnGraph, self).add_edges_from(ebunch, **attr)
 
     # ----
@@ -309,7 +909,11 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
     def add_nodes_from(self, nodes, **attr):
         nodes = list(nodes)
         for n in nodes:
-            self._add_node(n)
+            try:
+                self._add_node(n)
+            except TypeError:
+                # (node, attrdict) tuple
+                self._add_node(n[0])
         super(DynConnGraph, self).add_nodes_from(nodes, **attr)
 
     # ----
@@ -335,7 +939,7 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
         super(DynConnGraph, self).remove_edges_from(ebunch)
         # Can do this more efficiently for bulk edges
         for e in ebunch:
-            self._cut(*e)
+            self._cut(e[0], e[1])
 
     # -----
 
@@ -0,0 +1,162 @@
+import utool as ut
+from ibeis.algo.graph import nx_dynamic_graph
+from ibeis.algo.graph.nx_utils import edges_inside
+
+
+class RebuildConnGraph(nx_dynamic_graph.DynConnGraph):
+    """
+    The previous DynConnGraph connectivity. A union find whose cuts tear
+    down the entire component and re-union its internal edges.
+    """
+
+    def _init_dyncon(self):
+        self._ccs = {}
+        self._union_find = nx_dynamic_graph.nx_UnionFind()
+
+    def node_label(self, node):
+        return self._union_find[node]
+
+    def connected_to(self, node):
+        return self._ccs[self._union_find[node]]
+
+    def _cut(self, u, v):
+        old_nid1 = self._union_find[u]
+        old_nid2 = self._union_find[v]
+        if old_nid1 != old_nid2:
+            return
+        old_cc = self._ccs.pop(old_nid1)
+        self._union_find.remove_entire_cc(old_cc)
+        internal_edges = edges_inside(self, old_cc)
+        for n in old_cc:
+            self._add_node(n)
+        for edge in internal_edges:
+            self._union(*edge)
+
+    def _union(self, u, v):
+        self._add_node(u)
+        self._add_node(v)
+        old_nid1 = self._union_find[u]
+        old_nid2 = self._union_find[v]
+        self._union_find.union(u, v)
+        new_nid = self._union_find[u]
+        for old_nid in [old_nid1, old_nid2]:
+            if new_nid != old_nid:
+                self._ccs[new_nid].update(self._ccs.pop(old_nid))
+
+    def _add_node(self, n):
+        if self._union_find.add_element(n):
+            self._ccs[n] = {n}
+
+    def _remove_node(self, n):
+        if n in self._union_find.parents:
+            del self._union_find.weights[n]
+            del self._union_find.parents[n]
+            del self._ccs[n]
+
+
+def simulate_review_stream(num_pccs=10, pcc_size=100, p_revert=.3, seed=0):
+    """
+    Positive reviews of a demo database in a random order. After a review
+    there is a p_revert chance that an earlier positive review is corrected
+    (the edge is removed) and is later re-reviewed (the edge is added back).
+
+    Returns:
+        tuple: (nodes, ops) where ops is a list of ('add' | 'remove', edge)
+    """
+    import numpy as np
+    from ibeis.algo.graph import demo
+    from ibeis.algo.graph.state import POSTV
+    infr = demo.demodata_infr(num_pccs=num_pccs, pcc_size=pcc_size,
+                              pos_redun=[1, 2, 3], ignore_pair=True,
+                              infer=False)
+    rng = np.random.RandomState(seed)
+    pos_edges = sorted(e for e, truth in infr.edge_truth.items()
+                       if truth == POSTV)
+    pos_edges = ut.take(pos_edges, rng.permutation(len(pos_edges)))
+    ops = []
+    added = []
+    reverted = []
+    for edge in pos_edges:
+        ops.append(('add', edge))
+        added.append(edge)
+        if reverted and rng.rand() < .5:
+            ops.append(('add', reverted.pop()))
+        if rng.rand() < p_revert:
+            idx = rng.randint(len(added))
+            added[idx], added[-1] = added[-1], added[idx]
+            redo = added.pop()
+            ops.append(('remove', redo))
+            reverted.append(redo)
+    ops.extend(('add', edge) for edge in reverted)
+    nodes = list(infr.aids)
+    return nodes, ops
+
+
+def run_review_stream(graph_cls, nodes, ops):
+    graph = graph_cls()
+    graph.add_nodes_from(nodes)
+    for op, (u, v) in ops:
+        if op == 'add':
+            graph.add_edge(u, v)
+        else:
+            graph.remove_edge(u, v)
+        # The review loop looks up the component labels of each reviewed edge
+        graph.node_labels(u, v)
+    return graph
+
+
+def benchmark_dynconn():
+    r"""
+    Compares the previous rebuild-on-cut connectivity to the dynamic
+    connectivity of DynConnGraph on simulated review streams.
+
+    CommandLine:
+        python ~/code/ibeis/ibeis/algo/graph/tests/bench.py benchmark_dynconn
+        python ~/code/ibeis/ibeis/algo/graph/tests/bench.py benchmark_dynconn --pcc-size=500
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from bench import *  # NOQA
+        >>> result = benchmark_dynconn()
+        >>> print(result)
+    """
+    num_pccs = ut.get_argval('--num-pccs', type_=int, default=10)
+    pcc_size = ut.get_argval('--pcc-size', type_=int, default=100)
+    p_revert = ut.get_argval('--p-revert', type_=float, default=.3)
+    n = ut.get_argval('--n', type_=int, default=3)
+    nodes, ops = simulate_review_stream(num_pccs, pcc_size, p_revert)
+    num_removes = sum(op == 'remove' for op, _ in ops)
+
+    results = ut.odict()
+
+    def _bench(key, graph_cls):
+        t = ut.Timerit(n, label=key, verbose=0)
+        for timer in t:
+            with timer:
+                graph = run_review_stream(graph_cls, nodes, ops)
+        results[key] = t.min()
+        return graph
+
+    graph1 = _bench('rebuild', RebuildConnGraph)
+    graph2 = _bench('dynamic', nx_dynamic_graph.DynConnGraph)
+    assert graph1._ccs == graph2._ccs, 'components differ'
+
+    lines = ['nNodes=%d, nOps=%d, nRemoves=%d, nCCs=%d' % (
+        len(nodes), len(ops), num_removes, graph2.number_of_components())]
+    for key, secs in results.items():
+        lines.append('%10s: %8.4fs  %10.1f ops/s' % (key, secs, len(ops) / secs))
+    result = '\n'.join(lines)
+    return result
+
+
+if __name__ == '__main__':
+    r"""
+    CommandLine:
+        export PYTHONPATH=$PYTHONPATH:/home/joncrall/code/ibeis/ibeis/algo/graph/tests
+        python ~/code/ibeis/ibeis/algo/graph/tests/bench.py
+        python ~/code/ibeis/ibeis/algo/graph/tests/bench.py --allexamples
+    """
+    import multiprocessing
+    multiprocessing.freeze_support()  # for win32
+    import utool as ut  # NOQA
+    ut.doctest_funcs()
@@ -4,10 +4,12 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 from ibeis.algo.hots import _pipeline_helpers
 from ibeis.algo.hots import chip_match
+from ibeis.algo.hots import chip_match_store
 from ibeis.algo.hots import exceptions
 from ibeis.algo.hots import hstypes
 from ibeis.algo.hots import match_chips4
 from ibeis.algo.hots import name_scoring
+from ibeis.algo.hots import neighbor_cache
 from ibeis.algo.hots import neighbor_index
 from ibeis.algo.hots import neighbor_index_cache
 from ibeis.algo.hots import nn_weights
@@ -71,10 +73,12 @@ def reload_subs(verbose=True):
         return getattr(mod, 'reload_subs', wrap_fbrrr(mod))
     get_rrr(_pipeline_helpers)(verbose=verbose)
     get_rrr(chip_match)(verbose=verbose)
+    get_rrr(chip_match_store)(verbose=verbose)
     get_rrr(exceptions)(verbose=verbose)
     get_rrr(hstypes)(verbose=verbose)
     get_rrr(match_chips4)(verbose=verbose)
     get_rrr(name_scoring)(verbose=verbose)
+    get_rrr(neighbor_cache)(verbose=verbose)
     get_rrr(neighbor_index)(verbose=verbose)
     get_rrr(neighbor_index_cache)(verbose=verbose)
     get_rrr(nn_weights)(verbose=verbose)
@@ -94,10 +98,12 @@ rrrr = reload_subs
 IMPORT_TUPLES = [
     ('_pipeline_helpers', None),
     ('chip_match', None),
+    ('chip_match_store', None),
     ('exceptions', None),
     ('hstypes', None),
     ('match_chips4', None),
     ('name_scoring', None),
+    ('neighbor_cache', None),
     ('neighbor_index', None),
     ('neighbor_index_cache', None),
     ('nn_weights', None),
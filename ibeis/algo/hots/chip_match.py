@@ -61,6 +61,45 @@ def extend_pylist(x_list, num, val):
     return safeop(extend_pylist_, x_list, num, val)
 
 
+def split_flat(flat_arr, offsets):
+    """ splits a flat array into views using CSR offsets """
+    return [flat_arr[lx:rx] for lx, rx in zip(offsets[:-1], offsets[1:])]
+
+
+def segment_sum(values, offsets):
+    """
+    Sums each CSR segment of values. Empty segments sum to zero.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.chip_match import *  # NOQA
+        >>> values = np.array([1., 2., 3., 4.])
+        >>> offsets = np.array([0, 2, 2, 4, 4])
+        >>> result = ut.repr2(segment_sum(values, offsets))
+        >>> print(result)
+        np.array([3., 0., 7., 0.])
+    """
+    sums = np.zeros(len(offsets) - 1, dtype=values.dtype)
+    nonempty = offsets[:-1] < offsets[1:]
+    if np.any(nonempty):
+        sums[nonempty] = np.add.reduceat(values, offsets[:-1][nonempty])
+    return sums
+
+
+def segment_take_indices(offsets, idx_list):
+    """
+    Returns the flat indices of the segments in idx_list (in that order) and
+    the offsets of the new segments.
+    """
+    idx_list = np.asarray(idx_list, dtype=np.int64)
+    lens = np.diff(offsets).take(idx_list)
+    new_offsets = np.zeros(len(idx_list) + 1, dtype=np.int64)
+    np.cumsum(lens, out=new_offsets[1:])
+    shifts = offsets.take(idx_list) - new_offsets[:-1]
+    flatxs = np.arange(new_offsets[-1]) + np.repeat(shifts, lens)
+    return flatxs, new_offsets
+
+
 def convert_numpy_lists(arr_list, dtype, dims=None):
     new_arrs = [np.array(arr, dtype=dtype) for arr in arr_list]
     if dims is not None:
@@ -1561,6 +1600,9 @@ class _ChipMatchConvenienceGetter(object):
     def get_num_feat_score_cols(cm):
         return len(cm.fsv_col_lbls)
 
+    def get_num_feat_matches(cm):
+        return 0 if cm.fm_list is None else sum(len(fm) for fm in cm.fm_list)
+
     def get_fsv_prod_list(cm):
         return [fsv.prod(axis=1) for fsv in cm.fsv_list]
 
@@ -2277,27 +2319,12 @@ class ChipMatch(_ChipMatchVisualization,
         qnid         = cm.qnid
         fsv_col_lbls = cm.fsv_col_lbls
 
-        # <feat correspondence>
-        nVs = 0 if fsv_col_lbls is None else len(fsv_col_lbls)
-
-        fm_list  = extend_nplists(cm.fm_list, num, (0, 2), hstypes.FM_DTYPE)
-        fk_list  = extend_nplists(cm.fk_list, num, (0), hstypes.FK_DTYPE)
-        fs_list  = extend_nplists(cm.fs_list, num, (0), hstypes.FS_DTYPE)
-        fsv_list = extend_nplists(cm.fsv_list, num, (0, nVs), hstypes.FS_DTYPE)
-        H_list   = extend_pylist(cm.H_list, num, None)
-
-        filtnorm_aids = filtnorm_op(cm.filtnorm_aids, extend_nplists, num, (0),
-                                    hstypes.INDEX_TYPE)
-        filtnorm_fxs = filtnorm_op(cm.filtnorm_fxs, extend_nplists, num, (0),
-                                   hstypes.INDEX_TYPE)
-        # </feat correspondence>
-
-        out = ChipMatch(
-            qaid, daid_list, fm_list, fsv_list, fk_list, score_list, H_list,
-            fsv_col_lbls, dnid_list, qnid, unique_nids, name_score_list,
-            annot_score_list, filtnorm_fxs=filtnorm_fxs,
-            filtnorm_aids=filtnorm_aids, autoinit=False)
-        out.fs_list = fs_list
+        out = cm.__class__(
+            qaid, daid_list, score_list=score_list, fsv_col_lbls=fsv_col_lbls,
+            dnid_list=dnid_list, qnid=qnid, unique_nids=unique_nids,
+            name_score_list=name_score_list,
+            annot_score_list=annot_score_list, autoinit=False)
+        cm._set_extended_feature_fields(out, num)
         # attrs should be dicts
         for key in cm.algo_annot_scores.keys():
             out.algo_annot_scores[key] = extend_scores(cm.algo_annot_scores[key], num)
@@ -2307,6 +2334,25 @@ class ChipMatch(_ChipMatchVisualization,
         out._update_unique_nid_index()
         return out
 
+    def _extend_feature_fields(cm, num):
+        """ feature correspondences padded with num empty annot matches """
+        nVs = 0 if cm.fsv_col_lbls is None else len(cm.fsv_col_lbls)
+        fields = dict(
+            fm_list=extend_nplists(cm.fm_list, num, (0, 2), hstypes.FM_DTYPE),
+            fk_list=extend_nplists(cm.fk_list, num, (0), hstypes.FK_DTYPE),
+            fs_list=extend_nplists(cm.fs_list, num, (0), hstypes.FS_DTYPE),
+            fsv_list=extend_nplists(cm.fsv_list, num, (0, nVs), hstypes.FS_DTYPE),
+            H_list=extend_pylist(cm.H_list, num, None),
+            filtnorm_aids=filtnorm_op(cm.filtnorm_aids, extend_nplists, num,
+                                      (0), hstypes.INDEX_TYPE),
+            filtnorm_fxs=filtnorm_op(cm.filtnorm_fxs, extend_nplists, num,
+                                     (0), hstypes.INDEX_TYPE),
+        )
+        return fields
+
+    def _set_extended_feature_fields(cm, out, num):
+        out.__dict__.update(cm._extend_feature_fields(num))
+
     @classmethod
     def combine_cms(ChipMatch, cm_list):
         """
@@ -2399,17 +2445,13 @@ class ChipMatch(_ChipMatchVisualization,
         if inplace:
             out = cm
         else:
-            out = ChipMatch(qaid=cm.qaid, qnid=cm.qnid,
-                            fsv_col_lbls=cm.fsv_col_lbls)
+            out = cm.__class__(qaid=cm.qaid, qnid=cm.qnid,
+                               fsv_col_lbls=cm.fsv_col_lbls)
 
         out.daid_list     = vt.take2(cm.daid_list, idx_list)
         out.dnid_list     = safeop(vt.take2, cm.dnid_list, idx_list)
         out.H_list        = safeop(ut.take, cm.H_list, idx_list)
-        out.fm_list       = safeop(ut.take, cm.fm_list, idx_list)
-        out.fsv_list      = safeop(ut.take, cm.fsv_list, idx_list)
-        out.fk_list       = safeop(ut.take, cm.fk_list, idx_list)
-        out.filtnorm_aids = filtnorm_op(cm.filtnorm_aids, ut.take, idx_list)
-        out.filtnorm_fxs  = filtnorm_op(cm.filtnorm_fxs, ut.take, idx_list)
+        cm._take_feature_fields(out, idx_list)
 
         if keepscores:
             # Annot Scores
@@ -2442,6 +2484,13 @@ class ChipMatch(_ChipMatchVisualization,
         out._update_unique_nid_index()
         return out
 
+    def _take_feature_fields(cm, out, idx_list):
+        out.fm_list       = safeop(ut.take, cm.fm_list, idx_list)
+        out.fsv_list      = safeop(ut.take, cm.fsv_list, idx_list)
+        out.fk_list       = safeop(ut.take, cm.fk_list, idx_list)
+        out.filtnorm_aids = filtnorm_op(cm.filtnorm_aids, ut.take, idx_list)
+        out.filtnorm_fxs  = filtnorm_op(cm.filtnorm_fxs, ut.take, idx_list)
+
     def take_feature_matches(cm, indicies_list, inplace=False, keepscores=True):
         r"""
         Removes outlier feature matches
@@ -2704,6 +2753,337 @@ class ChipMatch(_ChipMatchVisualization,
         return cm
 
 
+class LazyChipMatch(ChipMatch):
+    r"""
+    A ChipMatch whose per-feature fields (fm_list, fsv_list, ...) are only
+    loaded the first time they are accessed. Workloads that only use
+    daid_list and the score vectors never touch the feature data.
+
+    Lazy fields are given as a dict mapping the attribute name to a function
+    that returns its value.
+
+    CommandLine:
+        python -m ibeis.algo.hots.chip_match LazyChipMatch
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.chip_match import *  # NOQA
+        >>> fm_list = [np.array([[0, 1], [2, 3]]), np.array([[4, 5]])]
+        >>> calls = []
+        >>> def load_fm():
+        >>>     calls.append('fm_list')
+        >>>     return fm_list
+        >>> cm_ = ChipMatch(1, np.array([2, 3]), fm_list,
+        >>>                 score_list=np.array([1.5, .5]))
+        >>> state_dict = cm_.__getstate__()
+        >>> cm = LazyChipMatch.from_lazy_state(state_dict, {'fm_list': load_fm})
+        >>> assert cm.get_top_aids(1) == [2]
+        >>> assert not cm.is_loaded('fm_list') and len(calls) == 0
+        >>> assert cm.fm_list is fm_list and cm.is_loaded('fm_list')
+        >>> cm.fm_list
+        >>> assert calls == ['fm_list']
+    """
+
+    @classmethod
+    def from_lazy_state(LazyChipMatch, state_dict, lazy_fields):
+        cm = LazyChipMatch()
+        state_dict = ut.delete_dict_keys(state_dict.copy(), list(lazy_fields))
+        cm.__setstate__(state_dict)
+        cm._set_lazy_fields(lazy_fields)
+        return cm
+
+    def _set_lazy_fields(cm, lazy_fields):
+        for attr in lazy_fields:
+            cm.__dict__.pop(attr, None)
+        cm._lazy_fields = dict(lazy_fields)
+
+    def __getattr__(cm, attr):
+        # Only called when normal attribute lookup fails
+        lazy_fields = cm.__dict__.get('_lazy_fields', None)
+        if lazy_fields is not None and attr in lazy_fields:
+            value = lazy_fields.pop(attr)()
+            cm.__dict__[attr] = value
+            return value
+        raise AttributeError(attr)
+
+    def is_loaded(cm, attr):
+        return attr not in cm.__dict__.get('_lazy_fields', {})
+
+    def load_all(cm):
+        """ loads all pending lazy fields """
+        for attr in list(cm.__dict__.get('_lazy_fields', {})):
+            getattr(cm, attr)
+
+    def __getstate__(cm):
+        cm.load_all()
+        state_dict = cm.__dict__.copy()
+        state_dict.pop('_lazy_fields', None)
+        return state_dict
+
+    def _set_extended_feature_fields(cm, out, num):
+        # Defer extending the feature fields until one of them is needed
+        cache = []
+
+        def _extended(attr):
+            if len(cache) == 0:
+                cache.append(cm._extend_feature_fields(num))
+            return cache[0][attr]
+        attrs = ['fm_list', 'fk_list', 'fs_list', 'fsv_list', 'H_list',
+                 'filtnorm_aids', 'filtnorm_fxs']
+        out._set_lazy_fields({attr: ut.partial(_extended, attr)
+                              for attr in attrs})
+
+
+class FlatChipMatch(ChipMatch):
+    r"""
+    A ChipMatch that keeps all feature matches of the query in contiguous
+    arrays (flat_fm, flat_fsv, flat_fk) with a CSR-style offset table.
+    The matches of daid_list[i] are rows daid_offsets[i]:daid_offsets[i + 1].
+
+    Scoring, shortlisting and feature compression use segment reductions on
+    the flat arrays. The per-annot fields (fm_list, fsv_list, ...) are built
+    as views the first time they are accessed. Assigning to one of them
+    converts the object back to the per-annot representation.
+
+    CommandLine:
+        python -m ibeis.algo.hots.chip_match FlatChipMatch
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.chip_match import *  # NOQA
+        >>> from ibeis.algo.hots import name_scoring
+        >>> cm_ = name_scoring.testdata_chipmatch()
+        >>> cm = FlatChipMatch.from_chipmatch(cm_)
+        >>> assert cm.is_flat
+        >>> assert check_arrs_eq(cm.fm_list, cm_.fm_list)
+        >>> cm.evaluate_csum_annot_score()
+        >>> cm_.evaluate_csum_annot_score()
+        >>> assert np.all(cm.algo_annot_scores['csum'] == cm_.algo_annot_scores['csum'])
+        >>> sub = cm.take_annots([4, 0])
+        >>> assert sub.is_flat and sub.daid_list.tolist() == [5, 1]
+        >>> assert check_arrs_eq(sub.fm_list, ut.take(cm_.fm_list, [4, 0]))
+        >>> cm.fk_list = [fk + 1 for fk in cm.fk_list]
+        >>> assert not cm.is_flat
+        >>> assert check_arrs_eq(cm.fm_list, cm_.fm_list)
+    """
+    _flat_fields = ['fm_list', 'fsv_list', 'fk_list', 'filtnorm_aids',
+                    'filtnorm_fxs']
+
+    @classmethod
+    def from_flat(FlatChipMatch, qaid, daid_list, daid_offsets, flat_fm,
+                  flat_fsv, flat_fk, fsv_col_lbls=None, flat_filtnorm_aids=None,
+                  flat_filtnorm_fxs=None, **kwargs):
+        cm = FlatChipMatch(qaid, daid_list, fsv_col_lbls=fsv_col_lbls,
+                           **kwargs)
+        cm._set_flat(daid_offsets, flat_fm, flat_fsv, flat_fk,
+                     flat_filtnorm_aids, flat_filtnorm_fxs)
+        return cm
+
+    @classmethod
+    def from_chipmatch(FlatChipMatch, other):
+        """ builds a flat copy of the feature matches of a ChipMatch """
+        lens = [len(fm) for fm in other.fm_list]
+        daid_offsets = np.zeros(len(lens) + 1, dtype=np.int64)
+        np.cumsum(lens, out=daid_offsets[1:])
+        nfilt = 0 if other.fsv_col_lbls is None else len(other.fsv_col_lbls)
+
+        def _cat(arr_list, shape, dtype):
+            return vt.safe_cat(arr_list, axis=0, default_shape=shape,
+                               default_dtype=dtype)
+
+        def _cat_filtnorm(filtnorm_):
+            if filtnorm_ is None:
+                return None
+            return [None if arrs is None else
+                    _cat(arrs, (0,), hstypes.INDEX_TYPE)
+                    for arrs in filtnorm_]
+        fk_list = other.fk_list
+        cm = FlatChipMatch.from_flat(
+            other.qaid, other.daid_list, daid_offsets,
+            _cat(other.fm_list, (0, 2), hstypes.FM_DTYPE),
+            _cat(other.fsv_list, (0, nfilt), hstypes.FS_DTYPE),
+            _cat(fk_list, (0,), hstypes.FK_DTYPE),
+            fsv_col_lbls=other.fsv_col_lbls,
+            flat_filtnorm_aids=_cat_filtnorm(other.filtnorm_aids),
+            flat_filtnorm_fxs=_cat_filtnorm(other.filtnorm_fxs),
+            score_list=other.score_list, H_list=other.H_list,
+            dnid_list=other.dnid_list, qnid=other.qnid,
+            unique_nids=other.unique_nids,
+            name_score_list=other.name_score_list,
+            annot_score_list=other.annot_score_list)
+        cm.algo_annot_scores.update(other.algo_annot_scores)
+        cm.algo_name_scores.update(other.algo_name_scores)
+        return cm
+
+    @property
+    def is_flat(cm):
+        return cm.__dict__.get('daid_offsets', None) is not None
+
+    def _set_flat(cm, daid_offsets, flat_fm, flat_fsv, flat_fk,
+                  flat_filtnorm_aids=None, flat_filtnorm_fxs=None):
+        # Drop the per-annot fields (and any cached views)
+        for attr in cm._flat_fields:
+            cm.__dict__.pop(attr, None)
+        cm.__dict__.update(
+            daid_offsets=daid_offsets, flat_fm=flat_fm, flat_fsv=flat_fsv,
+            flat_fk=flat_fk, flat_filtnorm_aids=flat_filtnorm_aids,
+            flat_filtnorm_fxs=flat_filtnorm_fxs)
+
+    def _flat_views(cm, attr):
+        offsets = cm.daid_offsets
+        if attr in ['filtnorm_aids', 'filtnorm_fxs']:
+            flat_filtnorm = cm.__dict__['flat_' + attr]
+            if flat_filtnorm is None:
+                return None
+            return [None if arr is None else split_flat(arr, offsets)
+                    for arr in flat_filtnorm]
+        flat_arr = cm.__dict__['flat_' + attr[:-len('_list')]]
+        return split_flat(flat_arr, offsets)
+
+    def __getattr__(cm, attr):
+        # Only called when normal attribute lookup fails
+        if attr in FlatChipMatch._flat_fields and cm.is_flat:
+            value = cm._flat_views(attr)
+            cm.__dict__[attr] = value
+            return value
+        raise AttributeError(attr)
+
+    def __setattr__(cm, attr, value):
+        if attr in FlatChipMatch._flat_fields and cm.is_flat:
+            cm.unflatten()
+        super(FlatChipMatch, cm).__setattr__(attr, value)
+
+    def unflatten(cm):
+        """ converts back to the per-annot representation """
+        if cm.is_flat:
+            for attr in cm._flat_fields:
+                getattr(cm, attr)
+            cm.__dict__.update(
+                daid_offsets=None, flat_fm=None, flat_fsv=None, flat_fk=None,
+                flat_filtnorm_aids=None, flat_filtnorm_fxs=None)
+
+    def __getstate__(cm):
+        # Serialize as a standard ChipMatch
+        for attr in cm._flat_fields:
+            getattr(cm, attr, None)
+        state_dict = cm.__dict__.copy()
+        for key in ['daid_offsets', 'flat_fm', 'flat_fsv', 'flat_fk',
+                    'flat_filtnorm_aids', 'flat_filtnorm_fxs']:
+            state_dict.pop(key, None)
+        return state_dict
+
+    def get_flat_fs(cm):
+        return cm.flat_fsv.prod(axis=1)
+
+    def get_num_feat_matches(cm):
+        if not cm.is_flat:
+            return super(FlatChipMatch, cm).get_num_feat_matches()
+        return len(cm.flat_fm)
+
+    def get_fsv_prod_list(cm):
+        if not cm.is_flat:
+            return super(FlatChipMatch, cm).get_fsv_prod_list()
+        return split_flat(cm.get_flat_fs(), cm.daid_offsets)
+
+    def get_flat_daidxs(cm):
+        """ the index into daid_list of each flat feature match """
+        lens = np.diff(cm.daid_offsets)
+        return np.repeat(np.arange(len(lens)), lens)
+
+    def evaluate_csum_annot_score(cm, qreq_=None):
+        if not cm.is_flat:
+            return super(FlatChipMatch, cm).evaluate_csum_annot_score(qreq_)
+        cm.algo_annot_scores['csum'] = segment_sum(cm.get_flat_fs(),
+                                                   cm.daid_offsets)
+
+    def get_name_shortlist_aids(cm, nNameShortList, nAnnotPerName):
+        """
+        Segment version of scoring.get_name_shortlist_aids. Names are ranked
+        by name score, and annots within a name by annot score.
+        """
+        daid_list = cm.daid_list
+        if len(daid_list) == 0:
+            return daid_list
+        unique_nids, daid_nidx = np.unique(cm.dnid_list, return_inverse=True)
+        name_scores = cm.name_score_list.take(
+            ut.dict_take(cm.nid2_nidx, unique_nids))
+        name_rank = np.empty(len(unique_nids), dtype=np.int64)
+        name_rank[name_scores.argsort()[::-1]] = np.arange(len(unique_nids))
+        daid_name_rank = name_rank.take(daid_nidx)
+        # Order by name rank, then by descending annot score
+        sortx = np.lexsort((-np.arange(len(daid_list)),
+                            -cm.annot_score_list, daid_name_rank))
+        sorted_rank = daid_name_rank.take(sortx)
+        _, firstxs = np.unique(sorted_rank, return_index=True)
+        within_rank = (np.arange(len(sortx)) -
+                       np.repeat(firstxs, np.diff(np.append(firstxs, len(sortx)))))
+        flags = (sorted_rank < nNameShortList) & (within_rank < nAnnotPerName)
+        top_daids = daid_list.take(sortx[flags])
+        return top_daids
+
+    def _take_feature_fields(cm, out, idx_list):
+        if not cm.is_flat:
+            return super(FlatChipMatch, cm)._take_feature_fields(out, idx_list)
+        flatxs, daid_offsets = segment_take_indices(cm.daid_offsets, idx_list)
+        cm._set_flat_subset(out, flatxs, daid_offsets)
+
+    def _set_flat_subset(cm, out, flatxs, daid_offsets):
+        def _take_filtnorm(flat_filtnorm):
+            if flat_filtnorm is None:
+                return None
+            return [None if arr is None else arr.take(flatxs)
+                    for arr in flat_filtnorm]
+        out._set_flat(daid_offsets, cm.flat_fm.take(flatxs, axis=0),
+                      cm.flat_fsv.take(flatxs, axis=0),
+                      cm.flat_fk.take(flatxs),
+                      _take_filtnorm(cm.flat_filtnorm_aids),
+                      _take_filtnorm(cm.flat_filtnorm_fxs))
+
+    def _set_extended_feature_fields(cm, out, num):
+        if not cm.is_flat:
+            return super(FlatChipMatch, cm)._set_extended_feature_fields(
+                out, num)
+        # New annots have empty segments at the end of the flat arrays
+        daid_offsets = np.append(cm.daid_offsets,
+                                 np.full(num, cm.daid_offsets[-1]))
+        out._set_flat(daid_offsets, cm.flat_fm, cm.flat_fsv, cm.flat_fk,
+                      cm.flat_filtnorm_aids, cm.flat_filtnorm_fxs)
+        out.fs_list = extend_nplists(cm.fs_list, num, (0), hstypes.FS_DTYPE)
+        out.H_list = extend_pylist(cm.H_list, num, None)
+
+    def _cast_scores(cm, dtype=np.float):
+        if not cm.is_flat:
+            return super(FlatChipMatch, cm)._cast_scores(dtype)
+        cm.__dict__.pop('fsv_list', None)
+        cm.flat_fsv = cm.flat_fsv.astype(dtype)
+
+    def compress_top_feature_matches(cm, num=10, rng=np.random, use_random=True):
+        """
+        Segment version of ChipMatch.compress_top_feature_matches
+        """
+        if not cm.is_flat:
+            return super(FlatChipMatch, cm).compress_top_feature_matches(
+                num, rng, use_random)
+        offsets = cm.daid_offsets
+        lens = np.diff(offsets)
+        fs = cm.get_flat_fs()
+        daidxs = cm.get_flat_daidxs()
+        # Sort each segment by descending score
+        sortx = np.lexsort((-fs, daidxs))
+        within_rank = np.arange(len(sortx)) - np.repeat(offsets[:-1], lens)
+        if use_random:
+            # keep jagedness
+            limits = rng.randint(num // 2, num, size=len(lens))
+        else:
+            limits = np.full(len(lens), num)
+        flags = within_rank < np.repeat(limits, lens)
+        new_offsets = np.zeros(len(lens) + 1, dtype=np.int64)
+        np.cumsum(np.minimum(lens, limits), out=new_offsets[1:])
+        cm._set_flat_subset(cm, sortx[flags], new_offsets)
+        cm.H_list = None
+        cm.fs_list = None
+
+
 # -----
 # Misc
 # -----
@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+Binary columnar store for the ChipMatch results of a query request.
+
+Pickling a ChipMatch per query (or a whole qaid2_cm dict) means every fm /
+fsv / fk array is unpickled eagerly on load. This store instead writes all
+ChipMatches of a request into one file. Every ndarray field (and every list of
+ndarrays, such as ``fm_list``) is flattened and concatenated with the same
+field of all other queries. Offset tables locate each array in the
+concatenated buffers. The file is memory-mapped, so ChipMatches are
+materialized one at a time and their arrays are views into the file.
+
+Layout::
+    MAGIC
+    column blocks (each aligned to ALIGN bytes)
+    pickled header
+    uint64 header offset
+    MAGIC
+
+CommandLine:
+    python -m ibeis.algo.hots.chip_match_store --allexamples
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import os
+import struct
+import numpy as np
+import utool as ut
+from six.moves import zip, range, cPickle as pickle  # NOQA
+from os.path import exists, join  # NOQA
+from ibeis.algo.hots import chip_match
+from ibeis.algo.hots import _pipeline_helpers as plh  # NOQA
+(print, rrr, profile) = ut.inject2(__name__)
+
+
+MAGIC = b'IBEISCM1'
+ALIGN = 16
+# These are rebuilt from daid_list / unique_nids instead of being stored
+REBUILT_FIELDS = {
+    'daid2_idx': 'daid_list',
+    'nid2_nidx': 'unique_nids',
+}
+# Dict fields whose values are flattened into one field per key
+SCORE_DICT_FIELDS = ['algo_annot_scores', 'algo_name_scores']
+# Per-feature fields that are not decoded until accessed by lazy loads
+LAZY_FIELDS = ['fm_list', 'fsv_list', 'fk_list', 'fs_list', 'H_list',
+               'filtnorm_aids', 'filtnorm_fxs']
+
+
+class ChipMatchStore(ut.NiceRepr):
+    r"""
+    Read access to a chipmatch store file. Use ChipMatchStore.write to create
+    one.
+
+    Args:
+        fpath (str): path to the store file
+
+    CommandLine:
+        python -m ibeis.algo.hots.chip_match_store ChipMatchStore
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.chip_match_store import *  # NOQA
+        >>> ibs, qreq_, cm_list = plh.testdata_pre_sver('PZ_MTEST', qaid_list=[18, 19])
+        >>> for cm in cm_list:
+        >>>     cm.score_name_nsum(qreq_)
+        >>> dpath = ut.ensure_app_resource_dir('ibeis', 'test_cmstore')
+        >>> fpath = join(dpath, 'test.cmstore')
+        >>> store = ChipMatchStore.write(fpath, cm_list)
+        >>> assert store.qaids == [18, 19]
+        >>> cm2 = store.load(19)
+        >>> assert cm2 == cm_list[1]
+        >>> assert np.all(cm2.score_list == cm_list[1].score_list)
+        >>> assert cm2.fsv_col_lbls == cm_list[1].fsv_col_lbls
+        >>> assert cm2.daid2_idx == cm_list[1].daid2_idx
+        >>> ut.delete(fpath)
+    """
+
+    def __init__(store, fpath):
+        store.fpath = fpath
+        store._mmap = None
+        store._header = None
+        store._buffers = {}
+        store._read_header()
+
+    def __nice__(store):
+        return '%s nQueries=%d' % (os.path.basename(store.fpath), len(store))
+
+    def __len__(store):
+        return len(store._header['qaids'])
+
+    def __contains__(store, qaid):
+        return qaid in store._header['qaid2_qx']
+
+    @property
+    def qaids(store):
+        return store._header['qaids']
+
+    # --- Reading ---
+
+    def _read_header(store):
+        with open(store.fpath, 'rb') as file_:
+            start_magic = file_.read(len(MAGIC))
+            file_.seek(-(8 + len(MAGIC)), os.SEEK_END)
+            trailer = file_.read(8 + len(MAGIC))
+            if start_magic != MAGIC or trailer[8:] != MAGIC:
+                raise IOError('%r is not a complete chipmatch store' % (
+                    store.fpath,))
+            header_offset, = struct.unpack('<Q', trailer[0:8])
+            file_.seek(header_offset)
+            store._header = pickle.load(file_)
+
+    def _get_mmap(store):
+        if store._mmap is None:
+            # copy-on-write so loaded chipmatches may be modified in place.
+            # Slicing a plain ndarray view is much faster than slicing a memmap.
+            store._mmap = np.asarray(
+                np.memmap(store.fpath, dtype=np.uint8, mode='c'))
+        return store._mmap
+
+    def _get_buffer(store, bufkey):
+        if bufkey not in store._buffers:
+            mmap = store._get_mmap()
+            columns = {}
+            for colname, (offset, dtype_str, shape) in store._header['buffers'][bufkey].items():
+                dtype = np.dtype(dtype_str)
+                nbytes = int(np.prod(shape)) * dtype.itemsize
+                columns[colname] = mmap[offset:offset + nbytes].view(dtype).reshape(shape)
+            store._buffers[bufkey] = columns
+        return store._buffers[bufkey]
+
+    def _decode_field(store, fieldinfo):
+        (kind, bufkey, elemx, num, trailing) = fieldinfo
+        columns = store._get_buffer(bufkey)
+        flat, starts, stops = columns['flat'], columns['starts'], columns['stops']
+        lo, hi = starts[elemx], stops[elemx + num - 1]
+        block = flat[lo:hi].reshape((-1,) + trailing)
+        if kind == 'array':
+            return block
+        # split the contiguous block of this query into its elements
+        rowsize = int(np.prod(trailing))
+        cuts = (starts[elemx + 1:elemx + num] - lo) // rowsize
+        return np.split(block, cuts)
+
+    def _get_entry(store, qaid):
+        qx = store._header['qaid2_qx'][qaid]
+        return store._header['entries'][qx]
+
+    def load_state(store, qaid, skip_fields=[]):
+        r"""
+        Args:
+            qaid (int): query annotation id
+            skip_fields (list): fields that are not decoded
+
+        Returns:
+            dict: the ChipMatch state dict
+        """
+        entry = store._get_entry(qaid)
+        state = {key: val for key, val in entry['extras'].items()
+                 if key not in skip_fields}
+        for field, fieldinfo in entry['fields'].items():
+            if field not in skip_fields:
+                state[field] = store._decode_field(fieldinfo)
+        for dictfield in SCORE_DICT_FIELDS:
+            prefix = dictfield + '.'
+            keys = [key for key in list(state.keys()) if key.startswith(prefix)]
+            if keys:
+                state[dictfield] = state.get(dictfield, {}).copy()
+                for key in keys:
+                    state[dictfield][key[len(prefix):]] = state.pop(key)
+        for field, srcfield in REBUILT_FIELDS.items():
+            if field in entry['rebuild'] and srcfield in state:
+                state[field] = ut.make_index_lookup(state[srcfield])
+        return state
+
+    def load_field(store, qaid, field):
+        """ decodes a single ChipMatch attribute of a query """
+        entry = store._get_entry(qaid)
+        if field in entry['fields']:
+            return store._decode_field(entry['fields'][field])
+        return entry['extras'].get(field, None)
+
+    def load(store, qaid, lazy=False):
+        r"""
+        Materializes the ChipMatch of a single query.
+
+        Args:
+            qaid (int): query annotation id
+            lazy (bool): if True returns a LazyChipMatch whose per-feature
+                fields (LAZY_FIELDS) are only read when accessed.
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from ibeis.algo.hots.chip_match_store import *  # NOQA
+            >>> ibs, qreq_, cm_list = plh.testdata_pre_sver('PZ_MTEST', qaid_list=[18])
+            >>> dpath = ut.ensure_app_resource_dir('ibeis', 'test_cmstore')
+            >>> fpath = join(dpath, 'test_lazy.cmstore')
+            >>> store = ChipMatchStore.write(fpath, cm_list)
+            >>> cm = store.load(18, lazy=True)
+            >>> assert not cm.is_loaded('fm_list')
+            >>> assert np.all(cm.score_list == cm_list[0].score_list)
+            >>> assert not cm.is_loaded('fm_list')
+            >>> assert all(ut.lmap(np.array_equal, cm.fm_list, cm_list[0].fm_list))
+            >>> assert cm.is_loaded('fm_list') and not cm.is_loaded('fsv_list')
+            >>> ut.delete(fpath)
+        """
+        if lazy:
+            lazy_fields = {field: ut.partial(store.load_field, qaid, field)
+                           for field in LAZY_FIELDS}
+            state = store.load_state(qaid, skip_fields=LAZY_FIELDS)
+            return chip_match.LazyChipMatch.from_lazy_state(state, lazy_fields)
+        cm = chip_match.ChipMatch()
+        cm.__setstate__(store.load_state(qaid))
+        return cm
+
+    def load_many(store, qaids=None, lazy=False):
+        if qaids is None:
+            qaids = store.qaids
+        return [store.load(qaid, lazy=lazy) for qaid in qaids]
+
+    # --- Writing ---
+
+    @classmethod
+    def write(ChipMatchStore, fpath, cm_list, verbose=ut.VERBOSE):
+        r"""
+        Writes the chipmatches into a new store file at fpath.
+
+        The file is written to a temporary path and moved into place, so
+        readers never see a partially written store.
+
+        Returns:
+            ChipMatchStore: store
+        """
+        if verbose:
+            print('[cmstore] writing %d chipmatches to %s' % (
+                len(cm_list), fpath))
+        # bufkey -> list of flattened arrays
+        buf_arrs = ut.ddict(list)
+        entries = []
+        for cm in cm_list:
+            entries.append(_encode_state(cm.__getstate__(), buf_arrs))
+
+        tmp_fpath = fpath + '.tmp'
+        buffers = {}
+        with open(tmp_fpath, 'wb') as file_:
+            file_.write(MAGIC)
+            for bufkey, arrs in buf_arrs.items():
+                dtype = np.dtype(bufkey[1])
+                lens = np.array([arr.size for arr in arrs], dtype=np.int64)
+                stops = np.cumsum(lens)
+                starts = stops - lens
+                flat = (np.concatenate(arrs) if len(arrs) else
+                        np.empty(0, dtype=dtype))
+                columns = {}
+                for colname, arr in [('flat', flat), ('starts', starts),
+                                     ('stops', stops)]:
+                    _write_padding(file_)
+                    columns[colname] = (file_.tell(), arr.dtype.str, arr.shape)
+                    file_.write(np.ascontiguousarray(arr).tobytes())
+                buffers[bufkey] = columns
+            qaids = [cm.qaid for cm in cm_list]
+            header = {
+                'qaids': qaids,
+                'qaid2_qx': ut.make_index_lookup(qaids),
+                'entries': entries,
+                'buffers': buffers,
+            }
+            header_offset = file_.tell()
+            pickle.dump(header, file_, protocol=2)
+            file_.write(struct.pack('<Q', header_offset))
+            file_.write(MAGIC)
+        ut.delete(fpath, verbose=False)
+        os.rename(tmp_fpath, fpath)
+        return ChipMatchStore(fpath)
+
+
+def _write_padding(file_):
+    pad = (-file_.tell()) % ALIGN
+    if pad:
+        file_.write(b'\x00' * pad)
+
+
+def _encode_array(arr, bufkeyname, buf_arrs):
+    """ returns the buffer key and the trailing shape of an array """
+    bufkey = (bufkeyname, arr.dtype.str)
+    buf_arrs[bufkey].append(arr.ravel())
+    return bufkey, tuple(arr.shape[1:])
+
+
+def _is_encodable_list(list_):
+    if not isinstance(list_, list) or len(list_) == 0:
+        return False
+    first = list_[0]
+    if not isinstance(first, np.ndarray) or first.ndim == 0:
+        return False
+    if 0 in first.shape[1:]:
+        # the number of rows cannot be recovered from flattened data
+        return False
+    return all(isinstance(arr, np.ndarray) and arr.dtype == first.dtype and
+               arr.shape[1:] == first.shape[1:] for arr in list_)
+
+
+def _encode_state(state_dict, buf_arrs):
+    r"""
+    Moves the array data of a ChipMatch state dict into the buffers.
+
+    Returns:
+        dict: entry - field offsets and the remaining (pickled) attributes
+    """
+    items = {}
+    for key, val in state_dict.items():
+        if key in SCORE_DICT_FIELDS and isinstance(val, dict):
+            items[key] = {subkey: subval for subkey, subval in val.items()
+                          if not isinstance(subval, np.ndarray)}
+            for subkey, subval in val.items():
+                if isinstance(subval, np.ndarray):
+                    items[key + '.' + subkey] = subval
+        else:
+            items[key] = val
+    fields = {}
+    extras = {}
+    rebuild = []
+    for key, val in items.items():
+        if key in REBUILT_FIELDS:
+            if val is not None:
+                rebuild.append(key)
+            continue
+        if (isinstance(val, np.ndarray) and val.ndim > 0 and
+                0 not in val.shape[1:]):
+            bufkey, trailing = _encode_array(val, key, buf_arrs)
+            elemx = len(buf_arrs[bufkey]) - 1
+            fields[key] = ('array', bufkey, elemx, 1, trailing)
+        elif _is_encodable_list(val):
+            bufkey = None
+            for arr in val:
+                bufkey, trailing = _encode_array(arr, key, buf_arrs)
+            elemx = len(buf_arrs[bufkey]) - len(val)
+            fields[key] = ('list', bufkey, elemx, len(val), trailing)
+        else:
+            extras[key] = val
+    entry = {'fields': fields, 'extras': extras, 'rebuild': rebuild}
+    return entry
+
+
+def convert_chipmatch_cache(fpath_list, store_fpath, verbose=ut.NOT_QUIET):
+    r"""
+    Migrates existing per-query cPkl chipmatch files into a single store.
+    Files that need to be recomputed are skipped.
+
+    Returns:
+        ChipMatchStore: store
+    """
+    cm_list = []
+    _iter = ut.ProgIter(fpath_list, label='converting chipmatches',
+                        enabled=verbose)
+    for fpath in _iter:
+        try:
+            cm = chip_match.ChipMatch.load_from_fpath(fpath, verbose=False)
+        except chip_match.NeedRecomputeError:
+            continue
+        cm_list.append(cm)
+    return ChipMatchStore.write(store_fpath, cm_list, verbose=verbose)
+
+
+def load_store_or_none(fpath):
+    """ returns None if there is no valid store at fpath """
+    if not exists(fpath):
+        return None
+    try:
+        return ChipMatchStore(fpath)
+    except (IOError, EOFError, pickle.UnpicklingError) as ex:
+        ut.printex(ex, 'bad chipmatch store', iswarning=True)
+        return None
+
+
+if __name__ == '__main__':
+    r"""
+    CommandLine:
+        python -m ibeis.algo.hots.chip_match_store
+        python -m ibeis.algo.hots.chip_match_store --allexamples
+    """
+    import multiprocessing
+    multiprocessing.freeze_support()  # for win32
+    ut.doctest_funcs()
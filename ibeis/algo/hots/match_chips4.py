@@ -7,6 +7,7 @@ import ubelt as ub
 import utool as ut
 from os.path import exists
 from ibeis.algo.hots import chip_match
+from ibeis.algo.hots import chip_match_store
 from ibeis.algo.hots import pipeline
 (print, rrr, profile) = ut.inject2(__name__)
 
@@ -30,13 +31,16 @@ HOTS_BATCH_SIZE = ut.get_argval('--hots-batch-size', type_=int, default=None)
 @profile
 def submit_query_request(qreq_, use_cache=None, use_bigcache=None,
                          verbose=None, save_qcache=None, use_supercache=None,
-                         invalidate_supercache=None):
+                         invalidate_supercache=None, lazy=False):
     """
     Called from qreq_.execute
 
     Checks a big cache for qaid2_cm.  If cache miss, tries to load each cm
     individually.  On an individual cache miss, it preforms the query.
 
+    If lazy is True, chipmatches loaded from the big cache only read their
+    feature correspondences (fm_list, fsv_list, ...) when they are accessed.
+
     CommandLine:
         python -m ibeis.algo.hots.match_chips4 --test-submit_query_request
 
@@ -86,14 +90,13 @@ def submit_query_request(qreq_, use_cache=None, use_bigcache=None,
         is_big = len(qreq_.qaids) > MIN_BIGCACHE_BUNDLE
         use_bigcache_ = (use_bigcache and use_cache and is_big)
         if (use_bigcache_ or save_qcache):
-            cacher = qreq_.get_big_cacher()
+            store_fpath = qreq_.get_big_cmstore_fpath()
             if use_bigcache_:
-                try:
-                    qaid2_cm = cacher.load()
-                    cm_list = [qaid2_cm[qaid] for qaid in qreq_.qaids]
-                except (IOError, AttributeError):
-                    pass
-                else:
+                cm_list = load_bigcache(qreq_, store_fpath, lazy=lazy)
+                qreq_.get_stage_profile().record_cache(
+                    'bigcache', hits=int(cm_list is not None),
+                    misses=int(cm_list is None))
+                if cm_list is not None:
                     return cm_list
         # ------------
         # Execute query request
@@ -103,9 +106,33 @@ def submit_query_request(qreq_, use_cache=None, use_bigcache=None,
                                              invalidate_supercache=invalidate_supercache)
         # ------------
         if save_qcache and is_big:
-            cacher.save(qaid2_cm)
+            chip_match_store.ChipMatchStore.write(
+                store_fpath, ut.take(qaid2_cm, qreq_.qaids))
+
+        cm_list = [qaid2_cm[qaid] for qaid in qreq_.qaids]
+    return cm_list
+
+
+def load_bigcache(qreq_, store_fpath, lazy=False):
+    r"""
+    Loads the results of a whole query request from its ChipMatchStore.
+    Results in the old pickled big cache are migrated into a store.
 
+    Returns:
+        list: cm_list or None on a cache miss
+    """
+    store = chip_match_store.load_store_or_none(store_fpath)
+    if store is not None and all(qaid in store for qaid in qreq_.qaids):
+        return store.load_many(qreq_.qaids, lazy=lazy)
+    cacher = qreq_.get_big_cacher()
+    try:
+        qaid2_cm = cacher.load()
         cm_list = [qaid2_cm[qaid] for qaid in qreq_.qaids]
+    except (IOError, AttributeError, KeyError):
+        return None
+    print('[mc4] migrating big cache to %s' % (store_fpath,))
+    chip_match_store.ChipMatchStore.write(store_fpath, cm_list)
+    ut.delete(cacher.get_fpath(), verbose=False)
     return cm_list
 
 
@@ -254,6 +281,9 @@ def execute_query_and_save_L1(qreq_, use_cache, save_qcache, verbose=True,
                     qaid2_cm_hit[cm.qaid] = cm
             print('%d / %d cached matches need to be recomputed' % (
                 len(qaids_hit) - len(qaid2_cm_hit), len(qaids_hit)))
+        qreq_.get_stage_profile().record_cache(
+            'chipmatch', hits=len(qaid2_cm_hit),
+            misses=len(external_qaids) - len(qaid2_cm_hit))
         if len(qaid2_cm_hit) == len(external_qaids):
             return qaid2_cm_hit
         else:
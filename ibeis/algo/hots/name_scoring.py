@@ -113,6 +113,8 @@ def compute_fmech_score(cm, qreq_=None, hack_single_ori=False):
             )
         except AttributeError:
             hack_single_ori =  True
+    if getattr(cm, 'is_flat', False):
+        return compute_fmech_score_flat(cm, qreq_, hack_single_ori)
     # The core for each feature match
     #
     # The query feature index for each feature match
@@ -168,6 +170,60 @@ def compute_fmech_score(cm, qreq_=None, hack_single_ori=False):
     return nsum_score_list
 
 
+@profile
+def compute_fmech_score_flat(cm, qreq_=None, hack_single_ori=False):
+    r"""
+    nsum for a FlatChipMatch. Instead of looping over names, each feature
+    match is keyed by its (name, query feature) pair and only the best
+    scoring match of each key votes.
+
+    CommandLine:
+        python -m ibeis.algo.hots.name_scoring --test-compute_fmech_score_flat
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.name_scoring import *  # NOQA
+        >>> from ibeis.algo.hots import chip_match
+        >>> cm_ = testdata_chipmatch()
+        >>> cm = chip_match.FlatChipMatch.from_chipmatch(cm_)
+        >>> nsum_score_list = compute_fmech_score_flat(cm)
+        >>> assert np.all(nsum_score_list == compute_fmech_score(cm_))
+        >>> assert np.all(nsum_score_list == [ 4.,  7.,  5.])
+    """
+    fs = cm.get_flat_fs()
+    num_names = len(cm.name_groupxs)
+    if len(fs) == 0:
+        return np.zeros(num_names)
+    fx1 = cm.flat_fm.T[0]
+    if hack_single_ori:
+        # Group keypoints with the same xy-coordinate.
+        kpts1 = qreq_.ibs.get_annot_kpts(
+            cm.qaid, config2_=qreq_.extern_query_config2)
+        xys1_ = vt.get_xys(kpts1).T
+        fx1_to_comboid = vt.compute_unique_arr_dataids(xys1_)
+        fcombo_ids = fx1_to_comboid.take(fx1)
+    else:
+        fcombo_ids = fx1
+    fcombo_ids = fcombo_ids.astype(np.int64)
+    # The name index of each feature match
+    daid_nidx = np.empty(len(cm.daid_list), dtype=np.int64)
+    name_lens = [len(idxs) for idxs in cm.name_groupxs]
+    daid_nidx[np.hstack(cm.name_groupxs)] = np.repeat(np.arange(num_names),
+                                                      name_lens)
+    match_nidx = daid_nidx.take(cm.get_flat_daidxs())
+    # Features (with the same id) can't vote for a name twice
+    keys = match_nidx * (fcombo_ids.max() + 1) + fcombo_ids
+    sortx = np.lexsort((-fs, keys))
+    sorted_keys = keys.take(sortx)
+    isfirst = np.ones(len(sortx), dtype=np.bool)
+    np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=isfirst[1:])
+    bestx = sortx[isfirst]
+    nsum_score_list = np.bincount(match_nidx.take(bestx),
+                                  weights=fs.take(bestx),
+                                  minlength=num_names)
+    return nsum_score_list
+
+
 @profile
 def get_chipmatch_namescore_nonvoting_feature_flags(cm, qreq_=None):
     """
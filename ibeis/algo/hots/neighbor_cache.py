@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar on-disk cache for nearest neighbor results.
+
+Instead of writing one pickle per query annotation, the idx / dist / qfx
+arrays of many queries are appended into a single data file. A small offset
+table maps a (query visual-uuid, config hash) key to the location and shape
+of each column in the data file. The data file is memory-mapped so cached
+neighbors are returned as views without any unpickling.
+
+Layout::
+    <cachedir>/<name>.data  - concatenated raw column blocks
+    <cachedir>/<name>.table - pickled offset table
+    <cachedir>/<name>.lock  - held while the files above are read or changed
+
+Several processes may share one cache directory. Every change to the files
+happens under the lock, starting from the table on disk, so appends and
+compactions from different processes cannot overwrite each other.
+
+CommandLine:
+    python -m ibeis.algo.hots.neighbor_cache --allexamples
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import os
+import lockfile
+import numpy as np
+import utool as ut
+from os.path import join, exists
+from six.moves import zip, range  # NOQA
+(print, rrr, profile) = ut.inject2(__name__)
+
+
+# Column blocks start on this byte alignment
+ALIGN = 16
+NN_CACHE_MAXBYTES = ut.get_argval('--nn-cache-maxbytes', type_=int,
+                                  default=4 * (2 ** 30))
+# The fraction of max_bytes kept after an eviction
+EVICT_FRACTION = .75
+
+COLUMNS = ('idx', 'dist', 'qfx')
+
+
+class NeighborCache(ut.NiceRepr):
+    r"""
+    Append-only columnar store of Neighbors results with size bounded LRU
+    eviction.
+
+    Args:
+        cachedir (str): directory to store the cache files in
+        name (str): prefix of the cache files
+        max_bytes (int): size of the data file that triggers an eviction
+
+    CommandLine:
+        python -m ibeis.algo.hots.neighbor_cache NeighborCache
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.neighbor_cache import *  # NOQA
+        >>> from ibeis.algo.hots.pipeline import Neighbors
+        >>> cachedir = ut.ensure_app_resource_dir('ibeis', 'test_nncache')
+        >>> nn_cache = NeighborCache(cachedir, 'test', max_bytes=2000)
+        >>> nn_cache.clear()
+        >>> rng = np.random.RandomState(0)
+        >>> def make_nns(qaid, num):
+        >>>     idxs = rng.randint(0, 100, size=(num, 3)).astype(np.int32)
+        >>>     dists = rng.rand(num, 3).astype(np.float32)
+        >>>     return Neighbors(qaid, idxs, dists, np.arange(num))
+        >>> nns_list = [make_nns(qaid, 10) for qaid in [1, 2, 3]]
+        >>> keys = [('uuid1', 'cfg'), ('uuid2', 'cfg'), ('uuid3', 'cfg')]
+        >>> nn_cache.append(keys, nns_list)
+        >>> hit_flags = nn_cache.lookup(keys + [('uuid4', 'cfg')])
+        >>> assert hit_flags == [True, True, True, False]
+        >>> nn_cache2 = NeighborCache(cachedir, 'test')
+        >>> loaded = nn_cache2.load([1, 2, 3], keys)
+        >>> assert np.all(loaded[1].neighb_idxs == nns_list[1].neighb_idxs)
+        >>> assert np.all(loaded[2].neighb_dists == nns_list[2].neighb_dists)
+        >>> # Overfilling the cache evicts the least recently used entries
+        >>> more_keys = [('uuid%d' % x, 'cfg') for x in range(4, 12)]
+        >>> nn_cache.append(more_keys, [make_nns(x, 10) for x in range(4, 12)])
+        >>> assert nn_cache.total_bytes() <= 2000
+        >>> assert not all(nn_cache.lookup(keys))
+        >>> nn_cache.clear()
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> # Two handles on one cache behave like two processes sharing it
+        >>> from ibeis.algo.hots.neighbor_cache import *  # NOQA
+        >>> from ibeis.algo.hots.pipeline import Neighbors
+        >>> cachedir = ut.ensure_app_resource_dir('ibeis', 'test_nncache')
+        >>> cache1 = NeighborCache(cachedir, 'shared', max_bytes=10 ** 6)
+        >>> cache1.clear()
+        >>> cache2 = NeighborCache(cachedir, 'shared', max_bytes=10 ** 6)
+        >>> rng = np.random.RandomState(0)
+        >>> def make_nns(qaid, num):
+        >>>     idxs = rng.randint(0, 100, size=(num, 3)).astype(np.int32)
+        >>>     dists = rng.rand(num, 3).astype(np.float32)
+        >>>     return Neighbors(qaid, idxs, dists, np.arange(num))
+        >>> nns1, nns2, nns3 = [make_nns(qaid, 10) for qaid in [1, 2, 3]]
+        >>> cache1.append([('uuid1', 'cfg')], [nns1])
+        >>> cache2.append([('uuid2', 'cfg')], [nns2])
+        >>> cache1.append([('uuid3', 'cfg')], [nns3])
+        >>> cache2.compact()
+        >>> keys = [('uuid1', 'cfg'), ('uuid2', 'cfg'), ('uuid3', 'cfg')]
+        >>> for cache in [cache1, cache2, NeighborCache(cachedir, 'shared')]:
+        >>>     cache.refresh()
+        >>>     assert all(cache.lookup(keys))
+        >>>     loaded = cache.load([1, 2, 3], keys)
+        >>>     for nns, nns_ in zip([nns1, nns2, nns3], loaded):
+        >>>         assert np.all(nns.neighb_idxs == nns_.neighb_idxs)
+        >>>         assert np.all(nns.neighb_dists == nns_.neighb_dists)
+        >>> cache1.clear()
+    """
+
+    def __init__(nn_cache, cachedir, name='neighbs', max_bytes=None):
+        if max_bytes is None:
+            max_bytes = NN_CACHE_MAXBYTES
+        nn_cache.cachedir = cachedir
+        nn_cache.name = name
+        nn_cache.max_bytes = max_bytes
+        nn_cache.data_fpath = join(cachedir, name + '.data')
+        nn_cache.table_fpath = join(cachedir, name + '.table')
+        nn_cache.lock_fpath = join(cachedir, name + '.lock')
+        # maps key -> entry dict
+        nn_cache.table = {}
+        # monotonic access counter used for LRU ordering
+        nn_cache.clock = 0
+        nn_cache._mmap = None
+        with nn_cache._lock():
+            nn_cache._load_table()
+
+    def __nice__(nn_cache):
+        return '%s nEntries=%d nBytes=%s' % (
+            nn_cache.name, len(nn_cache.table),
+            ut.byte_str2(nn_cache.total_bytes()))
+
+    def __len__(nn_cache):
+        return len(nn_cache.table)
+
+    # --- Persistence ---
+
+    def _lock(nn_cache):
+        ut.ensuredir(nn_cache.cachedir)
+        return lockfile.LockFile(nn_cache.lock_fpath)
+
+    def _load_table(nn_cache):
+        """
+        Replaces the in-memory table with the one on disk. Access times
+        recorded by this process since the last save are kept. Must be called
+        with the lock held.
+        """
+        if not (exists(nn_cache.table_fpath) and exists(nn_cache.data_fpath)):
+            nn_cache.table = {}
+            return
+        try:
+            state = ut.load_cPkl(nn_cache.table_fpath, verbose=False)
+        except Exception as ex:
+            ut.printex(ex, 'neighbor cache table is corrupt. resetting',
+                       iswarning=True)
+            nn_cache._clear()
+            return
+        old_table = nn_cache.table
+        # Entries past the end of the data file come from an interrupted
+        # write and cannot be trusted.
+        data_nbytes = os.path.getsize(nn_cache.data_fpath)
+        nn_cache.table = {
+            key: entry for key, entry in state['table'].items()
+            if entry['end'] <= data_nbytes
+        }
+        nn_cache.clock = max(nn_cache.clock, state['clock'])
+        for key, entry in nn_cache.table.items():
+            if key in old_table:
+                entry['atime'] = max(entry['atime'], old_table[key]['atime'])
+
+    def _save_table(nn_cache):
+        state = {'table': nn_cache.table, 'clock': nn_cache.clock}
+        ut.save_cPkl(nn_cache.table_fpath, state, verbose=False)
+
+    def _get_mmap(nn_cache):
+        if nn_cache._mmap is None:
+            if not exists(nn_cache.data_fpath) or os.path.getsize(nn_cache.data_fpath) == 0:
+                return None
+            # copy-on-write so callers may modify arrays without touching
+            # the file.
+            nn_cache._mmap = np.memmap(nn_cache.data_fpath, dtype=np.uint8,
+                                       mode='c')
+        return nn_cache._mmap
+
+    def _close_mmap(nn_cache):
+        nn_cache._mmap = None
+
+    def refresh(nn_cache):
+        """
+        Rereads the table and reopens the data file as one consistent
+        snapshot, picking up entries appended by other processes. Views
+        returned by `load` stay valid even if another process compacts the
+        file afterwards.
+        """
+        with nn_cache._lock():
+            nn_cache._close_mmap()
+            nn_cache._load_table()
+            nn_cache._get_mmap()
+
+    def clear(nn_cache):
+        """ removes all cache files """
+        with nn_cache._lock():
+            nn_cache._clear()
+
+    def _clear(nn_cache):
+        nn_cache._close_mmap()
+        ut.delete(nn_cache.data_fpath, verbose=False)
+        ut.delete(nn_cache.table_fpath, verbose=False)
+        nn_cache.table = {}
+        nn_cache.clock = 0
+
+    def total_bytes(nn_cache):
+        if not exists(nn_cache.data_fpath):
+            return 0
+        return os.path.getsize(nn_cache.data_fpath)
+
+    # --- Lookup ---
+
+    def lookup(nn_cache, key_list):
+        """
+        Returns:
+            list: hit_flags - True if a key is in the cache
+        """
+        table = nn_cache.table
+        return [key in table for key in key_list]
+
+    def load(nn_cache, qaid_list, key_list):
+        """
+        Loads cached Neighbors. All keys must be in the cache snapshot
+        taken by the last `refresh`.
+
+        Returns:
+            list: nns_list where the arrays are views into the memory-mapped
+                data file.
+        """
+        from ibeis.algo.hots.pipeline import Neighbors
+        if nn_cache._mmap is None:
+            nn_cache.refresh()
+        mmap = nn_cache._mmap
+        nns_list = []
+        for qaid, key in zip(qaid_list, key_list):
+            entry = nn_cache.table[key]
+            nn_cache.clock += 1
+            entry['atime'] = nn_cache.clock
+            idxs, dists, qfxs = [
+                _read_column(mmap, entry[col]) for col in COLUMNS]
+            nns_list.append(Neighbors(qaid, idxs, dists, qfxs))
+        return nns_list
+
+    # --- Insertion ---
+
+    def append(nn_cache, key_list, nns_list):
+        """
+        Appends the columns of each Neighbors object to the end of the data
+        file, updates the offset table, and evicts old entries if the cache
+        has grown too large.
+        """
+        if len(key_list) == 0:
+            return
+        with nn_cache._lock():
+            # Data appended to the file is not visible to an existing mmap
+            nn_cache._close_mmap()
+            # Another process may have appended or compacted since the table
+            # was read, so offsets are taken from the files on disk.
+            nn_cache._load_table()
+            offset = nn_cache.total_bytes()
+            with open(nn_cache.data_fpath, 'ab') as file_:
+                for key, nns in zip(key_list, nns_list):
+                    entry = {}
+                    for col, arr in zip(COLUMNS, (nns.neighb_idxs,
+                                                  nns.neighb_dists,
+                                                  nns.qfx_list)):
+                        offset, entry[col] = _write_column(file_, offset, arr)
+                    nn_cache.clock += 1
+                    entry['atime'] = nn_cache.clock
+                    entry['end'] = offset
+                    nn_cache.table[key] = entry
+            if nn_cache.total_bytes() > nn_cache.max_bytes:
+                nn_cache._evict(int(nn_cache.max_bytes * EVICT_FRACTION))
+            nn_cache._save_table()
+
+    def evict(nn_cache, target_bytes):
+        """
+        Removes least recently used entries until the live data fits in
+        `target_bytes` and then compacts the data file.
+        """
+        with nn_cache._lock():
+            nn_cache._close_mmap()
+            nn_cache._load_table()
+            nn_cache._evict(target_bytes)
+            nn_cache._save_table()
+
+    def _evict(nn_cache, target_bytes):
+        lru_keys = sorted(nn_cache.table.keys(),
+                          key=lambda k: nn_cache.table[k]['atime'])
+        live_bytes = sum(_entry_nbytes(e) for e in nn_cache.table.values())
+        num_evicted = 0
+        for key in lru_keys:
+            if live_bytes <= target_bytes:
+                break
+            live_bytes -= _entry_nbytes(nn_cache.table.pop(key))
+            num_evicted += 1
+        if ut.VERBOSE:
+            print('[nncache] evicted %d entries' % (num_evicted,))
+        nn_cache._compact()
+
+    def compact(nn_cache):
+        """ rewrites the data file so it only contains live entries """
+        with nn_cache._lock():
+            nn_cache._close_mmap()
+            nn_cache._load_table()
+            nn_cache._compact()
+            nn_cache._save_table()
+
+    def _compact(nn_cache):
+        mmap = nn_cache._get_mmap()
+        tmp_fpath = nn_cache.data_fpath + '.tmp'
+        new_table = {}
+        offset = 0
+        # Preserve file order of entries so compaction is sequential
+        keys = sorted(nn_cache.table.keys(),
+                      key=lambda k: nn_cache.table[k]['end'])
+        with open(tmp_fpath, 'wb') as file_:
+            for key in keys:
+                old_entry = nn_cache.table[key]
+                entry = {'atime': old_entry['atime']}
+                for col in COLUMNS:
+                    arr = _read_column(mmap, old_entry[col])
+                    offset, entry[col] = _write_column(file_, offset, arr)
+                entry['end'] = offset
+                new_table[key] = entry
+        nn_cache._close_mmap()
+        del mmap
+        os.rename(tmp_fpath, nn_cache.data_fpath)
+        nn_cache.table = new_table
+
+    def tryload_with_compute(nn_cache, qaid_list, key_list, compute_fn,
+                             *args):
+        """
+        Bulk lookup of all keys in one pass. Misses are computed together by
+        `compute_fn(flags_list, *args)` and appended to the cache.
+        """
+        nn_cache.refresh()
+        hit_flags = nn_cache.lookup(key_list)
+        miss_flags = ut.not_list(hit_flags)
+        nns_list = [None] * len(key_list)
+        if any(hit_flags):
+            hit_xs = ut.where(hit_flags)
+            hit_nns = nn_cache.load(ut.take(qaid_list, hit_xs),
+                                    ut.take(key_list, hit_xs))
+            for x, nns in zip(hit_xs, hit_nns):
+                nns_list[x] = nns
+        if any(miss_flags):
+            miss_xs = ut.where(miss_flags)
+            miss_nns = compute_fn(miss_flags, *args)
+            nn_cache.append(ut.take(key_list, miss_xs), miss_nns)
+            for x, nns in zip(miss_xs, miss_nns):
+                nns_list[x] = nns
+        if ut.VERBOSE:
+            print('[nncache] %d / %d cache hits' % (sum(hit_flags),
+                                                     len(hit_flags)))
+        return nns_list
+
+
+def _write_column(file_, offset, arr):
+    """
+    Writes an aligned array block and returns the new offset and the column
+    descriptor.
+    """
+    if arr is None:
+        return offset, None
+    arr = np.ascontiguousarray(arr)
+    pad = (-offset) % ALIGN
+    if pad:
+        file_.write(b'\x00' * pad)
+        offset += pad
+    file_.write(arr.tobytes())
+    col = (offset, arr.dtype.str, arr.shape)
+    offset += arr.nbytes
+    return offset, col
+
+
+def _read_column(mmap, col):
+    """ zero-copy view of a column block """
+    if col is None:
+        return None
+    start, dtype, shape = col
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    if nbytes == 0:
+        return np.empty(shape, dtype=dtype)
+    return mmap[start:start + nbytes].view(dtype).reshape(shape)
+
+
+def _entry_nbytes(entry):
+    total = 0
+    for col in COLUMNS:
+        if entry[col] is not None:
+            start, dtype, shape = entry[col]
+            total += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return total
+
+
+if __name__ == '__main__':
+    r"""
+    CommandLine:
+        python -m ibeis.algo.hots.neighbor_cache
+        python -m ibeis.algo.hots.neighbor_cache --allexamples
+    """
+    import multiprocessing
+    multiprocessing.freeze_support()  # for win32
+    import utool as ut  # NOQA
+    ut.doctest_funcs()
@@ -8,6 +8,7 @@ https://github.com/spotify/annoy
 """
 from __future__ import absolute_import, division, print_function
 import six
+import threading
 import numpy as np
 import utool as ut
 import vtool_ibeis as vt
@@ -23,6 +24,13 @@ from ibeis.algo.hots import _pipeline_helpers as plh  # NOQA
 USE_HOTSPOTTER_CACHE = not ut.get_argflag('--nocache-hs')
 NOSAVE_FLANN = ut.get_argflag('--nosave-flann')
 NOCACHE_FLANN = ut.get_argflag('--nocache-flann') and USE_HOTSPOTTER_CACHE
+# Maximum number of query vectors sent to FLANN in a single stacked call
+STACK_CHUNKSIZE = ut.get_argval('--nn-stack-chunksize', type_=int,
+                                default=2 ** 17)
+# Fraction of tombstoned vectors that triggers compaction of an incremental index
+COMPACT_THRESH = ut.get_argval('--nn-compact-thresh', type_=float, default=.25)
+# Number of threads used to search the shards of a sharded index
+SHARD_WORKERS = ut.get_argval('--nn-shard-workers', type_=int, default=4)
 
 
 def get_support_data(qreq_, daid_list):
@@ -57,6 +65,8 @@ def get_support_data(qreq_, daid_list):
         depth_profile = [[(13, 128), (104, 128)], [13, 104], [13, 104]]
     """
     config2_ = qreq_.get_internal_data_config2()
+    # With a feat store the vecs are views that are gathered once at the end
+    use_store = qreq_.ibs._use_feat_store
     vecs_list = qreq_.ibs.get_annot_vecs(daid_list, config2_=config2_)
     # Create corresponding feature indicies
     fxs_list = [np.arange(len(vecs)) for vecs in vecs_list]
@@ -72,7 +82,8 @@ def get_support_data(qreq_, daid_list):
         scales_list = [vt.get_scales(kpts) for kpts in kpts_list]
         # Remove data under the threshold
         flags_list = [np.logical_and(scales >= min_, scales <= max_) for scales in scales_list]
-        vecs_list = vt.zipcompress(vecs_list, flags_list, axis=0)
+        if not use_store:
+            vecs_list = vt.zipcompress(vecs_list, flags_list, axis=0)
         fxs_list = vt.zipcompress(fxs_list, flags_list, axis=0)
 
     if qreq_.qparams.fg_on:
@@ -86,11 +97,15 @@ def get_support_data(qreq_, daid_list):
             flags_list = [fgws > config2_.fgw_thresh for fgws in fgws_list]
             # Remove data under the threshold
             fgws_list = vt.zipcompress(fgws_list, flags_list, axis=0)
-            vecs_list = vt.zipcompress(vecs_list, flags_list, axis=0)
+            if not use_store:
+                vecs_list = vt.zipcompress(vecs_list, flags_list, axis=0)
             fxs_list = vt.zipcompress(fxs_list, flags_list, axis=0)
     else:
         fgws_list = None
     # </HACK:featweight>
+    if use_store:
+        vecs_list = qreq_.ibs.get_annot_feat_store_rows(
+            daid_list, 'vecs', fxs_list, config2_=config2_)
     return vecs_list, fgws_list, fxs_list
 
 
@@ -148,6 +163,12 @@ def invert_index(vecs_list, fgws_list, ax_list, fxs_list, verbose=ut.NOT_QUIET):
     if ut.VERYVERBOSE:
         print('[nnindex] stacking descriptors from %d annotations' % len(ax_list))
     try:
+        if hasattr(vecs_list, 'stack'):
+            # FeatRows from a feat store are stacked with a single gather.
+            # Annots without features contribute no rows.
+            idx2_vec = vecs_list.stack()
+        else:
+            idx2_vec = None
         nFeat_list = np.array(list(map(len, vecs_list)))
         # Remove input without any features
         is_valid = nFeat_list > 0
@@ -163,7 +184,8 @@ def invert_index(vecs_list, fgws_list, ax_list, fxs_list, verbose=ut.NOT_QUIET):
         nFeats = sum(nFeat_list)
         idx2_ax = np.fromiter(ut.iflatten(axs_list), np.int32, nFeats)
         idx2_fx = np.fromiter(ut.iflatten(fxs_list), np.int32, nFeats)
-        idx2_vec = np.vstack(vecs_list)
+        if idx2_vec is None:
+            idx2_vec = np.vstack(vecs_list)
         if fgws_list is None:
             idx2_fgw = None
         else:
@@ -297,7 +319,7 @@ class NeighborIndex(object):
             tup = get_support_data(qreq_, new_daid_list_)
             new_vecs_list, new_fgws_list, new_fxs_list = tup
             nnindexer.add_support(new_daid_list_, new_vecs_list, new_fgws_list,
-                                  verbose=verbose)
+                                  new_fxs_list, verbose=verbose)
 
     def remove_ibeis_support(nnindexer, qreq_, remove_daid_list,
                              verbose=ut.NOT_QUIET):
@@ -795,6 +817,148 @@ class NeighborIndex(object):
             idxs[sl_], dists[sl_] = indexer.knn(vecs[sl_], K=K)
         return idxs, dists
 
+    @profile
+    def stacked_knn(indexer, qvecs_list, K_list, chunksize=STACK_CHUNKSIZE,
+                    prog_hook=None, label='stacked knn'):
+        r"""
+        Works like calling `indexer.knn` on each item in `qvecs_list`, but
+        queries with the same K are stacked into one contiguous buffer so
+        FLANN is called once per chunk instead of once per annotation.
+
+        Args:
+            qvecs_list (list): (N_i x D) query vectors for each annotation
+            K_list (list): number of neighbors for each annotation
+            chunksize (int): max number of vectors in a single FLANN call. A
+                single annotation is never split across chunks.
+
+        Returns:
+            list: idx_dist_list - a (qfx2_idx, qfx2_dist) tuple for each
+                annotation. Each array is a view into the stacked result.
+
+        CommandLine:
+            python -m ibeis.algo.hots.neighbor_index stacked_knn
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from ibeis.algo.hots.neighbor_index import *  # NOQA
+            >>> indexer, qreq_, ibs = testdata_nnindexer()
+            >>> config2_ = qreq_.get_internal_query_config2()
+            >>> qvecs_list = ibs.get_annot_vecs([1, 2, 3], config2_=config2_)
+            >>> K_list = [2, 3, 2]
+            >>> idx_dist_list = indexer.stacked_knn(qvecs_list, K_list,
+            >>>                                     chunksize=1000)
+            >>> for qfx2_vec, K, (idxs, dists) in zip(qvecs_list, K_list, idx_dist_list):
+            >>>     (idxs1, dists1) = indexer.knn(qfx2_vec, K)
+            >>>     assert np.all(idxs == idxs1)
+            >>>     assert np.all(dists == dists1)
+        """
+        idx_dist_list = [None] * len(qvecs_list)
+        nvecs_list = list(map(len, qvecs_list))
+        chunks = stacked_query_chunks(nvecs_list, K_list, chunksize)
+        prog = ut.ProgIter(chunks, length=len(chunks), label=label,
+                           prog_hook=prog_hook, enabled=len(chunks) > 1)
+        for K, xs in prog:
+            qvecs_stack = stack_query_vecs(ut.take(qvecs_list, xs))
+            (idxs, dists) = indexer.knn(qvecs_stack, K)
+            if len(idxs) != len(qvecs_stack):
+                # The corner case where K is too large returns empty results
+                # for the entire stack. Fallback to individual queries.
+                for x in xs:
+                    idx_dist_list[x] = indexer.knn(qvecs_list[x], K)
+                continue
+            slices = ut.take(nvecs_list, xs)
+            for x, sl_ in zip(xs, stack_slices(slices)):
+                idx_dist_list[x] = (idxs[sl_], dists[sl_])
+        return idx_dist_list
+
+    @profile
+    def stacked_requery_knn(indexer, qvecs_list, K, pad_list,
+                            impossible_aids_list, recover=True,
+                            chunksize=STACK_CHUNKSIZE, prog_hook=None,
+                            label='stacked requery knn'):
+        r"""
+        Works like calling `indexer.requery_knn` on each item in
+        `qvecs_list`, but stacks queries with the same pad into a single
+        search. Per-annotation impossible aids are tracked by a group index
+        for each row of the stack.
+
+        Returns:
+            list: idx_dist_list - a (qfx2_idx, qfx2_dist) tuple for each
+                annotation. Each array is a view into the stacked result.
+
+        CommandLine:
+            python -m ibeis.algo.hots.neighbor_index stacked_requery_knn
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from ibeis.algo.hots.neighbor_index import *  # NOQA
+            >>> import ibeis
+            >>> qreq_ = ibeis.testdata_qreq_(defaultdb='testdb1', a='default')
+            >>> qreq_.load_indexer()
+            >>> indexer = qreq_.indexer
+            >>> qannots = qreq_.internal_qannots[0:3]
+            >>> qvecs_list = qannots.vecs
+            >>> K = 3
+            >>> pad_list = [1, 1, 2]
+            >>> impossible_aids_list = [[1, 2], [3], [4, 5]]
+            >>> idx_dist_list = indexer.stacked_requery_knn(
+            >>>     qvecs_list, K, pad_list, impossible_aids_list)
+            >>> for tup in zip(qvecs_list, pad_list, impossible_aids_list, idx_dist_list):
+            >>>     qfx2_vec, pad, impossible_aids, (idxs, dists) = tup
+            >>>     idxs1, dists1 = indexer.requery_knn(qfx2_vec, K, pad, impossible_aids)
+            >>>     assert np.all(idxs == idxs1)
+            >>>     assert np.allclose(dists, dists1)
+        """
+        from ibeis.algo.hots import requery_knn
+        if K == 0 or K > indexer.num_indexed:
+            # Corner cases are handled by the single query version
+            return [
+                indexer.requery_knn(qfx2_vec, K, pad, impossible_aids,
+                                    recover=recover)
+                for qfx2_vec, pad, impossible_aids in
+                zip(qvecs_list, pad_list, impossible_aids_list)
+            ]
+
+        def get_neighbors(vecs, temp_K):
+            return indexer.flann.nn_index(vecs, temp_K, checks=indexer.checks,
+                                          cores=indexer.cores)
+        get_axs = indexer.get_nn_axs
+
+        idx_dist_list = [None] * len(qvecs_list)
+        nvecs_list = list(map(len, qvecs_list))
+        chunks = stacked_query_chunks(nvecs_list, pad_list, chunksize)
+        prog = ut.ProgIter(chunks, length=len(chunks), label=label,
+                           prog_hook=prog_hook, enabled=len(chunks) > 1)
+        for pad, xs in prog:
+            lens = ut.take(nvecs_list, xs)
+            qvecs_stack = stack_query_vecs(ut.take(qvecs_list, xs))
+            if len(qvecs_stack) == 0:
+                for x in xs:
+                    idx_dist_list[x] = indexer.empty_neighbors(0, K)
+                continue
+            qfx2_groupx = np.repeat(np.arange(len(xs)), lens)
+            invalid_axs_list = [
+                np.array(ut.take(indexer.aid2_ax, impossible_aids),
+                         dtype=np.int64)
+                for impossible_aids in ut.take(impossible_aids_list, xs)
+            ]
+            try:
+                (idxs, raw_dists) = requery_knn.requery_knn(
+                    get_neighbors, get_axs, qvecs_stack, num_neighbs=K,
+                    pad=pad, invalid_axs=invalid_axs_list, limit=3,
+                    recover=recover, qfx2_groupx=qfx2_groupx)
+            except pyflann.FLANNException as ex:
+                ut.printex(ex, 'probably misread the cached flann_fpath=%r' %
+                           (indexer.flann_fpath,))
+                raise
+            if indexer.max_distance_sqrd is not None:
+                dists = np.divide(raw_dists, indexer.max_distance_sqrd)
+            else:
+                dists = raw_dists
+            for x, sl_ in zip(xs, stack_slices(lens)):
+                idx_dist_list[x] = (idxs[sl_], dists[sl_])
+        return idx_dist_list
+
     def debug_nnindexer(nnindexer):
         r"""
         Makes sure the indexer has valid SIFT descriptors
@@ -891,6 +1055,40 @@ class NeighborIndex(object):
             raise
         return qfx2_aid
 
+    def get_idx2_nid(nnindexer, ax2_nid):
+        r"""
+        Maps every indexed feature to a name given the names of the indexed
+        annotations. The result is cached until the names or the number of
+        indexed features change, so repeated lookups of the same request
+        only cost a comparison of ax2_nid.
+
+        Args:
+            ax2_nid (ndarray): name rowid of each indexed annotation
+
+        Returns:
+            ndarray: idx2_nid
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from ibeis.algo.hots.neighbor_index import *  # NOQA
+            >>> nnindexer = NeighborIndex(None, None)
+            >>> nnindexer.idx2_ax = np.array([0, 0, 1, 2, 2, 2], dtype=np.int32)
+            >>> ax2_nid = np.array([7, -3, 7])
+            >>> idx2_nid = nnindexer.get_idx2_nid(ax2_nid)
+            >>> assert nnindexer.get_idx2_nid(ax2_nid.copy()) is idx2_nid
+            >>> print(idx2_nid)
+            [ 7  7 -3  7  7  7]
+        """
+        cache = getattr(nnindexer, '_idx2_nid_cache', None)
+        if cache is not None:
+            cached_ax2_nid, idx2_nid = cache
+            if (len(idx2_nid) == len(nnindexer.idx2_ax) and
+                    np.array_equal(cached_ax2_nid, ax2_nid)):
+                return idx2_nid
+        idx2_nid = ax2_nid.take(nnindexer.idx2_ax)
+        nnindexer._idx2_nid_cache = (ax2_nid, idx2_nid)
+        return idx2_nid
+
     def get_nn_featxs(nnindexer, qfx2_nnidx):
         r"""
         Args:
@@ -941,6 +1139,63 @@ def in1d_shape(arr1, arr2):
     return np.in1d(arr1, arr2).reshape(arr1.shape)
 
 
+def stacked_query_chunks(nvecs_list, key_list, chunksize):
+    r"""
+    Groups query annotations that can share a single nearest neighbor search
+    (i.e. have the same key) and splits each group into chunks containing at
+    most `chunksize` vectors. An annotation is never split across chunks.
+
+    Args:
+        nvecs_list (list): number of query vectors in each annotation
+        key_list (list): annotations with the same key are stacked together
+        chunksize (int): maximum number of vectors per chunk
+
+    Returns:
+        list: of (key, xs) tuples where xs indexes into the input lists
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.neighbor_index import *  # NOQA
+        >>> nvecs_list = [5, 3, 9, 2, 4, 0]
+        >>> key_list = [2, 3, 2, 2, 3, 2]
+        >>> chunks = stacked_query_chunks(nvecs_list, key_list, chunksize=8)
+        >>> result = ut.repr2(chunks, nl=0)
+        >>> print(result)
+        [(2, [0]), (2, [2]), (2, [3, 5]), (3, [1, 4])]
+    """
+    if chunksize is None:
+        chunksize = np.inf
+    key_to_xs = ut.group_items(range(len(key_list)), key_list)
+    chunks = []
+    for key in sorted(key_to_xs.keys()):
+        chunk_xs = []
+        chunk_nvecs = 0
+        for x in key_to_xs[key]:
+            nvecs = nvecs_list[x]
+            if len(chunk_xs) > 0 and chunk_nvecs + nvecs > chunksize:
+                chunks.append((key, chunk_xs))
+                chunk_xs = []
+                chunk_nvecs = 0
+            chunk_xs.append(x)
+            chunk_nvecs += nvecs
+        if len(chunk_xs) > 0:
+            chunks.append((key, chunk_xs))
+    return chunks
+
+
+def stack_query_vecs(qvecs_list):
+    """ stacks query vectors into a single contiguous buffer """
+    if len(qvecs_list) == 1:
+        return np.ascontiguousarray(qvecs_list[0])
+    return np.vstack(qvecs_list)
+
+
+def stack_slices(nvecs_list):
+    """ slices into a stacked buffer corresponding to each item """
+    offsets = np.hstack([[0], np.cumsum(nvecs_list)]).astype(np.int64)
+    return [slice(start, stop) for start, stop in zip(offsets[:-1], offsets[1:])]
+
+
 class NeighborIndex2(NeighborIndex, ut.NiceRepr):
     def __init__(nnindexer, flann_params=None, cfgstr=None):
         super(NeighborIndex2, nnindexer).__init__(flann_params, cfgstr)
@@ -985,6 +1240,7 @@ class NeighborIndex2(NeighborIndex, ut.NiceRepr):
         del state['idx2_vec']
         del state['idx2_ax']
         del state['idx2_fx']
+        state.pop('_idx2_nid_cache', None)
         #del state['flann_params']
         #del state['checks']
         #nnindexer.num_indexed = None
@@ -1019,6 +1275,749 @@ class NeighborIndex2(NeighborIndex, ut.NiceRepr):
     #     return conditional_knn_(nnindexer, qfx2_vec, num_neighbors, invalid_axs)
 
 
+class IncrementalNeighborIndex(NeighborIndex):
+    r"""
+    A NeighborIndex for live deployments where annotations are added and
+    removed all the time.
+
+    * Support data is kept in growable buffers and ``idx2_vec`` (and
+      friends) are views into the filled part of those buffers. Adding support
+      only copies the new data unless the buffers need to grow, so each add is
+      amortized O(number of new vectors).
+    * Removed vectors are tombstoned like in NeighborIndex. When the fraction
+      of tombstoned vectors exceeds ``compact_thresh`` the index is compacted:
+      the dead rows are dropped and the FLANN structure is rebuilt. With
+      ``background=True`` the rebuild happens in a background thread and the
+      compacted index is swapped in at the start of the next add / remove (or
+      an explicit call to ``finish_compaction``). Changes made while the
+      rebuild is running are replayed on the compacted index before the swap.
+    * Previously removed aids can be added back.
+
+    Note:
+        Compaction changes the idxs of the indexed vectors, so neighbor
+        indices returned before a swap must not be used to lookup aids / fxs
+        after it. The swap only happens inside of add / remove calls, which
+        already invalidate any in-flight neighbor results.
+
+    CommandLine:
+        python -m ibeis.algo.hots.neighbor_index IncrementalNeighborIndex
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.neighbor_index import *  # NOQA
+        >>> rng = np.random.RandomState(0)
+        >>> def support(aids):
+        >>>     vecs_list = [rng.randint(0, 255, (20, 128)).astype(np.uint8)
+        >>>                  for aid in aids]
+        >>>     fxs_list = [np.arange(len(vecs)) for vecs in vecs_list]
+        >>>     return vecs_list, None, fxs_list
+        >>> flann_params = {'algorithm': 'linear'}
+        >>> nnindexer = IncrementalNeighborIndex(flann_params, 'test',
+        >>>                                      compact_thresh=.5,
+        >>>                                      background=False)
+        >>> nnindexer.init_support([1, 2, 3], *support([1, 2, 3]), verbose=False)
+        >>> nnindexer.reindex(verbose=False)
+        >>> nnindexer.add_support([4, 5], *support([4, 5]), verbose=False)
+        >>> assert nnindexer.num_indexed_vecs() == 100
+        >>> nnindexer.remove_support([1, 2], verbose=False)
+        >>> assert nnindexer.num_removed == 40
+        >>> assert sorted(nnindexer.get_indexed_aids()) == [3, 4, 5]
+        >>> # Removing more than half of the vectors triggers compaction
+        >>> nnindexer.remove_support([3], verbose=False)
+        >>> assert nnindexer.num_removed == 0
+        >>> assert nnindexer.num_indexed_vecs() == 40
+        >>> # Previously removed aids can be added back
+        >>> vecs_list, _, fxs_list = support([1])
+        >>> nnindexer.add_support([1], vecs_list, None, fxs_list, verbose=False)
+        >>> assert sorted(nnindexer.get_indexed_aids()) == [1, 4, 5]
+        >>> qfx2_idx, qfx2_dist = nnindexer.knn(vecs_list[0], 1)
+        >>> assert np.all(nnindexer.get_nn_aids(qfx2_idx) == 1)
+        >>> assert np.all(nnindexer.get_nn_featxs(qfx2_idx).ravel() == np.arange(20))
+    """
+
+    def __init__(nnindexer, flann_params, cfgstr, compact_thresh=None,
+                 background=True, growth=1.5):
+        super(IncrementalNeighborIndex, nnindexer).__init__(flann_params, cfgstr)
+        if compact_thresh is None:
+            compact_thresh = COMPACT_THRESH
+        nnindexer.compact_thresh = compact_thresh
+        nnindexer.background = background
+        nnindexer.growth = growth
+        nnindexer.num_removed = 0  # number of tombstoned vectors
+        nnindexer._bufs = None
+        nnindexer._num_vecs = 0
+        nnindexer._num_annots = 0
+        nnindexer._lock = threading.RLock()
+        nnindexer._compact_thread = None
+        nnindexer._compacted = None
+        nnindexer._oplog = None
+
+    def init_support(nnindexer, aid_list, vecs_list, fgws_list, fxs_list,
+                     verbose=True):
+        super(IncrementalNeighborIndex, nnindexer).init_support(
+            aid_list, vecs_list, fgws_list, fxs_list, verbose=verbose)
+        nnindexer._init_buffers(nnindexer.ax2_aid, nnindexer.idx2_vec,
+                                nnindexer.idx2_fgw, nnindexer.idx2_ax,
+                                nnindexer.idx2_fx)
+
+    def _init_buffers(nnindexer, ax2_aid, idx2_vec, idx2_fgw, idx2_ax,
+                      idx2_fx):
+        nnindexer._bufs = {
+            'aid': ax2_aid,
+            'vec': idx2_vec,
+            'fgw': idx2_fgw,
+            'ax': idx2_ax,
+            'fx': idx2_fx,
+        }
+        nnindexer._num_annots = len(ax2_aid)
+        nnindexer._num_vecs = len(idx2_vec)
+        nnindexer._set_views()
+
+    def _set_views(nnindexer):
+        """ points the public arrays at the filled part of the buffers """
+        bufs = nnindexer._bufs
+        nvecs = nnindexer._num_vecs
+        nnindexer.ax2_aid = bufs['aid'][:nnindexer._num_annots]
+        nnindexer.idx2_vec = bufs['vec'][:nvecs]
+        nnindexer.idx2_ax = bufs['ax'][:nvecs]
+        nnindexer.idx2_fx = bufs['fx'][:nvecs]
+        nnindexer.idx2_fgw = None if bufs['fgw'] is None else bufs['fgw'][:nvecs]
+        nnindexer.num_indexed = nvecs
+        # Removed annotations are marked with -1 and are not looked up
+        live_axs = np.flatnonzero(nnindexer.ax2_aid != -1)
+        nnindexer.aid2_ax = dict(zip(nnindexer.ax2_aid.take(live_axs), live_axs))
+
+    def _reserve(nnindexer, num_vecs, num_annots):
+        """ grows buffers geometrically so appends are amortized O(1) """
+        bufs = nnindexer._bufs
+
+        def _grow(key, num_used, num_needed):
+            buf = bufs[key]
+            if buf is None or len(buf) >= num_needed:
+                return
+            capacity = max(num_needed, int(len(buf) * nnindexer.growth) + 1)
+            new_buf = np.empty((capacity,) + buf.shape[1:], dtype=buf.dtype)
+            new_buf[:num_used] = buf[:num_used]
+            bufs[key] = new_buf
+        _grow('aid', nnindexer._num_annots, num_annots)
+        for key in ['vec', 'fgw', 'ax', 'fx']:
+            _grow(key, nnindexer._num_vecs, num_vecs)
+
+    def tombstone_ratio(nnindexer):
+        if nnindexer._num_vecs == 0:
+            return 0.0
+        return nnindexer.num_removed / nnindexer._num_vecs
+
+    def add_support(nnindexer, new_daid_list, new_vecs_list, new_fgws_list,
+                    new_fxs_list, verbose=ut.NOT_QUIET):
+        r"""
+        Appends support data into the buffers and the FLANN structure.
+        Annotations that are already indexed are ignored.
+        """
+        with nnindexer._lock:
+            nnindexer.finish_compaction(wait=False)
+            if nnindexer._oplog is not None:
+                nnindexer._oplog.append(('add_support', (
+                    new_daid_list, new_vecs_list, new_fgws_list,
+                    new_fxs_list)))
+            is_new = ~np.in1d(new_daid_list, nnindexer.get_indexed_aids())
+            new_daid_list = np.asarray(new_daid_list).compress(is_new)
+            new_vecs_list = ut.compress(new_vecs_list, is_new)
+            new_fxs_list = ut.compress(new_fxs_list, is_new)
+            if nnindexer.idx2_fgw is not None:
+                assert new_fgws_list is not None, 'index requires fgws'
+                new_fgws_list = ut.compress(new_fgws_list, is_new)
+            else:
+                new_fgws_list = None
+            nNewAnnots = len(new_daid_list)
+            if nNewAnnots == 0:
+                if verbose:
+                    print('[nnindex] Nothing to add')
+                return
+            nAnnots = nnindexer._num_annots
+            nVecs = nnindexer._num_vecs
+            new_ax_list = np.arange(nAnnots, nAnnots + nNewAnnots)
+            nNewVecs = sum(map(len, new_vecs_list))
+            if verbose or ut.VERYVERBOSE:
+                print(('[nnindex] Adding %d vecs from %d annots to nnindex '
+                       'with %d vecs and %d annots') %
+                      (nNewVecs, nNewAnnots, nVecs, nAnnots))
+            nnindexer._reserve(nVecs + nNewVecs, nAnnots + nNewAnnots)
+            bufs = nnindexer._bufs
+            bufs['aid'][nAnnots:nAnnots + nNewAnnots] = new_daid_list
+            nnindexer._num_annots += nNewAnnots
+            if nNewVecs > 0:
+                tup = invert_index(new_vecs_list, new_fgws_list, new_ax_list,
+                                   new_fxs_list, verbose=verbose)
+                new_idx2_vec, new_idx2_fgw, new_idx2_ax, new_idx2_fx = tup
+                sl_ = slice(nVecs, nVecs + nNewVecs)
+                bufs['vec'][sl_] = new_idx2_vec
+                bufs['ax'][sl_] = new_idx2_ax
+                bufs['fx'][sl_] = new_idx2_fx
+                if bufs['fgw'] is not None:
+                    bufs['fgw'][sl_] = new_idx2_fgw
+                nnindexer._num_vecs += nNewVecs
+                nnindexer.flann.add_points(new_idx2_vec)
+            nnindexer._set_views()
+
+    def remove_support(nnindexer, remove_daid_list, verbose=ut.NOT_QUIET):
+        r"""
+        Tombstones the vectors of the removed annotations and compacts the
+        index if too many vectors are dead.
+        """
+        with nnindexer._lock:
+            nnindexer.finish_compaction(wait=False)
+            if nnindexer._oplog is not None:
+                nnindexer._oplog.append(('remove_support', (remove_daid_list,)))
+            ax2_remove_flag = np.in1d(nnindexer.ax2_aid, remove_daid_list)
+            remove_ax_list = np.flatnonzero(ax2_remove_flag)
+            remove_idx_list = np.flatnonzero(
+                np.in1d(nnindexer.idx2_ax, remove_ax_list))
+            if verbose:
+                print('[nnindex] Found %d / %d annots that need removing' %
+                      (len(remove_ax_list), len(remove_daid_list)))
+                print('[nnindex] Removing %d indexed features' %
+                      (len(remove_idx_list),))
+            if len(remove_ax_list) == 0:
+                return
+            if len(remove_idx_list) > 0:
+                nnindexer.flann.remove_points(remove_idx_list)
+            nnindexer.ax2_aid[remove_ax_list] = -1
+            nnindexer.idx2_fx[remove_idx_list] = -1
+            nnindexer.idx2_vec[remove_idx_list] = 0
+            if nnindexer.idx2_fgw is not None:
+                nnindexer.idx2_fgw[remove_idx_list] = np.nan
+            nnindexer.num_removed += len(remove_idx_list)
+            nnindexer._set_views()
+            if nnindexer.tombstone_ratio() > nnindexer.compact_thresh:
+                nnindexer.compact(blocking=not nnindexer.background,
+                                  verbose=verbose)
+
+    def _make_compacted(nnindexer):
+        """ copies the live support data into a new unbuilt indexer """
+        ax2_live = nnindexer.ax2_aid != -1
+        idx2_live = ax2_live.take(nnindexer.idx2_ax)
+        ax_remap = np.full(len(ax2_live), -1, dtype=nnindexer.idx2_ax.dtype)
+        ax_remap[ax2_live] = np.arange(ax2_live.sum())
+        new = IncrementalNeighborIndex(
+            nnindexer.flann_params, nnindexer.cfgstr,
+            compact_thresh=nnindexer.compact_thresh, background=False,
+            growth=nnindexer.growth)
+        new.flann = pyflann.FLANN()
+        new.max_distance_sqrd = nnindexer.max_distance_sqrd
+        new.checks = nnindexer.checks
+        new.cores = nnindexer.cores
+        idx2_fgw = (None if nnindexer.idx2_fgw is None else
+                    nnindexer.idx2_fgw.compress(idx2_live))
+        new._init_buffers(
+            nnindexer.ax2_aid.compress(ax2_live),
+            nnindexer.idx2_vec.compress(idx2_live, axis=0),
+            idx2_fgw,
+            ax_remap.take(nnindexer.idx2_ax.compress(idx2_live)),
+            nnindexer.idx2_fx.compress(idx2_live),
+        )
+        return new
+
+    def compact(nnindexer, blocking=True, verbose=ut.NOT_QUIET):
+        r"""
+        Drops tombstoned vectors and rebuilds the FLANN structure.
+
+        If the rebuild fails the live index is left as it was (it already
+        holds every change) and a later compaction can be started. A blocking
+        compaction reraises the error; a background one prints it.
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from ibeis.algo.hots.neighbor_index import *  # NOQA
+            >>> rng = np.random.RandomState(0)
+            >>> aids = [1, 2, 3, 4]
+            >>> vecs_list = [rng.randint(0, 255, (20, 128)).astype(np.uint8)
+            >>>              for aid in aids]
+            >>> fxs_list = [np.arange(len(vecs)) for vecs in vecs_list]
+            >>> nnindexer = IncrementalNeighborIndex({'algorithm': 'linear'}, 'test',
+            >>>                                      compact_thresh=1.0)
+            >>> nnindexer.init_support(aids, vecs_list, None, fxs_list, verbose=False)
+            >>> nnindexer.reindex(verbose=False)
+            >>> nnindexer.remove_support([1], verbose=False)
+            >>> # Inject a failure into the rebuild of the compacted index
+            >>> make_compacted = nnindexer._make_compacted
+            >>> def _failing_make_compacted():
+            >>>     new = make_compacted()
+            >>>     def _reindex(verbose=True):
+            >>>         raise RuntimeError('injected')
+            >>>     new.reindex = _reindex
+            >>>     return new
+            >>> nnindexer._make_compacted = _failing_make_compacted
+            >>> try:
+            >>>     nnindexer.compact(blocking=True, verbose=False)
+            >>> except RuntimeError:
+            >>>     pass
+            >>> else:
+            >>>     assert False, 'should have raised'
+            >>> assert nnindexer._oplog is None
+            >>> nnindexer.compact(blocking=False, verbose=False)
+            >>> nnindexer._compact_thread.join()
+            >>> nnindexer.remove_support([2], verbose=False)
+            >>> assert nnindexer._oplog is None
+            >>> assert nnindexer.num_removed == 40
+            >>> assert sorted(nnindexer.get_indexed_aids()) == [3, 4]
+            >>> # Once the failure is gone compaction works again
+            >>> del nnindexer._make_compacted
+            >>> nnindexer.compact(blocking=True, verbose=False)
+            >>> assert nnindexer.num_removed == 0
+            >>> assert nnindexer.num_indexed_vecs() == 40
+            >>> qfx2_idx, _ = nnindexer.knn(vecs_list[3], 1)
+            >>> assert np.all(nnindexer.get_nn_aids(qfx2_idx) == 4)
+        """
+        with nnindexer._lock:
+            if nnindexer._oplog is not None:
+                # A compaction is already running
+                return
+            if verbose:
+                print('[nnindex] Compacting %d / %d removed vectors' % (
+                    nnindexer.num_removed, nnindexer._num_vecs))
+            new = nnindexer._make_compacted()
+            nnindexer._oplog = []
+
+        def _build():
+            new.reindex(verbose=False)
+            nnindexer._compacted = new
+
+        def _background_build():
+            try:
+                _build()
+            except Exception as ex:
+                # finish_compaction drops the replay log once the thread ends
+                ut.printex(ex, '[nnindex] background compaction failed',
+                           iswarning=True)
+
+        if blocking:
+            try:
+                _build()
+            except Exception:
+                with nnindexer._lock:
+                    nnindexer._oplog = None
+                raise
+            nnindexer.finish_compaction(wait=True)
+        else:
+            nnindexer._compact_thread = threading.Thread(
+                target=_background_build)
+            nnindexer._compact_thread.daemon = True
+            nnindexer._compact_thread.start()
+
+    def finish_compaction(nnindexer, wait=True):
+        r"""
+        Swaps in a compacted index if one is ready.
+
+        Args:
+            wait (bool): if True blocks until a running compaction finishes
+
+        Returns:
+            bool: True if a compacted index was swapped in
+        """
+        with nnindexer._lock:
+            thread = nnindexer._compact_thread
+            if thread is not None:
+                if not wait and thread.is_alive():
+                    return False
+                thread.join()
+                nnindexer._compact_thread = None
+            new = nnindexer._compacted
+            if new is None:
+                if thread is not None:
+                    # The background rebuild failed. Nothing needs to be
+                    # replayed because the live index holds every change.
+                    nnindexer._oplog = None
+                return False
+            oplog = nnindexer._oplog
+            nnindexer._compacted = None
+            nnindexer._oplog = None
+            # Replay changes that happened during the rebuild
+            for funcname, args in oplog:
+                getattr(new, funcname)(*args, verbose=False)
+            nnindexer.flann = new.flann
+            nnindexer._bufs = new._bufs
+            nnindexer._num_vecs = new._num_vecs
+            nnindexer._num_annots = new._num_annots
+            nnindexer.num_removed = new.num_removed
+            nnindexer._set_views()
+            return True
+
+
+class ShardedNeighborIndex(NeighborIndex):
+    r"""
+    Searches several independently built NeighborIndex shards as if they were
+    a single index.
+
+    Each shard is queried in its own worker thread (FLANN releases the GIL)
+    and the per-shard top-K results are merged into a global top-K. Neighbor
+    indices follow the same contract as NeighborIndex: a global idx is the
+    shard's local idx offset by the number of vectors in all earlier shards,
+    so the ``get_nn_*`` lookups work unchanged.
+
+    Because shards are built and cached independently, a database that only
+    grows can reuse all of its existing shards and only build the new ones.
+
+    CommandLine:
+        python -m ibeis.algo.hots.neighbor_index ShardedNeighborIndex
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.neighbor_index import *  # NOQA
+        >>> rng = np.random.RandomState(0)
+        >>> aid_list = list(range(1, 10))
+        >>> vecs_list = [rng.randint(0, 255, (rng.randint(5, 30), 128)).astype(np.uint8)
+        >>>              for aid in aid_list]
+        >>> fxs_list = [np.arange(len(vecs)) for vecs in vecs_list]
+        >>> flann_params = {'algorithm': 'linear'}
+        >>> def make_index(xs):
+        >>>     nnindexer = NeighborIndex(flann_params.copy(), 'test')
+        >>>     nnindexer.init_support(ut.take(aid_list, xs), ut.take(vecs_list, xs),
+        >>>                            None, ut.take(fxs_list, xs), verbose=False)
+        >>>     nnindexer.reindex(verbose=False)
+        >>>     return nnindexer
+        >>> single = make_index(list(range(9)))
+        >>> shards = [make_index([0, 1, 2, 3]), make_index([4, 5]), make_index([6, 7, 8])]
+        >>> sharded = ShardedNeighborIndex(shards, 'test')
+        >>> assert sharded.num_indexed == single.num_indexed
+        >>> qfx2_vec = rng.randint(0, 255, (50, 128)).astype(np.uint8)
+        >>> (idxs1, dists1) = single.knn(qfx2_vec, 4)
+        >>> (idxs2, dists2) = sharded.knn(qfx2_vec, 4)
+        >>> assert np.allclose(dists1, dists2)
+        >>> assert np.all(single.get_nn_aids(idxs1) == sharded.get_nn_aids(idxs2))
+        >>> assert np.all(single.get_nn_featxs(idxs1) == sharded.get_nn_featxs(idxs2))
+        >>> assert np.all(single.get_nn_vecs(idxs1) == sharded.get_nn_vecs(idxs2))
+        >>> impossible_aids = [1, 5]
+        >>> (idxs1, dists1) = single.requery_knn(qfx2_vec, 4, 2, impossible_aids)
+        >>> (idxs2, dists2) = sharded.requery_knn(qfx2_vec, 4, 2, impossible_aids)
+        >>> assert np.allclose(dists1, dists2)
+        >>> assert not np.any(np.in1d(sharded.get_nn_aids(idxs2), impossible_aids))
+        >>> sharded.remove_support([2, 8], verbose=False)
+        >>> assert sorted(sharded.get_indexed_aids()) == [1, 3, 4, 5, 6, 7, 9]
+        >>> # An index over zero daids has no shards
+        >>> empty = ShardedNeighborIndex([], 'test')
+        >>> assert empty.get_dtype() == hstypes.VEC_TYPE
+        >>> assert empty.get_indexed_vecs().shape == (0, hstypes.VEC_DIM)
+    """
+
+    def __init__(nnindexer, shards, cfgstr, num_workers=None):
+        flann_params = shards[0].flann_params if len(shards) else None
+        super(ShardedNeighborIndex, nnindexer).__init__(flann_params, cfgstr)
+        if num_workers is None:
+            num_workers = SHARD_WORKERS
+        nnindexer.shards = list(shards)
+        nnindexer.num_workers = num_workers
+        nnindexer._pool = None
+        nnindexer._build_lookups()
+
+    def _build_lookups(nnindexer):
+        """ concatenates the shard inverted indexes into global ones """
+        shards = nnindexer.shards
+        nvecs_list = [shard.num_indexed for shard in shards]
+        naxs_list = [len(shard.ax2_aid) for shard in shards]
+        nnindexer.idx_offsets = np.cumsum([0] + nvecs_list)
+        nnindexer.ax_offsets = np.cumsum([0] + naxs_list)
+        if len(shards) == 0:
+            nnindexer.ax2_aid = np.empty(0, dtype=np.int32)
+            nnindexer.idx2_ax = np.empty(0, dtype=np.int32)
+            nnindexer.idx2_fx = np.empty(0, dtype=np.int32)
+            nnindexer.idx2_fgw = None
+        else:
+            nnindexer.ax2_aid = np.hstack([shard.ax2_aid for shard in shards])
+            nnindexer.idx2_ax = np.hstack([
+                shard.idx2_ax + ax_offset
+                for shard, ax_offset in zip(shards, nnindexer.ax_offsets)])
+            nnindexer.idx2_fx = np.hstack([shard.idx2_fx for shard in shards])
+            if any(shard.idx2_fgw is None for shard in shards):
+                nnindexer.idx2_fgw = None
+            else:
+                nnindexer.idx2_fgw = np.hstack([shard.idx2_fgw
+                                                for shard in shards])
+            nnindexer.max_distance_sqrd = shards[0].max_distance_sqrd
+        live_axs = np.flatnonzero(nnindexer.ax2_aid != -1)
+        nnindexer.aid2_ax = dict(zip(nnindexer.ax2_aid.take(live_axs), live_axs))
+        nnindexer.num_indexed = int(nnindexer.idx_offsets[-1])
+
+    def _map_shards(nnindexer, func, shardxs):
+        """ calls func(shardx) for each shard in a worker thread """
+        if nnindexer.num_workers <= 1 or len(shardxs) <= 1:
+            return [func(shardx) for shardx in shardxs]
+        if nnindexer._pool is None:
+            from multiprocessing.pool import ThreadPool
+            nnindexer._pool = ThreadPool(nnindexer.num_workers)
+        return nnindexer._pool.map(func, shardxs)
+
+    def _active_shardxs(nnindexer):
+        return [shardx for shardx, shard in enumerate(nnindexer.shards)
+                if shard.num_indexed > 0]
+
+    def _merge(nnindexer, shardxs, idx_dist_list, nQfx, K):
+        """ merges per-shard neighbors into the global top K """
+        if nQfx == 0:
+            return nnindexer.empty_neighbors(0, K)
+        idxs_list = [
+            idxs.reshape(nQfx, -1).astype(np.int64) + nnindexer.idx_offsets[shardx]
+            for shardx, (idxs, _) in zip(shardxs, idx_dist_list)]
+        dists_list = [dists.reshape(nQfx, -1) for _, dists in idx_dist_list]
+        return merge_shard_neighbors(idxs_list, dists_list, K)
+
+    def __getstate__(nnindexer):
+        state_dict = nnindexer.__dict__.copy()
+        state_dict['_pool'] = None
+        return state_dict
+
+    def knn(nnindexer, qfx2_vec, K):
+        r"""
+        Same contract as NeighborIndex.knn, but searches every shard.
+        """
+        if K == 0 or K > nnindexer.num_indexed:
+            return nnindexer.empty_neighbors(len(qfx2_vec), 0)
+        elif len(qfx2_vec) == 0:
+            return nnindexer.empty_neighbors(0, K)
+        shardxs = nnindexer._active_shardxs()
+        shards = nnindexer.shards
+
+        def _shard_knn(shardx):
+            shard = shards[shardx]
+            return shard.knn(qfx2_vec, min(K, shard.num_indexed))
+        idx_dist_list = nnindexer._map_shards(_shard_knn, shardxs)
+        return nnindexer._merge(shardxs, idx_dist_list, len(qfx2_vec), K)
+
+    def requery_knn(nnindexer, qfx2_vec, K, pad, impossible_aids, recover=True):
+        r"""
+        Same contract as NeighborIndex.requery_knn. Each shard only receives
+        the impossible aids that it indexes.
+        """
+        if K == 0 or K > nnindexer.num_indexed:
+            return nnindexer.empty_neighbors(len(qfx2_vec), 0)
+        elif len(qfx2_vec) == 0:
+            return nnindexer.empty_neighbors(0, K)
+        shardxs = nnindexer._active_shardxs()
+        shards = nnindexer.shards
+
+        def _shard_requery(shardx):
+            shard = shards[shardx]
+            shard_impossible = [aid for aid in impossible_aids
+                                if aid in shard.aid2_ax]
+            return shard.requery_knn(qfx2_vec, min(K, shard.num_indexed), pad,
+                                     shard_impossible, recover=recover)
+        idx_dist_list = nnindexer._map_shards(_shard_requery, shardxs)
+        return nnindexer._merge(shardxs, idx_dist_list, len(qfx2_vec), K)
+
+    def stacked_requery_knn(nnindexer, qvecs_list, K, pad_list,
+                            impossible_aids_list, recover=True,
+                            chunksize=STACK_CHUNKSIZE, prog_hook=None,
+                            label='stacked requery knn'):
+        r"""
+        Runs the stacked requery on every shard and merges each annotation's
+        results.
+        """
+        if K == 0 or K > nnindexer.num_indexed:
+            return [
+                nnindexer.requery_knn(qfx2_vec, K, pad, impossible_aids,
+                                      recover=recover)
+                for qfx2_vec, pad, impossible_aids in
+                zip(qvecs_list, pad_list, impossible_aids_list)
+            ]
+        shardxs = nnindexer._active_shardxs()
+        shards = nnindexer.shards
+
+        def _shard_requery(shardx):
+            shard = shards[shardx]
+            shard_impossible_list = [
+                [aid for aid in impossible_aids if aid in shard.aid2_ax]
+                for impossible_aids in impossible_aids_list]
+            return shard.stacked_requery_knn(
+                qvecs_list, min(K, shard.num_indexed), pad_list,
+                shard_impossible_list, recover=recover, chunksize=chunksize,
+                label='%s shard %d' % (label, shardx))
+        shard_results = nnindexer._map_shards(_shard_requery, shardxs)
+        idx_dist_list = [
+            nnindexer._merge(shardxs, idx_dist_list_, len(qfx2_vec), K)
+            for qfx2_vec, idx_dist_list_ in
+            zip(qvecs_list, zip(*shard_results))
+        ]
+        return idx_dist_list
+
+    def add_support(nnindexer, new_daid_list, new_vecs_list, new_fgws_list,
+                    new_fxs_list, verbose=ut.NOT_QUIET):
+        r"""
+        New support data is indexed as a new shard.
+        """
+        is_new = ~np.in1d(new_daid_list, nnindexer.get_indexed_aids())
+        new_daid_list = ut.compress(list(new_daid_list), is_new)
+        if len(new_daid_list) == 0:
+            return
+        if new_fgws_list is not None:
+            new_fgws_list = ut.compress(new_fgws_list, is_new)
+        shard = NeighborIndex(nnindexer.flann_params, nnindexer.cfgstr)
+        shard.init_support(new_daid_list, ut.compress(new_vecs_list, is_new),
+                           new_fgws_list, ut.compress(new_fxs_list, is_new),
+                           verbose=verbose)
+        shard.reindex(verbose=verbose)
+        nnindexer.shards.append(shard)
+        nnindexer._build_lookups()
+
+    def remove_support(nnindexer, remove_daid_list, verbose=ut.NOT_QUIET):
+        r"""
+        Removes support data from the shards that index it.
+
+        Shards can be shared with other indexers through the shard cache, so
+        they are never modified. Each affected shard is replaced by a new
+        shard built from its remaining support data.
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from ibeis.algo.hots.neighbor_index import *  # NOQA
+            >>> rng = np.random.RandomState(0)
+            >>> aid_list = list(range(1, 7))
+            >>> vecs_list = [rng.randint(0, 255, (10, 128)).astype(np.uint8)
+            >>>              for aid in aid_list]
+            >>> fxs_list = [np.arange(len(vecs)) for vecs in vecs_list]
+            >>> def make_index(xs):
+            >>>     nnindexer = NeighborIndex({'algorithm': 'linear'}, 'test')
+            >>>     nnindexer.init_support(ut.take(aid_list, xs), ut.take(vecs_list, xs),
+            >>>                            None, ut.take(fxs_list, xs), verbose=False)
+            >>>     nnindexer.reindex(verbose=False)
+            >>>     return nnindexer
+            >>> # Two indexers built from the same cached shards
+            >>> shards = [make_index([0, 1, 2]), make_index([3, 4, 5])]
+            >>> sharded1 = ShardedNeighborIndex(shards, 'test')
+            >>> sharded2 = ShardedNeighborIndex(shards, 'test')
+            >>> sharded1.remove_support([2, 4, 5, 6], verbose=False)
+            >>> assert sorted(sharded1.get_indexed_aids()) == [1, 3]
+            >>> assert sorted(sharded2.get_indexed_aids()) == [1, 2, 3, 4, 5, 6]
+            >>> assert sharded2.shards[0] is shards[0]
+            >>> assert sorted(shards[0].aid2_ax) == [1, 2, 3]
+            >>> for aid, vecs in zip(aid_list, vecs_list):
+            >>>     qfx2_idx, _ = sharded2.knn(vecs, 1)
+            >>>     assert np.all(sharded2.get_nn_aids(qfx2_idx) == aid)
+            >>> qfx2_idx, _ = sharded1.knn(vecs_list[2], 1)
+            >>> assert np.all(sharded1.get_nn_aids(qfx2_idx) == 3)
+            >>> assert np.all(sharded1.get_nn_featxs(qfx2_idx).ravel() == np.arange(10))
+        """
+        new_shards = []
+        for shard in nnindexer.shards:
+            shard_remove = [aid for aid in remove_daid_list
+                            if aid in shard.aid2_ax]
+            if len(shard_remove) > 0:
+                shard = nnindexer._rebuild_shard(shard, shard_remove,
+                                                 verbose=verbose)
+                if shard is None:
+                    continue
+            new_shards.append(shard)
+        nnindexer.shards = new_shards
+        nnindexer._build_lookups()
+
+    def _rebuild_shard(nnindexer, shard, remove_daid_list, verbose=True):
+        """
+        Returns a new shard indexing the support data of `shard` without
+        `remove_daid_list`, or None if nothing is left.
+        """
+        keep_axs = sorted(ax for aid, ax in shard.aid2_ax.items()
+                          if aid not in set(remove_daid_list))
+        if len(keep_axs) == 0:
+            return None
+        ax_list, groupxs = vt.group_indices(shard.idx2_ax)
+        ax2_idxs = dict(zip(ax_list, groupxs))
+        empty_idxs = np.empty(0, dtype=np.int64)
+        idxs_list = [ax2_idxs.get(ax, empty_idxs) for ax in keep_axs]
+        vecs_list = [shard.idx2_vec.take(idxs, axis=0) for idxs in idxs_list]
+        fxs_list = [shard.idx2_fx.take(idxs) for idxs in idxs_list]
+        if shard.idx2_fgw is None:
+            fgws_list = None
+        else:
+            fgws_list = [shard.idx2_fgw.take(idxs) for idxs in idxs_list]
+        # A distinct cfgstr keeps ensure_indexer from loading the old shard
+        cfgstr = shard.cfgstr + '_rm' + ut.hashstr27(
+            repr(sorted(remove_daid_list)))
+        new = NeighborIndex(shard.flann_params, cfgstr)
+        new.init_support(shard.ax2_aid.take(keep_axs), vecs_list, fgws_list,
+                         fxs_list, verbose=verbose)
+        new.reindex(verbose=verbose)
+        return new
+
+    def reindex(nnindexer, verbose=True, memtrack=None):
+        for shard in nnindexer.shards:
+            shard.reindex(verbose=verbose, memtrack=memtrack)
+
+    def ensure_indexer(nnindexer, cachedir, verbose=True, force_rebuild=False,
+                       memtrack=None, prog_hook=None):
+        for shard in nnindexer.shards:
+            shard.ensure_indexer(cachedir, verbose=verbose,
+                                 force_rebuild=force_rebuild,
+                                 memtrack=memtrack)
+
+    def get_dtype(nnindexer):
+        if len(nnindexer.shards) == 0:
+            # An index over zero daids has the default descriptor type
+            return np.dtype(hstypes.VEC_TYPE)
+        return nnindexer.shards[0].get_dtype()
+
+    def num_indexed_vecs(nnindexer):
+        return nnindexer.num_indexed
+
+    def get_indexed_vecs(nnindexer):
+        if len(nnindexer.shards) == 0:
+            return np.empty((0, hstypes.VEC_DIM), dtype=nnindexer.get_dtype())
+        return np.vstack([shard.get_indexed_vecs()
+                          for shard in nnindexer.shards])
+
+    def get_nn_shardxs(nnindexer, qfx2_nnidx):
+        r""" gets the shard that each neighbor belongs to """
+        return np.searchsorted(nnindexer.idx_offsets, qfx2_nnidx,
+                               side='right') - 1
+
+    def get_nn_vecs(nnindexer, qfx2_nnidx):
+        r""" gets matching vectors """
+        qfx2_nnidx = np.asarray(qfx2_nnidx)
+        qfx2_shardx = nnindexer.get_nn_shardxs(qfx2_nnidx)
+        qfx2_vec = np.empty(qfx2_nnidx.shape + (nnindexer.shards[0].idx2_vec.shape[1],),
+                            dtype=nnindexer.get_dtype())
+        for shardx in np.unique(qfx2_shardx):
+            flags = qfx2_shardx == shardx
+            local_idxs = qfx2_nnidx[flags] - nnindexer.idx_offsets[shardx]
+            qfx2_vec[flags] = nnindexer.shards[shardx].get_nn_vecs(local_idxs)
+        return qfx2_vec
+
+
+def merge_shard_neighbors(idxs_list, dists_list, K):
+    r"""
+    Merges the neighbors found in each shard into the overall K nearest.
+
+    Args:
+        idxs_list (list): (N x K_i) global neighbor indices from each shard
+        dists_list (list): (N x K_i) neighbor distances from each shard
+        K (int): number of neighbors to keep
+
+    Returns:
+        tuple: (qfx2_idx, qfx2_dist)
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.neighbor_index import *  # NOQA
+        >>> idxs_list = [np.array([[0, 1], [1, 0]]), np.array([[5], [6]])]
+        >>> dists_list = [np.array([[.1, .4], [.2, .3]]), np.array([[.2], [.1]])]
+        >>> qfx2_idx, qfx2_dist = merge_shard_neighbors(idxs_list, dists_list, 2)
+        >>> result = ut.repr2(qfx2_idx) + '\n' + ut.repr2(qfx2_dist, precision=2)
+        >>> print(result)
+        np.array([[0, 5],
+                  [6, 1]])
+        np.array([[0.1, 0.2],
+                  [0.1, 0.2]])
+    """
+    if len(idxs_list) == 1:
+        return idxs_list[0][:, 0:K], dists_list[0][:, 0:K]
+    idxs = np.hstack(idxs_list)
+    dists = np.hstack(dists_list)
+    # stable sort keeps ties in shard order
+    sortx = dists.argsort(axis=1, kind='mergesort')[:, 0:K]
+    rowx = np.arange(len(idxs))[:, None]
+    qfx2_idx = idxs[rowx, sortx]
+    qfx2_dist = dists[rowx, sortx]
+    return qfx2_idx, qfx2_dist
+
+
 def testdata_nnindexer(*args, **kwargs):
     from ibeis.algo.hots.neighbor_index_cache import testdata_nnindexer
     return testdata_nnindexer(*args, **kwargs)
@@ -8,6 +8,8 @@ import utool as ut
 from six.moves import range, zip, map  # NOQA
 from ibeis.algo.hots import _pipeline_helpers as plh  # NOQA
 from ibeis.algo.hots.neighbor_index import NeighborIndex, get_support_data
+from ibeis.algo.hots.neighbor_index import IncrementalNeighborIndex
+from ibeis.algo.hots.neighbor_index import ShardedNeighborIndex
 (print, rrr, profile) = ut.inject2(__name__)
 
 
@@ -22,6 +24,9 @@ CURRENT_THREAD = None
 # Global map to keep track of UUID lists with prebuild indexers.
 UUID_MAP = ut.ddict(dict)
 NEIGHBOR_CACHE = ut.get_lru_cache(MAX_NEIGHBOR_CACHE_SIZE)
+# Shards are cached separately so a growing database can reuse them
+MAX_SHARD_CACHE_SIZE = ut.get_argval('--max-shard-cachesize', type_=int, default=16)
+SHARD_CACHE = ut.get_lru_cache(MAX_SHARD_CACHE_SIZE)
 
 
 class UUIDMapHyrbridCache(object):
@@ -228,6 +233,7 @@ def build_nnindex_cfgstr(qreq_, daid_list):
 def clear_memcache():
     global NEIGHBOR_CACHE
     NEIGHBOR_CACHE.clear()
+    SHARD_CACHE.clear()
 
 
 def clear_uuid_cache(qreq_):
@@ -294,7 +300,9 @@ def request_ibeis_nnindexer(qreq_, verbose=True, **kwargs):
     daid_list = qreq_.get_internal_daids()
     if not hasattr(qreq_.qparams, 'use_augmented_indexer'):
         qreq_.qparams.use_augmented_indexer = True
-    if False and qreq_.qparams.use_augmented_indexer:
+    if qreq_.qparams.index_method == 'sharded':
+        nnindexer = request_sharded_ibeis_nnindexer(qreq_, daid_list, **kwargs)
+    elif False and qreq_.qparams.use_augmented_indexer:
         nnindexer = request_augmented_ibeis_nnindexer(qreq_, daid_list, **kwargs)
     else:
         nnindexer = request_memcached_ibeis_nnindexer(qreq_, daid_list, **kwargs)
@@ -416,6 +424,86 @@ def request_augmented_ibeis_nnindexer(qreq_, daid_list, verbose=True,
         return nnindexer
 
 
+def partition_daids_by_epoch(daid_list, shard_size):
+    r"""
+    Groups annotations into shards by insertion epoch. Annotation rowids are
+    allocated in increasing order, so ``aid // shard_size`` only changes for
+    newly added annotations and existing shards keep the same daids (and
+    therefore the same cfgstr) as the database grows.
+
+    Args:
+        daid_list (list):
+        shard_size (int): width of the aid range covered by each shard
+
+    Returns:
+        list: shard_daids_list
+
+    CommandLine:
+        python -m ibeis.algo.hots.neighbor_index_cache partition_daids_by_epoch
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.neighbor_index_cache import *  # NOQA
+        >>> daid_list = [1, 2, 9, 3, 12, 10, 25]
+        >>> shard_daids_list = partition_daids_by_epoch(daid_list, 10)
+        >>> result = ('shard_daids_list = %s' % (ut.repr2(shard_daids_list),))
+        >>> print(result)
+        shard_daids_list = [[1, 2, 3, 9], [10, 12], [25]]
+    """
+    epoch_list = [aid // shard_size for aid in daid_list]
+    groups = ut.group_items(daid_list, epoch_list)
+    shard_daids_list = [sorted(groups[epoch]) for epoch in sorted(groups)]
+    return shard_daids_list
+
+
+def request_sharded_ibeis_nnindexer(qreq_, daid_list, use_memcache=True,
+                                    verbose=ut.NOT_QUIET, force_rebuild=False,
+                                    memtrack=None, prog_hook=None):
+    r"""
+    Builds a ShardedNeighborIndex whose shards are independently cached
+    NeighborIndexes over epochs of the daids (see partition_daids_by_epoch).
+    Shards already in memory or on disk are reused, so when the database only
+    grows only the newest shards need to be built.
+
+    CommandLine:
+        python -m ibeis.algo.hots.neighbor_index_cache request_sharded_ibeis_nnindexer
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from ibeis.algo.hots.neighbor_index_cache import *  # NOQA
+        >>> import ibeis
+        >>> qreq_ = ibeis.testdata_qreq_(
+        >>>     defaultdb='PZ_MTEST', p='default:index_method=sharded,shard_size=30')
+        >>> daid_list = qreq_.get_internal_daids()
+        >>> nnindexer = request_sharded_ibeis_nnindexer(qreq_, daid_list)
+        >>> nnindexer2 = request_sharded_ibeis_nnindexer(qreq_, daid_list[:-1])
+        >>> assert nnindexer.shards[0] is nnindexer2.shards[0]
+        >>> assert len(nnindexer.shards) == len(partition_daids_by_epoch(daid_list, 30))
+    """
+    shard_daids_list = partition_daids_by_epoch(daid_list,
+                                                qreq_.qparams.shard_size)
+    if verbose:
+        print('[nnindex] Requesting %d shards over %d daids' % (
+            len(shard_daids_list), len(daid_list)))
+    shards = []
+    for shardx, shard_daids in enumerate(shard_daids_list):
+        if prog_hook is not None:
+            prog_hook.set_progress(shardx, len(shard_daids_list),
+                                   'Loading indexer shard')
+        shard_cfgstr = build_nnindex_cfgstr(qreq_, shard_daids)
+        if not force_rebuild and use_memcache and SHARD_CACHE.has_key(shard_cfgstr):  # NOQA (has_key is for a lru cache)
+            shard = SHARD_CACHE[shard_cfgstr]
+        else:
+            shard = request_diskcached_ibeis_nnindexer(
+                qreq_, shard_daids, shard_cfgstr, verbose,
+                force_rebuild=force_rebuild, memtrack=memtrack)
+            SHARD_CACHE[shard_cfgstr] = shard
+        shards.append(shard)
+    nnindex_cfgstr = build_nnindex_cfgstr(qreq_, daid_list)
+    nnindexer = ShardedNeighborIndex(shards, nnindex_cfgstr)
+    return nnindexer
+
+
 def request_memcached_ibeis_nnindexer(qreq_, daid_list, use_memcache=True,
                                       verbose=ut.NOT_QUIET, veryverbose=False,
                                       force_rebuild=False, memtrack=None,
@@ -455,7 +543,12 @@ def request_memcached_ibeis_nnindexer(qreq_, daid_list, use_memcache=True,
     #    memtrack.report('IN REQUEST MEMCACHE')
     nnindex_cfgstr = build_nnindex_cfgstr(qreq_, daid_list)
     # neighbor memory cache
-    if not force_rebuild and use_memcache and NEIGHBOR_CACHE.has_key(nnindex_cfgstr):  # NOQA (has_key is for a lru cache)
+    is_hit = (not force_rebuild and use_memcache and
+              NEIGHBOR_CACHE.has_key(nnindex_cfgstr))  # NOQA (has_key is for a lru cache)
+    if hasattr(qreq_, 'get_stage_profile'):
+        qreq_.get_stage_profile().record_cache(
+            'nnindex_memcache', hits=int(is_hit), misses=int(not is_hit))
+    if is_hit:
         if veryverbose or ut.VERYVERBOSE or ut.VERBOSE:
             print('... nnindex memcache hit: cfgstr=%s' % (nnindex_cfgstr,))
         nnindexer = NEIGHBOR_CACHE[nnindex_cfgstr]
@@ -614,7 +707,7 @@ def get_data_cfgstr(ibs, daid_list):
 
 def new_neighbor_index(daid_list, vecs_list, fgws_list, fxs_list, flann_params, cachedir,
                        cfgstr, force_rebuild=False, verbose=True,
-                       memtrack=None, prog_hook=None):
+                       memtrack=None, prog_hook=None, incremental=False):
     r"""
     constructs neighbor index independent of ibeis
 
@@ -626,6 +719,8 @@ def new_neighbor_index(daid_list, vecs_list, fgws_list, fxs_list, flann_params,
         flann_cachedir (None):
         nnindex_cfgstr (str):
         use_memcache (bool):
+        incremental (bool): if True builds an IncrementalNeighborIndex that
+            compacts removed annotations instead of only tombstoning them.
 
     Returns:
         nnindexer
@@ -651,7 +746,10 @@ def new_neighbor_index(daid_list, vecs_list, fgws_list, fxs_list, flann_params,
         >>> print(result)
         nnindexer.ax2_aid = [1 2 3 4 5 6]
     """
-    nnindexer = NeighborIndex(flann_params, cfgstr)
+    if incremental:
+        nnindexer = IncrementalNeighborIndex(flann_params, cfgstr)
+    else:
+        nnindexer = NeighborIndex(flann_params, cfgstr)
     #if memtrack is not None:
     #    memtrack.report('CREATEED NEIGHTOB INDEX')
     # Initialize neighbor with unindexed data
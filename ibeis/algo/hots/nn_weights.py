@@ -179,6 +179,10 @@ def nn_normalized_weight(normweight_fn, nns_list, nnvalid0_list, qreq_):
     normalizer_rule  = qreq_.qparams.normalizer_rule
     # Database feature index to chip index
     qaid_list = qreq_.get_internal_qaids()
+    if normalizer_rule in ['last', 'name']:
+        weight_list, normk_list = stacked_normalized_weight(
+            normweight_fn, nns_list, qaid_list, qreq_, Knorm, normalizer_rule)
+        return weight_list, normk_list
     normk_list = [
         get_normk(qreq_, qaid, neighb_idx, Knorm, normalizer_rule)
         for qaid, (neighb_idx, neighb_dist) in zip(qaid_list, nns_list)
@@ -191,6 +195,84 @@ def nn_normalized_weight(normweight_fn, nns_list, nnvalid0_list, qreq_):
     return weight_list, normk_list
 
 
+def stacked_normalized_weight(normweight_fn, nns_list, qaid_list, qreq_, Knorm,
+                              normalizer_rule):
+    r"""
+    Computes the normalizers and weights of all query annotations at once.
+
+    The neighbors of queries with the same number of neighbors are stacked,
+    normalizers are selected and weighted with numpy over the whole stack,
+    and the results are split back into one array per query. The results
+    are the same as calling get_normk and apply_normweight per query.
+
+    Returns:
+        tuple: (weight_list, normk_list)
+
+    CommandLine:
+        python -m ibeis.algo.hots.nn_weights stacked_normalized_weight
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.nn_weights import *  # NOQA
+        >>> qreq_, args = plh.testdata_pre('weight_neighbors', defaultdb='testdb1',
+        >>>                                a=['default:qindex=0:3'],
+        >>>                                p=['default:K=4,Knorm=3,normalizer_rule=name'])
+        >>> nns_list, nnvalid0_list = args
+        >>> Knorm = qreq_.qparams.Knorm
+        >>> qaid_list = qreq_.get_internal_qaids()
+        >>> weight_list, normk_list = stacked_normalized_weight(
+        >>>     lnbnn_fn, nns_list, qaid_list, qreq_, Knorm, 'name')
+        >>> for qaid, nns, normk, weight in zip(qaid_list, nns_list, normk_list, weight_list):
+        >>>     normk1 = get_normk(qreq_, qaid, nns[0], Knorm, 'name')
+        >>>     weight1 = apply_normweight(lnbnn_fn, normk1, nns[0], nns[1], Knorm)
+        >>>     assert np.all(normk == normk1)
+        >>>     assert np.all(weight == weight1)
+    """
+    weight_list = [None] * len(nns_list)
+    normk_list = [None] * len(nns_list)
+    if len(nns_list) == 0:
+        return weight_list, normk_list
+    if normalizer_rule == 'name':
+        idx2_nid = get_idx2_nid(qreq_)
+        qnid_list = np.array(qreq_.get_qreq_annot_nids(qaid_list))
+    # Only queries with the same number of neighbors can be stacked
+    numcols_list = [neighb_idx.shape[1] for neighb_idx, _ in nns_list]
+    for groupx in ut.group_indices(numcols_list)[1]:
+        lens = [len(nns_list[x][0]) for x in groupx]
+        neighb_idx = np.vstack([nns_list[x][0] for x in groupx])
+        neighb_dist = np.vstack([nns_list[x][1] for x in groupx])
+        K = neighb_idx.shape[1] - Knorm
+        assert K > 0, 'K=%r cannot be 0' % (K,)
+        if normalizer_rule == 'last':
+            neighb_normk = np.zeros(len(neighb_idx), hstypes.FK_DTYPE) + (K + Knorm - 1)
+        else:
+            neighb_qnid = np.repeat(qnid_list.take(groupx), lens)
+            neighb_topnid = idx2_nid.take(neighb_idx.T[0:K].T)
+            neighb_normnid = idx2_nid.take(neighb_idx.T[-Knorm:].T)
+            neighb_selnorm = mark_name_valid_normalizers(
+                neighb_qnid[:, None], neighb_topnid, neighb_normnid)
+            neighb_normk = neighb_selnorm + (K + Knorm)
+        neighb_weight = apply_normweight(normweight_fn, neighb_normk,
+                                         neighb_idx, neighb_dist, Knorm)
+        splitxs = np.cumsum(lens)[:-1]
+        for x, normk, weight in zip(groupx, np.split(neighb_normk, splitxs),
+                                    np.split(neighb_weight, splitxs)):
+            normk_list[x] = normk
+            weight_list[x] = weight
+    return weight_list, normk_list
+
+
+def get_idx2_nid(qreq_):
+    """ name of every feature in the request's neighbor index """
+    indexer = qreq_.indexer
+    ax2_aid = np.asarray(indexer.ax2_aid)
+    # removed annotations have an aid of -1 and are given the unknown name
+    isvalid = ax2_aid > 0
+    ax2_nid = np.zeros(len(ax2_aid), dtype=np.int64)
+    ax2_nid[isvalid] = qreq_.get_qreq_annot_nids(ax2_aid.compress(isvalid))
+    return indexer.get_idx2_nid(ax2_nid)
+
+
 def get_normk(qreq_, qaid, neighb_idx, Knorm, normalizer_rule):
     """
     Get positions of the LNBNN/ratio tests normalizers
@@ -340,7 +422,8 @@ def mark_name_valid_normalizers(qnid, neighb_topnid, neighb_normnid):
     Args:
         neighb_topnid (ndarray): marks the names a feature matches
         neighb_normnid (ndarray): marks the names of the feature normalizers
-        qnid (int): query name id
+        qnid (int or ndarray): query name id. An (N x 1) array gives the
+            query name of each row.
 
     Returns:
         neighb_selnorm - index of the selected normalizer for each query feature
@@ -388,9 +471,10 @@ def mark_name_valid_normalizers(qnid, neighb_topnid, neighb_normnid):
     neighb_valid = np.logical_and(neighb_normnid != qnid, neighb_valid)
     # For each query feature find its best normalizer (using negative indices)
     Knorm = neighb_normnid.shape[1]
-    neighb_validxs = [np.nonzero(normrow)[0] for normrow in neighb_valid]
-    neighb_selnorm = np.array([validxs[0] - Knorm if len(validxs) != 0 else -1
-                               for validxs in neighb_validxs], hstypes.FK_DTYPE)
+    neighb_firstvalid = neighb_valid.argmax(axis=1)
+    neighb_selnorm = np.where(neighb_valid.any(axis=1),
+                              neighb_firstvalid - Knorm, -1)
+    neighb_selnorm = neighb_selnorm.astype(hstypes.FK_DTYPE)
     return neighb_selnorm
 
 
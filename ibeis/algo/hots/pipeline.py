@@ -66,12 +66,16 @@ VERB_PIPELINE =  NOT_QUIET and (ut.VERBOSE or ut.get_argflag(('--verbose-pipelin
 VERYVERBOSE_PIPELINE = ut.get_argflag(('--very-verbose-pipeline', '--very-verb-pipe'))
 
 USE_HOTSPOTTER_CACHE = not ut.get_argflag('--nocache-hs') and ut.USE_CACHE
+# Cache neighbors of each query annotation in a shared on-disk NeighborCache
 USE_NN_MID_CACHE = (
-    (True and ut.is_developer()) and
+    ut.get_argflag('--nn-mid-cache') and
     not ut.get_argflag('--nocache-nnmid') and
     USE_HOTSPOTTER_CACHE
 )
-USE_NN_MID_CACHE = False
+# Query all annotations of a request with a single stacked FLANN call
+STACK_NN_QUERIES = not ut.get_argflag('--nostack-nn')
+# Build chipmatches with contiguous feature match arrays (FlatChipMatch)
+FLAT_CHIPMATCH = ut.get_argflag('--flat-cm')
 
 
 NN_LBL      = 'Assign NN:       '
@@ -152,6 +156,7 @@ def request_ibeis_query_L0(ibs, qreq_, verbose=VERB_PIPELINE):
         python -m ibeis.algo.hots.pipeline --test-request_ibeis_query_L0:0 --db PZ_MTEST -a timectrl:qindex=0:256
         python    -m ibeis.algo.hots.pipeline --test-request_ibeis_query_L0:0 --db PZ_Master1 -a timectrl:qindex=0:256
         utprof.py -m ibeis.algo.hots.pipeline --test-request_ibeis_query_L0:0 --db PZ_Master1 -a timectrl:qindex=0:256
+        python -m ibeis.algo.hots.pipeline --test-request_ibeis_query_L0:0 --db PZ_MTEST --pipe-profile
 
     Example1:
         >>> # ENABLE_DOCTEST
@@ -163,6 +168,8 @@ def request_ibeis_query_L0(ibs, qreq_, verbose=VERB_PIPELINE):
         >>> verbose = True
         >>> cm_list = request_ibeis_query_L0(ibs, qreq_, verbose=verbose)
         >>> cm = cm_list[0]
+        >>> stages = qreq_.get_stage_profile().to_dict()['stages']
+        >>> assert stages['nearest_neighbors']['counts']['num_vecs'] > 0
         >>> ut.quit_if_noshow()
         >>> cm.ishow_analysis(qreq_, fnum=0, make_figtitle=True)
         >>> ut.show_if_requested()
@@ -175,56 +182,73 @@ def request_ibeis_query_L0(ibs, qreq_, verbose=VERB_PIPELINE):
 
     ibs.assert_valid_aids(qreq_.get_internal_qaids(), msg='pipeline qaids')
     ibs.assert_valid_aids(qreq_.get_internal_daids(), msg='pipeline daids')
+    prof = qreq_.get_stage_profile()
 
     if qreq_.qparams.pipeline_root == 'smk':
         from ibeis.algo.hots.smk import smk_match
         # Alternative to naive bayes matching:
         # Selective match kernel
-        qaid2_scores, qaid2_chipmatch_FILT_ = smk_match.execute_smk_L5(qreq_)
+        with prof.stage('smk'):
+            qaid2_scores, qaid2_chipmatch_FILT_ = smk_match.execute_smk_L5(qreq_)
     elif qreq_.qparams.pipeline_root in ['vsone', 'vsmany']:
         assert qreq_.qparams.pipeline_root != 'vsone', 'pipeline no longer supports vsone'
         if qreq_.prog_hook is not None:
             qreq_.prog_hook.initialize_subhooks(5)
 
         #qreq_.lazy_load(verbose=(verbose and ut.NOT_QUIET))
-        qreq_.lazy_preload(verbose=(verbose and ut.NOT_QUIET))
-        impossible_daids_list, Kpad_list = build_impossible_daids_list(qreq_)
+        with prof.stage('preload'):
+            qreq_.lazy_preload(verbose=(verbose and ut.NOT_QUIET))
+        with prof.stage('build_impossible_daids') as counts:
+            impossible_daids_list, Kpad_list = build_impossible_daids_list(qreq_)
+            counts['num_queries'] = len(impossible_daids_list)
 
         # Nearest neighbors (nns_list)
         # a nns object is a tuple(ndarray, ndarray) - (qfx2_dx, qfx2_dist)
         # * query descriptors assigned to database descriptors
         # * FLANN used here
-        nns_list = nearest_neighbors(qreq_, Kpad_list, impossible_daids_list,
-                                     verbose=verbose)
+        with prof.stage('nearest_neighbors') as counts:
+            nns_list = nearest_neighbors(qreq_, Kpad_list, impossible_daids_list,
+                                         verbose=verbose)
+            counts['num_vecs'] = sum(nns.num_query_feats for nns in nns_list)
+            counts['num_neighbs'] = sum(nns.neighb_idxs.size for nns in nns_list)
 
         # Remove Impossible Votes
         # a nnfilt object is an ndarray qfx2_valid
         # * marks matches to the same image as invalid
-        nnvalid0_list = baseline_neighbor_filter(qreq_, nns_list,
-                                                 impossible_daids_list,
-                                                 verbose=verbose)
+        with prof.stage('baseline_neighbor_filter') as counts:
+            nnvalid0_list = baseline_neighbor_filter(qreq_, nns_list,
+                                                     impossible_daids_list,
+                                                     verbose=verbose)
+            counts['num_valid'] = sum(valid.sum() for valid in nnvalid0_list)
 
         # Nearest neighbors weighting / scoring (filtweights_list)
         # filtweights_list maps qaid to filtweights which is a dict
         # that maps a filter name to that query's weights for that filter
-        weight_ret = weight_neighbors(qreq_, nns_list, nnvalid0_list,
-                                      verbose=verbose)
+        with prof.stage('weight_neighbors'):
+            weight_ret = weight_neighbors(qreq_, nns_list, nnvalid0_list,
+                                          verbose=verbose)
         filtkey_list, filtweights_list, filtvalids_list, filtnormks_list = weight_ret
 
         # Nearest neighbors to chip matches (cm_list)
         # * Initial scoring occurs
         # * vsone un-swapping occurs here
-        cm_list_FILT = build_chipmatches(qreq_, nns_list, nnvalid0_list,
-                                         filtkey_list, filtweights_list, filtvalids_list,
-                                         filtnormks_list, verbose=verbose)
+        with prof.stage('build_chipmatches') as counts:
+            cm_list_FILT = build_chipmatches(qreq_, nns_list, nnvalid0_list,
+                                             filtkey_list, filtweights_list, filtvalids_list,
+                                             filtnormks_list, verbose=verbose)
+            counts['num_annot_matches'] = sum(len(cm.daid_list) for cm in cm_list_FILT)
+            counts['num_feat_matches'] = sum(cm.get_num_feat_matches() for cm in cm_list_FILT)
     else:
         print('invalid pipeline root %r' % (qreq_.qparams.pipeline_root))
 
     # Spatial verification (cm_list) (TODO: cython)
     # * prunes chip results and feature matches
     # TODO: allow for reweighting of feature matches to happen.
-    cm_list_SVER = spatial_verification(qreq_, cm_list_FILT,
-                                        verbose=verbose)
+    with prof.stage('spatial_verification') as counts:
+        cm_list_SVER = spatial_verification(qreq_, cm_list_FILT,
+                                            verbose=verbose)
+        counts['num_annot_matches'] = sum(len(cm.daid_list) for cm in cm_list_SVER)
+        counts['num_feat_matches'] = sum(cm.get_num_feat_matches() for cm in cm_list_SVER)
     if cm_list_FILT[0].filtnorm_aids is not None:
         pass
         # assert cm_list_SVER[0].filtnorm_aids is not None
@@ -232,7 +256,9 @@ def request_ibeis_query_L0(ibs, qreq_, verbose=VERB_PIPELINE):
     cm_list = cm_list_SVER
     # Final Scoring
     score_method = qreq_.qparams.score_method
-    scoring.score_chipmatch_list(qreq_, cm_list, score_method)
+    with prof.stage('scoring') as counts:
+        scoring.score_chipmatch_list(qreq_, cm_list, score_method)
+        counts['num_queries'] = len(cm_list)
 
     if VERB_PIPELINE:
         print('[hs] L___ FINISHED HOTSPOTTER PIPELINE ___')
@@ -448,6 +474,49 @@ def nearest_neighbor_cacheid2(qreq_, Kpad_list):
     return nn_cachedir, nn_mid_cacheid_list
 
 
+def nearest_neighbor_cachekeys(qreq_, Kpad_list):
+    r"""
+    Returns keys for the columnar neighbor cache. Each key is a
+    (query visual-uuid, config hash) tuple.
+
+    Args:
+        qreq_ (QueryRequest):  query request object with hyper-parameters
+        Kpad_list (list):
+
+    Returns:
+        tuple: (nn_cachedir, nn_cachekey_list)
+
+    CommandLine:
+        python -m ibeis.algo.hots.pipeline --exec-nearest_neighbor_cachekeys
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.pipeline import *  # NOQA
+        >>> import ibeis
+        >>> qreq_ = ibeis.testdata_qreq_(
+        >>>     defaultdb='testdb1', qaid_override=[1, 2],
+        >>>     daid_override=[1, 2, 3, 4, 5])
+        >>> locals_ = plh.testrun_pipeline_upto(qreq_, 'nearest_neighbors')
+        >>> Kpad_list, = ut.dict_take(locals_, ['Kpad_list'])
+        >>> nn_cachedir, nn_cachekey_list = nearest_neighbor_cachekeys(qreq_, Kpad_list)
+        >>> visual_uuids = qreq_.get_qreq_annot_visual_uuids([1, 2])
+        >>> assert ut.take_column(nn_cachekey_list, 0) == list(map(str, visual_uuids))
+    """
+    nn_cachedir, nn_mid_cacheid_list = nearest_neighbor_cacheid2(
+        qreq_, Kpad_list)
+    internal_qaids = qreq_.get_internal_qaids()
+    if qreq_.qparams.requery:
+        query_hashid_list = qreq_.get_qreq_pcc_uuids(internal_qaids)
+    else:
+        query_hashid_list = qreq_.get_qreq_annot_visual_uuids(internal_qaids)
+    nn_cachekey_list = [
+        (str(query_hashid), ut.hashstr27(nn_mid_cacheid))
+        for query_hashid, nn_mid_cacheid in
+        zip(query_hashid_list, nn_mid_cacheid_list)
+    ]
+    return nn_cachedir, nn_cachekey_list
+
+
 @profile
 def cachemiss_nn_compute_fn(flags_list, qreq_, Kpad_list,
                             impossible_daids_list, K, Knorm, requery,
@@ -512,28 +581,21 @@ def cachemiss_nn_compute_fn(flags_list, qreq_, Kpad_list,
     # Mark progress ane execute nearest indexer nearest neighbor code
     prog_hook = (None if qreq_.prog_hook is None else
                  qreq_.prog_hook.next_subhook())
-    if requery:
-        # assert False, (
-        #     'need to implement part where matches with the same name are not considered'
-        # )
+    if STACK_NN_QUERIES:
+        # Stack the query vectors of all annotations and issue one multi-core
+        # FLANN call per chunk instead of one call per annotation.
+        if requery:
+            impossible_daids_list = ut.compress(impossible_daids_list, flags_list)
+            idx_dist_list = qreq_.indexer.stacked_requery_knn(
+                qvecs_list, K + Knorm, Kpad_list, impossible_daids_list,
+                prog_hook=prog_hook, label=NN_LBL)
+        else:
+            idx_dist_list = qreq_.indexer.stacked_knn(
+                qvecs_list, num_neighbors_list, prog_hook=prog_hook,
+                label=NN_LBL)
+    elif requery:
         qvec_iter = ut.ProgressIter(qvecs_list, lbl=NN_LBL,
                                     prog_hook=prog_hook, **PROGKW)
-
-        """
-        # Maybe some query vector stacking would help here
-        qvecs_stack = np.vstack(qvecs_list)
-
-        # Nope, really doesn't help that much
-
-        # For 100 annotations
-        %timeit np.vstack(qvecs_list)
-        # 100 loops, best of 3: 5.15 ms per loop
-        %timeit qreq_.indexer.knn(qvecs_stack, K)
-        # 1 loop, best of 3: 18.1 s per loop
-        %timeit [qreq_.indexer.knn(qfx2_vec, K) for qfx2_vec in qvecs_list]
-        # 1 loop, best of 3: 19.4 s per loop
-        """
-
         idx_dist_list = [
             qreq_.indexer.requery_knn(qfx2_vec, K, pad, impossible_daids)
             for qfx2_vec, K, pad, impossible_daids in zip(
@@ -658,6 +720,29 @@ def nearest_neighbors(qreq_, Kpad_list, impossible_daids_list=None,
         >>> nnvalid0_list1 = baseline_neighbor_filter(qreq1_, nns_list1,
         >>>                                           impossible_daids_list)
         >>> assert np.all(nnvalid0_list1[0]), 'should always be valid'
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> # Neighbors read back from the neighbor cache match computed ones
+        >>> from ibeis.algo.hots.pipeline import *  # NOQA
+        >>> from ibeis.algo.hots import pipeline, neighbor_cache
+        >>> qreq_, args = plh.testdata_pre('nearest_neighbors', defaultdb='testdb1',
+        >>>                                a=['default:qindex=0:4,dindex=0:10'])
+        >>> Kpad_list, impossible_daids_list = args
+        >>> nns_list1 = nearest_neighbors(qreq_, Kpad_list, impossible_daids_list)
+        >>> nn_cachedir = qreq_.ibs.get_neighbor_cachedir()
+        >>> neighbor_cache.NeighborCache(nn_cachedir, 'neighbs5').clear()
+        >>> pipeline.USE_NN_MID_CACHE = True
+        >>> try:
+        >>>     nns_list2 = nearest_neighbors(qreq_, Kpad_list, impossible_daids_list)
+        >>>     nns_list3 = nearest_neighbors(qreq_, Kpad_list, impossible_daids_list)
+        >>> finally:
+        >>>     pipeline.USE_NN_MID_CACHE = False
+        >>> nn_cache = neighbor_cache.NeighborCache(nn_cachedir, 'neighbs5')
+        >>> assert len(nn_cache) == len(nns_list1)
+        >>> for nn1, nn3 in zip(nns_list1, nns_list3):
+        >>>     assert np.all(nn1.neighb_idxs == nn3.neighb_idxs)
+        >>>     assert np.all(nn1.neighb_dists == nn3.neighb_dists)
     """
     K           = qreq_.qparams.K
     Knorm       = qreq_.qparams.Knorm
@@ -677,17 +762,20 @@ def nearest_neighbors(qreq_, Kpad_list, impossible_daids_list=None,
 
     use_cache = USE_NN_MID_CACHE
     if use_cache:
-        nn_cachedir, nn_mid_cacheid_list = nearest_neighbor_cacheid2(
+        # All cached neighbors live in a single memory-mapped columnar file
+        from ibeis.algo.hots import neighbor_cache
+        nn_cachedir, nn_cachekey_list = nearest_neighbor_cachekeys(
             qreq_, Kpad_list)
+        nn_cache = neighbor_cache.NeighborCache(nn_cachedir, 'neighbs5')
+        nns_list = nn_cache.tryload_with_compute(
+            qreq_.get_internal_qaids(), nn_cachekey_list,
+            cachemiss_nn_compute_fn, qreq_, Kpad_list, impossible_daids_list,
+            K, Knorm, requery, verbose)
     else:
-        # hacks
-        nn_mid_cacheid_list = [None] * len(qreq_.get_internal_qaids())
-        nn_cachedir = None
-
-    nns_list = ut.tryload_cache_list_with_compute(
-        use_cache, nn_cachedir, 'neighbs4', nn_mid_cacheid_list,
-        cachemiss_nn_compute_fn, qreq_, Kpad_list, impossible_daids_list, K,
-        Knorm, requery, verbose)
+        flags_list = [True] * len(Kpad_list)
+        nns_list = cachemiss_nn_compute_fn(
+            flags_list, qreq_, Kpad_list, impossible_daids_list, K, Knorm,
+            requery, verbose)
     return nns_list
 
 
@@ -1045,7 +1133,7 @@ def build_chipmatches(qreq_, nns_list, nnvalid0_list, filtkey_list,
         get_sparse_matchinfo_nonagg(
             qreq_, nns, neighb_valid0, neighb_score_list,
             neighb_valid_list, neighb_normk_list, Knorm,
-            fsv_col_lbls=filtkey_list)
+            fsv_col_lbls=filtkey_list, flat=FLAT_CHIPMATCH)
         for nns, neighb_valid0, neighb_score_list, neighb_valid_list, neighb_normk_list in
         zip(nns_iter, nnvalid0_list, filtweights_list, filtvalids_list, filtnormks_list)
     ]
@@ -1055,10 +1143,14 @@ def build_chipmatches(qreq_, nns_list, nnvalid0_list, filtkey_list,
 #@profile
 def get_sparse_matchinfo_nonagg(qreq_, nns, neighb_valid0,
                                 neighb_score_list, neighb_valid_list,
-                                neighb_normk_list, Knorm, fsv_col_lbls):
+                                neighb_normk_list, Knorm, fsv_col_lbls,
+                                flat=False):
     """
     builds sparse iterator that generates feature match pairs, scores, and ranks
 
+    If flat is True a FlatChipMatch is returned, which keeps the matches in
+    contiguous arrays ordered by daid instead of grouping them per annot.
+
     Returns:
         ValidMatchTup_ : vmt a tuple of corresponding lists. Each item in the
             list corresponds to a daid, dfx, scorevec, rank, norm_aid, norm_fx...
@@ -1084,6 +1176,19 @@ def get_sparse_matchinfo_nonagg(qreq_, nns, neighb_valid0,
         >>> cm.score_annot_csum(qreq_)
         >>> cm.show_single_annotmatch(qreq_)
         >>> ut.show_if_requested()
+
+    Example1:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.pipeline import *  # NOQA
+        >>> qreq_, qaid, daid, args = plh.testdata_sparse_matchinfo_nonagg(
+        >>>     defaultdb='PZ_MTEST', p=['default:Knorm=3,normalizer_rule=name'])
+        >>> cm = get_sparse_matchinfo_nonagg(qreq_, *args)
+        >>> flat_cm = get_sparse_matchinfo_nonagg(qreq_, *args, flat=True)
+        >>> assert flat_cm.is_flat
+        >>> assert np.all(cm.daid_list == flat_cm.daid_list)
+        >>> assert chip_match.check_arrs_eq(cm.fm_list, flat_cm.fm_list)
+        >>> assert chip_match.check_arrs_eq(cm.fsv_list, flat_cm.fsv_list)
+        >>> flat_cm.assert_self(verbose=False)
     """
     # Unpack neighbor ids, indices, filter scores, and flags
     indexer = qreq_.indexer
@@ -1147,6 +1252,11 @@ def get_sparse_matchinfo_nonagg(qreq_, nns, neighb_valid0,
                                valid_dfx[:, None]), axis=1)
     assert valid_fm.flags.c_contiguous, 'non-contiguous'
     # valid_fm = np.ascontiguousarray(valid_fm)
+    if flat:
+        return _build_flat_chipmatch(nns.qaid, valid_daid, valid_fm,
+                                     valid_scorevec, valid_rank,
+                                     valid_norm_aids, valid_norm_fxs,
+                                     fsv_col_lbls)
     daid_list, daid_groupxs = vt.group_indices(valid_daid)
 
     fm_list  = vt.apply_grouping(valid_fm, daid_groupxs)
@@ -1173,6 +1283,37 @@ def get_sparse_matchinfo_nonagg(qreq_, nns, neighb_valid0,
     return cm
 
 
+def _build_flat_chipmatch(qaid, valid_daid, valid_fm, valid_scorevec,
+                          valid_rank, valid_norm_aids, valid_norm_fxs,
+                          fsv_col_lbls):
+    """
+    Sorts the valid matches by daid (in the same order as vt.group_indices)
+    and records where each daid starts instead of splitting the arrays.
+    """
+    sortx = valid_daid.argsort()
+    sorted_daid = valid_daid.take(sortx)
+    num = len(sorted_daid)
+    isfirst = np.ones(num, dtype=np.bool)
+    np.not_equal(sorted_daid[1:], sorted_daid[:-1], out=isfirst[1:])
+    startxs = np.flatnonzero(isfirst)
+    daid_list = sorted_daid.take(startxs)
+    daid_offsets = np.append(startxs, num)
+
+    def _take_norm(valid_norm):
+        return [None if arr is None else arr.take(sortx)
+                for arr in valid_norm]
+
+    cm = chip_match.FlatChipMatch.from_flat(
+        qaid, daid_list, daid_offsets,
+        flat_fm=valid_fm.take(sortx, axis=0),
+        flat_fsv=valid_scorevec.take(sortx, axis=0),
+        flat_fk=valid_rank.take(sortx),
+        fsv_col_lbls=fsv_col_lbls,
+        flat_filtnorm_aids=_take_norm(valid_norm_aids),
+        flat_filtnorm_fxs=_take_norm(valid_norm_fxs))
+    return cm
+
+
 #============================
 # 5) Spatial Verification
 #============================
@@ -1253,7 +1394,12 @@ def _spatial_verification(qreq_, cm_list, verbose=VERB_PIPELINE):
     cm_progiter = ut.ProgressIter(cm_shortlist, length=len(cm_shortlist),
                                   prog_hook=prog_hook, lbl=SVER_LVL, **PROGKW)
 
-    cm_list_SVER = [sver_single_chipmatch(qreq_, cm) for cm in cm_progiter]
+    sver_workers = qreq_.qparams.sver_workers
+    if sver_workers > 1 and len(cm_shortlist) > 1:
+        cm_list_SVER = parallel_sver_chipmatches(qreq_, cm_shortlist,
+                                                 sver_workers, prog_hook)
+    else:
+        cm_list_SVER = [sver_single_chipmatch(qreq_, cm) for cm in cm_progiter]
     # rescore after verification?
     return cm_list_SVER
 
@@ -1363,15 +1509,42 @@ def sver_single_chipmatch(qreq_, cm, verbose=False):
         >>>                    refine_method=refine_method)
         >>> ut.show_if_requested()
     """
+    sv_kw = get_sver_kw(qreq_)
+    kpts1, kpts2_list, top_dlen_sqrd_list, match_weight_list = sver_inputs(
+        qreq_, cm)
+    svtup_list = sver_shortlist(kpts1, kpts2_list, cm.fm_list,
+                                top_dlen_sqrd_list, match_weight_list, sv_kw,
+                                verbose=verbose)
+
+    # <SENTINAL>
+
+    cmSV = sver_outputs(qreq_, cm, svtup_list, top_dlen_sqrd_list)
+    return cmSV
+
+
+def get_sver_kw(qreq_):
+    """ spatial verification parameters passed to vt.spatially_verify_kpts """
+    sv_kw = dict(
+        xy_thresh=qreq_.qparams.xy_thresh,
+        scale_thresh=qreq_.qparams.scale_thresh,
+        ori_thresh=qreq_.qparams.ori_thresh,
+        min_nInliers=qreq_.qparams.min_nInliers,
+        full_homog_checks=qreq_.qparams.full_homog_checks,
+        refine_method=qreq_.qparams.refine_method,
+    )
+    return sv_kw
+
+
+def sver_inputs(qreq_, cm):
+    r"""
+    Looks up the keypoints, extents, and match weights needed to spatially
+    verify the shortlist of a chipmatch.
+
+    Returns:
+        tuple: (kpts1, kpts2_list, top_dlen_sqrd_list, match_weight_list)
+    """
     qaid = cm.qaid
     use_chip_extent       = qreq_.qparams.use_chip_extent
-    xy_thresh             = qreq_.qparams.xy_thresh
-    scale_thresh          = qreq_.qparams.scale_thresh
-    ori_thresh            = qreq_.qparams.ori_thresh
-    min_nInliers          = qreq_.qparams.min_nInliers
-    full_homog_checks     = qreq_.qparams.full_homog_checks
-    refine_method         = qreq_.qparams.refine_method
-    sver_output_weighting = qreq_.qparams.sver_output_weighting
     # Precompute sver cmtup_old
     kpts1 = qreq_.get_qreq_qannot_kpts(qaid).astype(np.float64)
     kpts2_list = qreq_.get_qreq_dannot_kpts(cm.daid_list)
@@ -1393,35 +1566,33 @@ def sver_single_chipmatch(qreq_, cm, verbose=False):
         match_weight_list = [qweights.take(fm.T[0]) for fm in cm.fm_list]
     else:
         match_weight_list = [np.ones(len(fm), dtype=np.float64) for fm in cm.fm_list]
+    return kpts1, kpts2_list, top_dlen_sqrd_list, match_weight_list
+
 
-    # Make an svtup for every daid in the shortlist
-    _iter1 = zip(cm.daid_list, cm.fm_list, cm.fsv_list, kpts2_list,
-                 top_dlen_sqrd_list, match_weight_list)
+def sver_shortlist(kpts1, kpts2_list, fm_list, top_dlen_sqrd_list,
+                   match_weight_list, sv_kw, verbose=False):
+    r"""
+    Makes an svtup for every daid in the shortlist. Does not depend on the
+    controller, so it can run in a worker process.
+
+    Returns:
+        list: svtup_list - None for each daid that could not be verified
+    """
+    xy_thresh             = sv_kw['xy_thresh']
+    scale_thresh          = sv_kw['scale_thresh']
+    ori_thresh            = sv_kw['ori_thresh']
+    min_nInliers          = sv_kw['min_nInliers']
+    full_homog_checks     = sv_kw['full_homog_checks']
+    refine_method         = sv_kw['refine_method']
+    _iter1 = zip(fm_list, kpts2_list, top_dlen_sqrd_list, match_weight_list)
     if verbose:
-        _iter1 = ut.ProgIter(_iter1, length=len(cm.daid_list), lbl='sver shortlist', freq=1)
+        _iter1 = ut.ProgIter(_iter1, length=len(fm_list), lbl='sver shortlist', freq=1)
     svtup_list = []
-    for daid, fm, fsv, kpts2, dlen_sqrd2, match_weights in _iter1:
+    for fm, kpts2, dlen_sqrd2, match_weights in _iter1:
         if len(fm) == 0:
             # skip results without any matches
             sv_tup = None
         else:
-
-            # sver_testdata = dict(
-            #     kpts1=kpts1,
-            #     kpts2=kpts2,
-            #     fm=fm,
-            #     xy_thresh=xy_thresh,
-            #     scale_thresh=scale_thresh,
-            #     ori_thresh=ori_thresh,
-            #     dlen_sqrd2=dlen_sqrd2,
-            #     min_nInliers=min_nInliers,
-            #     match_weights=match_weights,
-            #     full_homog_checks=full_homog_checks,
-            #     refine_method=refine_method
-            # )
-
-            # locals().update(ut.load_data('sver_testdata.pkl'))
-
             try:
                 # Compute homography from chip2 to chip1 returned homography
                 # maps image1 space into image2 space image1 is a query chip
@@ -1437,9 +1608,15 @@ def sver_single_chipmatch(qreq_, cm, verbose=False):
                                  'scale_thresh', 'dlen_sqrd2', 'min_nInliers'])
                 sv_tup = None
         svtup_list.append(sv_tup)
+    return svtup_list
 
-    # <SENTINAL>
 
+def sver_outputs(qreq_, cm, svtup_list, top_dlen_sqrd_list):
+    r"""
+    Builds the spatially verified chipmatch from the svtups of its shortlist
+    """
+    xy_thresh             = qreq_.qparams.xy_thresh
+    sver_output_weighting = qreq_.qparams.sver_output_weighting
     # New way
     inliers_list = []
     for sv_tup in svtup_list:
@@ -1461,6 +1638,8 @@ def sver_single_chipmatch(qreq_, cm, verbose=False):
 
     if sver_output_weighting:
         homog_err_weight_list = []
+        # The extent of the last shortlist item is used for all of them
+        dlen_sqrd2 = top_dlen_sqrd_list[-1]
         xy_thresh_sqrd = dlen_sqrd2 * xy_thresh
         for sv_tup in svtup_list_:
             (homog_inliers, homog_errors) = sv_tup[0:2]
@@ -1474,6 +1653,95 @@ def sver_single_chipmatch(qreq_, cm, verbose=False):
     return cmSV
 
 
+def parallel_sver_chipmatches(qreq_, cm_shortlist, sver_workers,
+                              prog_hook=None):
+    r"""
+    Spatially verifies the shortlists of many chipmatches in a process pool.
+
+    The controller is only used in this process to gather inputs. Every
+    keypoint array needed by the shortlists is written once into a
+    memory-mapped file so workers read them without pickling copies. Results
+    are returned in the same order as ``cm_shortlist``.
+
+    CommandLine:
+        python -m ibeis.algo.hots.pipeline parallel_sver_chipmatches
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.pipeline import *  # NOQA
+        >>> ibs, qreq_, cm_list = plh.testdata_pre_sver('PZ_MTEST', qaid_list=[18, 19, 20])
+        >>> scoring.score_chipmatch_list(qreq_, cm_list, qreq_.qparams.prescore_method)
+        >>> cm_list1 = [sver_single_chipmatch(qreq_, cm) for cm in cm_list]
+        >>> cm_list2 = parallel_sver_chipmatches(qreq_, cm_list, 2)
+        >>> for cm1, cm2 in zip(cm_list1, cm_list2):
+        >>>     assert np.all(cm1.daid_list == cm2.daid_list)
+        >>>     assert all(np.all(fm1 == fm2) for fm1, fm2 in zip(cm1.fm_list, cm2.fm_list))
+    """
+    import tempfile
+    from os.path import join
+    sv_kw = get_sver_kw(qreq_)
+    inputs_list = [sver_inputs(qreq_, cm) for cm in cm_shortlist]
+    # Pack every unique keypoint array into one flat array. Query keypoints
+    # are stored in their native dtype and cast back to float64 by workers.
+    kpts_dtype = qreq_.get_qreq_qannot_kpts(cm_shortlist[0].qaid).dtype
+    key2_slice = {}
+    kpts_list = []
+    offset = 0
+    for cm, (kpts1, kpts2_list, _, _) in zip(cm_shortlist, inputs_list):
+        keys = [('q', cm.qaid)] + [('d', daid) for daid in cm.daid_list]
+        kpts1 = kpts1.astype(kpts_dtype)
+        for key, kpts in zip(keys, [kpts1] + list(kpts2_list)):
+            if key not in key2_slice:
+                key2_slice[key] = (offset, offset + len(kpts))
+                offset += len(kpts)
+                kpts_list.append(kpts)
+    dpath = tempfile.mkdtemp(prefix='sver_')
+    kpts_fpath = join(dpath, 'kpts.npy')
+    try:
+        np.save(kpts_fpath, np.vstack(kpts_list).astype(kpts_dtype))
+        del kpts_list
+
+        def _gen_args():
+            for cm, inputs in zip(cm_shortlist, inputs_list):
+                (_, _, top_dlen_sqrd_list, match_weight_list) = inputs
+                qslice = key2_slice[('q', cm.qaid)]
+                dslice_list = [key2_slice[('d', daid)] for daid in cm.daid_list]
+                yield (kpts_fpath, qslice, dslice_list, cm.fm_list,
+                       top_dlen_sqrd_list, match_weight_list, sv_kw)
+        svtups_gen = ut.generate2(
+            _sver_worker, _gen_args(), nTasks=len(cm_shortlist),
+            ordered=True, nprocs=sver_workers,
+            force_serial=qreq_.ibs.force_serial,
+            progkw=dict(prog_hook=prog_hook))
+        cm_list_SVER = [
+            sver_outputs(qreq_, cm, svtup_list, inputs[2])
+            for cm, inputs, svtup_list in
+            zip(cm_shortlist, inputs_list, svtups_gen)
+        ]
+    finally:
+        ut.delete(dpath, verbose=False)
+    return cm_list_SVER
+
+
+_SVER_KPTS_MMAP = {}
+
+
+def _sver_worker(kpts_fpath, qslice, dslice_list, fm_list, top_dlen_sqrd_list,
+                 match_weight_list, sv_kw):
+    """ process pool worker for parallel_sver_chipmatches """
+    if kpts_fpath not in _SVER_KPTS_MMAP:
+        # Only keep the keypoints of the current request open
+        _SVER_KPTS_MMAP.clear()
+        _SVER_KPTS_MMAP[kpts_fpath] = np.load(kpts_fpath, mmap_mode='r')
+    kpts_mmap = _SVER_KPTS_MMAP[kpts_fpath]
+    kpts1 = np.asarray(kpts_mmap[slice(*qslice)], dtype=np.float64)
+    kpts2_list = [np.asarray(kpts_mmap[slice(*dslice)])
+                  for dslice in dslice_list]
+    svtup_list = sver_shortlist(kpts1, kpts2_list, fm_list, top_dlen_sqrd_list,
+                                match_weight_list, sv_kw)
+    return svtup_list
+
+
 def compute_matching_dlen_extent(qreq_, fm_list, kpts_list):
     r"""
     helper for spatial verification, computes the squared diagonal length of
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Per-stage instrumentation of the hotspotter pipeline.
+
+Each QueryRequest owns a PipelineProfile (qreq_.stage_profile) that
+accumulates wall time, cpu time, memory growth and item counts for every
+pipeline stage, together with cache hit / miss counts. The record survives
+chunking because shallow copies of the request share the same object.
+
+CommandLine:
+    # Print a report after each execute
+    python -m ibeis.algo.hots.pipeline --test-request_ibeis_query_L0:0 --pipe-profile
+
+    # Write the record as json
+    python -m ibeis.algo.hots.pipeline --test-request_ibeis_query_L0:0 --pipe-profile-json=pipe_profile.json
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import time
+import contextlib
+import utool as ut
+from ibeis.other.process_memory import get_current_rss, get_peak_rss
+(print, rrr, profile) = ut.inject2(__name__, '[pipeprof]')
+
+
+PRINT_PIPE_PROFILE = ut.get_argflag('--pipe-profile')
+PIPE_PROFILE_JSON = ut.get_argval('--pipe-profile-json', type_=str, default=None)
+
+# process_time does not exist in python2
+_cpu_time = time.process_time if hasattr(time, 'process_time') else time.clock
+
+
+class PipelineProfile(ut.NiceRepr):
+    r"""
+    Structured timing record of the stages of a query pipeline.
+
+    CommandLine:
+        python -m ibeis.algo.hots.pipeline_profile PipelineProfile
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.pipeline_profile import *  # NOQA
+        >>> prof = PipelineProfile()
+        >>> for _ in range(2):
+        >>>     with prof.stage('nearest_neighbors') as counts:
+        >>>         counts['num_vecs'] = 10
+        >>> prof.record_cache('chipmatch', hits=3, misses=1)
+        >>> info = prof.to_dict()
+        >>> stage = info['stages']['nearest_neighbors']
+        >>> assert stage['calls'] == 2 and stage['counts']['num_vecs'] == 20
+        >>> assert stage['process_peak_rss'] is None or stage['process_peak_rss'] > 0
+        >>> assert info['caches']['chipmatch']['hit_ratio'] == .75
+        >>> assert 'nearest_neighbors' in prof.get_report_str()
+        >>> assert ut.from_json(prof.to_json())['caches'] == info['caches']
+    """
+
+    def __init__(prof):
+        prof.stages = ut.odict()
+        prof.caches = ut.odict()
+
+    def __nice__(prof):
+        return 'nStages=%d, wall=%.3fs' % (len(prof.stages),
+                                           prof.get_total('wall'))
+
+    def reset(prof):
+        prof.stages.clear()
+        prof.caches.clear()
+
+    def _stage_info(prof, name):
+        if name not in prof.stages:
+            prof.stages[name] = {
+                'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'rss_growth': None,
+                'process_peak_rss': None, 'counts': ut.odict(),
+            }
+        return prof.stages[name]
+
+    @contextlib.contextmanager
+    def stage(prof, name):
+        """
+        Times the body of the with statement as the stage `name`. The yielded
+        dict is used to report the number of items the stage processed.
+        Repeated calls (e.g. one per query chunk) accumulate.
+
+        rss_growth is the change in current resident memory over the stage.
+        process_peak_rss is the high-water mark of the whole process when
+        the stage ended, so it is shared by all stages after the peak.
+        """
+        counts = ut.odict()
+        rss0 = get_current_rss()
+        cpu0 = _cpu_time()
+        wall0 = time.time()
+        try:
+            yield counts
+        finally:
+            wall = time.time() - wall0
+            cpu = _cpu_time() - cpu0
+            rss1 = get_current_rss()
+            peak = get_peak_rss()
+            info = prof._stage_info(name)
+            info['calls'] += 1
+            info['wall'] += wall
+            info['cpu'] += cpu
+            if rss0 is not None and rss1 is not None:
+                info['rss_growth'] = (info['rss_growth'] or 0) + rss1 - rss0
+            if peak is not None:
+                info['process_peak_rss'] = max(info['process_peak_rss'] or 0,
+                                               peak)
+            for key, num in counts.items():
+                info['counts'][key] = info['counts'].get(key, 0) + int(num)
+
+    def record_cache(prof, name, hits=0, misses=0):
+        if name not in prof.caches:
+            prof.caches[name] = {'hits': 0, 'misses': 0}
+        prof.caches[name]['hits'] += hits
+        prof.caches[name]['misses'] += misses
+
+    def get_total(prof, key):
+        return sum(info[key] for info in prof.stages.values())
+
+    def to_dict(prof):
+        caches = ut.odict()
+        for name, cache in prof.caches.items():
+            total = cache['hits'] + cache['misses']
+            caches[name] = ut.odict([
+                ('hits', cache['hits']),
+                ('misses', cache['misses']),
+                ('hit_ratio', (cache['hits'] / total) if total else None),
+            ])
+        info = ut.odict([
+            ('stages', ut.odict([
+                (name, ut.odict([
+                    ('calls', stage['calls']),
+                    ('wall', stage['wall']),
+                    ('cpu', stage['cpu']),
+                    ('rss_growth', stage['rss_growth']),
+                    ('process_peak_rss', stage['process_peak_rss']),
+                    ('counts', ut.odict(stage['counts'])),
+                ]))
+                for name, stage in prof.stages.items()
+            ])),
+            ('caches', caches),
+            ('total_wall', prof.get_total('wall')),
+            ('total_cpu', prof.get_total('cpu')),
+        ])
+        return info
+
+    def to_json(prof):
+        return ut.to_json(prof.to_dict(), pretty=True)
+
+    def dump_json(prof, fpath, verbose=ut.NOT_QUIET):
+        ut.writeto(fpath, prof.to_json(), verbose=verbose)
+
+    def get_report_str(prof):
+        total_wall = prof.get_total('wall')
+        lines = ['%-26s %5s %9s %9s %6s %10s  %s' % (
+            'stage', 'calls', 'wall', 'cpu', '%', 'rss_growth', 'counts')]
+        for name, stage in prof.stages.items():
+            percent = 100 * stage['wall'] / total_wall if total_wall else 0
+            growth = ('?' if stage['rss_growth'] is None else
+                      ut.byte_str2(stage['rss_growth']))
+            counts = ', '.join('%s=%d' % item for item in stage['counts'].items())
+            lines.append('%-26s %5d %8.3fs %8.3fs %5.1f%% %10s  %s' % (
+                name, stage['calls'], stage['wall'], stage['cpu'], percent,
+                growth, counts))
+        for name, cache in prof.to_dict()['caches'].items():
+            ratio = cache['hit_ratio']
+            lines.append('cache %-20s hits=%d misses=%d hit_ratio=%s' % (
+                name, cache['hits'], cache['misses'],
+                '?' if ratio is None else '%.3f' % (ratio,)))
+        return '\n'.join(lines)
+
+    def print_report(prof):
+        print(prof.get_report_str())
+
+    def emit(prof):
+        """ prints and / or writes the record depending on the command line """
+        if PRINT_PIPE_PROFILE:
+            prof.print_report()
+        if PIPE_PROFILE_JSON is not None:
+            prof.dump_json(PIPE_PROFILE_JSON)
+
+
+if __name__ == '__main__':
+    r"""
+    CommandLine:
+        python -m ibeis.algo.hots.pipeline_profile
+        python -m ibeis.algo.hots.pipeline_profile --allexamples
+    """
+    import multiprocessing
+    multiprocessing.freeze_support()  # for win32
+    import utool as ut  # NOQA
+    ut.doctest_funcs()
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+A long-lived query request for a fixed database.
+
+Creating and executing a new QueryRequest per identification query re-hashes
+the daids, re-resolves the neighbor indexer, re-preloads database features
+and checks the chipmatch cache directories. A QueryEngine does this work
+once. The loaded indexer, database annotation caches, name lookups and
+configs stay pinned in memory, and each query only loads its own features
+before running the pipeline.
+
+The engine must be invalidated when the database annotations or their names
+change.
+
+CommandLine:
+    python -m ibeis.algo.hots.query_engine QueryEngine
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import numpy as np
+import utool as ut
+from ibeis.algo.hots import pipeline
+from ibeis.algo.hots import pipeline_profile
+(print, rrr, profile) = ut.inject2(__name__, '[qengine]')
+
+
+class QueryEngine(ut.NiceRepr):
+    r"""
+    Args:
+        ibs (ibeis.IBEISController):  image analysis api
+        daid_list (list): database annotations (fixed until invalidate)
+        cfgdict (dict): pipeline config
+        custom_nid_lookup (dict): optional aid to nid mapping
+
+    CommandLine:
+        python -m ibeis.algo.hots.query_engine QueryEngine
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.query_engine import *  # NOQA
+        >>> import ibeis
+        >>> ibs = ibeis.opendb(defaultdb='testdb1')
+        >>> aids = ibs.get_valid_aids()
+        >>> cfgdict = dict(sv_on=False)
+        >>> engine = ibs.new_query_engine(aids[4:], cfgdict=cfgdict)
+        >>> cm_list1 = engine.query(aids[0:3])
+        >>> qreq_ = ibs.new_query_request(aids[0:3], aids[4:], cfgdict=cfgdict)
+        >>> cm_list2 = qreq_.execute(use_cache=False)
+        >>> # The engine gives the same results as a fresh request
+        >>> for cm1, cm2 in zip(cm_list1, cm_list2):
+        >>>     assert cm1.qaid == cm2.qaid
+        >>>     aid_to_score1 = ut.dzip(cm1.daid_list, cm1.score_list)
+        >>>     aid_to_score2 = ut.dzip(cm2.daid_list, cm2.score_list)
+        >>>     assert sorted(aid_to_score1) == sorted(aid_to_score2)
+        >>>     daids = sorted(aid_to_score1)
+        >>>     assert np.allclose(ut.take(aid_to_score1, daids),
+        >>>                        ut.take(aid_to_score2, daids))
+        >>> # Each query is profiled on its own
+        >>> prof1 = engine.get_stage_profile()
+        >>> cm = engine.query(aids[3])
+        >>> prof2 = engine.get_stage_profile()
+        >>> assert prof1 is not prof2
+        >>> assert prof2.stages['preload']['calls'] == 1
+        >>> engine.invalidate(daid_list=aids[6:])
+        >>> cm = engine.query(aids[0])
+        >>> assert set(cm.daid_list).issubset(set(aids[6:]))
+    """
+
+    def __init__(engine, ibs, daid_list, cfgdict=None, custom_nid_lookup=None,
+                 verbose=ut.NOT_QUIET):
+        engine.ibs = ibs
+        engine.daid_list = np.array(daid_list)
+        engine.cfgdict = {} if cfgdict is None else cfgdict.copy()
+        engine.custom_nid_lookup = custom_nid_lookup
+        engine.verbose = verbose
+        engine.num_queries = 0
+        engine.last_stage_profile = None
+        engine._base_qreq = None
+
+    def __nice__(engine):
+        state = 'warm' if engine.is_warm else 'cold'
+        return 'nDaids=%d, nQueries=%d, %s' % (
+            len(engine.daid_list), engine.num_queries, state)
+
+    @property
+    def is_warm(engine):
+        return engine._base_qreq is not None
+
+    @property
+    def qreq_(engine):
+        """ the pinned database-side request (built on first use) """
+        if engine._base_qreq is None:
+            engine.warmup()
+        return engine._base_qreq
+
+    def warmup(engine):
+        """
+        Builds the database-side request, its indexer and preloads the
+        database annotation data.
+        """
+        if engine.verbose:
+            print('[qengine] warming up for %d daids' % (len(engine.daid_list),))
+        # The base request queries a single database annot. Its query side is
+        # replaced for every call to query.
+        qreq_ = engine.ibs.new_query_request(
+            engine.daid_list[0:1], engine.daid_list, cfgdict=engine.cfgdict,
+            custom_nid_lookup=engine.custom_nid_lookup, verbose=False)
+        assert qreq_.qparams.pipeline_root == 'vsmany', (
+            'QueryEngine only supports the vsmany pipeline')
+        qreq_.lazy_load(verbose=engine.verbose >= 2)
+        engine._base_qreq = qreq_
+
+    def invalidate(engine, daid_list=None):
+        """
+        Drops all pinned state. Call this when the database annotations or
+        their names change. The next query warms the engine up again.
+
+        Args:
+            daid_list (list): new database annotations (default = unchanged)
+        """
+        if daid_list is not None:
+            engine.daid_list = np.array(daid_list)
+        engine._base_qreq = None
+
+    def get_stage_profile(engine):
+        """ the PipelineProfile of the most recent query (None before any) """
+        return engine.last_stage_profile
+
+    def new_query_request(engine, qaid_list):
+        """
+        Returns a request for qaid_list that shares all database-side state of
+        the engine.
+        """
+        base = engine.qreq_
+        qreq_ = base.__class__()
+        qreq_.__dict__.update(base.__dict__)
+        # Profiles would accumulate across queries if the base one was shared
+        qreq_.stage_profile = pipeline_profile.PipelineProfile()
+        qaid_list = np.array(qaid_list)
+        # Only annots unknown to the base request need name lookups
+        new_aids = np.setdiff1d(qaid_list, base.unique_aids)
+        if len(new_aids) > 0:
+            if engine.custom_nid_lookup is None:
+                new_nids = engine.ibs.get_annot_nids(new_aids)
+            else:
+                new_nids = ut.dict_take(engine.custom_nid_lookup, new_aids)
+            qreq_.unique_aids = np.append(base.unique_aids, new_aids)
+            qreq_.unique_nids = np.append(base.unique_nids, new_nids)
+            qreq_.aid_to_idx = base.aid_to_idx.copy()
+            qreq_.aid_to_idx.update(zip(new_aids, range(len(base.unique_aids),
+                                                        len(qreq_.unique_aids))))
+            qreq_._unique_annots = engine.ibs.annots(qreq_.unique_aids)
+        qreq_.set_external_qaids(qaid_list)
+        return qreq_
+
+    def query(engine, qaid_list, verbose=False):
+        """
+        Runs the pipeline for one or more query annotations against the
+        pinned database. Results are not read from or written to the
+        chipmatch caches.
+
+        Returns:
+            list or ChipMatch: a ChipMatch per qaid (or a single ChipMatch if
+                a single qaid is given)
+        """
+        is_single = not ut.isiterable(qaid_list)
+        qaid_list = [qaid_list] if is_single else qaid_list
+        qreq_ = engine.new_query_request(qaid_list)
+        cm_list = pipeline.request_ibeis_query_L0(engine.ibs, qreq_,
+                                                  verbose=verbose)
+        engine.num_queries += len(qaid_list)
+        engine.last_stage_profile = qreq_.stage_profile
+        return cm_list[0] if is_single else cm_list
+
+
+if __name__ == '__main__':
+    r"""
+    CommandLine:
+        python -m ibeis.algo.hots.query_engine
+        python -m ibeis.algo.hots.query_engine --allexamples
+    """
+    import multiprocessing
+    multiprocessing.freeze_support()  # for win32
+    import utool as ut  # NOQA
+    ut.doctest_funcs()
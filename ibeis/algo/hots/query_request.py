@@ -20,6 +20,7 @@ from ibeis.algo.hots import neighbor_index_cache
 # from ibeis.algo.hots import distinctiveness_normalizer
 from ibeis.algo.hots import query_params
 from ibeis.algo.hots import chip_match
+from ibeis.algo.hots import pipeline_profile
 from ibeis.algo.hots import _pipeline_helpers as plh  # NOQA
 #import warnings
 (print, rrr, profile) = ut.inject2(__name__)
@@ -302,6 +303,7 @@ class QueryRequest(ut.NiceRepr):
         qreq_.normalizer = None  # The scoring normalization mechanism
         qreq_.dstcnvs_normer = None
         qreq_.hasloaded = False
+        qreq_._data_preloaded = False
         # Pipeline configuration
         qreq_.qparams = None   # Parameters relating to pipeline execution
         qreq_.query_config2_ = None
@@ -312,6 +314,8 @@ class QueryRequest(ut.NiceRepr):
         qreq_.qresdir = None
         qreq_.prog_hook = None
         qreq_.lnbnn_normer = None
+        # Per-stage timing record (shared by shallow copies)
+        qreq_.stage_profile = pipeline_profile.PipelineProfile()
 
         # Keeps internal name state
         qreq_.unique_aids = None
@@ -549,6 +553,7 @@ class QueryRequest(ut.NiceRepr):
         state['normalizer'] = None
         state['dstcnvs_normer'] = None
         state['hasloaded'] = False
+        state['_data_preloaded'] = False
         state['lnbnn_normer'] = False
         state['_internal_dannots'] = None
         state['_internal_qannots'] = None
@@ -613,6 +618,12 @@ class QueryRequest(ut.NiceRepr):
         cacher = ut.Cacher(bc_fname, bc_cfgstr, cache_dir=bc_dpath)
         return cacher
 
+    def get_big_cmstore_fpath(qreq_):
+        """ path of the ChipMatchStore that replaces the big cacher """
+        bc_dpath, bc_fname, bc_cfgstr = qreq_.get_bigcache_info()
+        fname = bc_fname + '_' + ut.hashstr27(bc_cfgstr) + '.cmstore'
+        return join(bc_dpath, fname)
+
     @profile
     def get_bigcache_info(qreq_):
         bc_dpath = qreq_.ibs.get_big_cachedir()
@@ -648,6 +659,7 @@ class QueryRequest(ut.NiceRepr):
     def _set_internal_daids(qreq_, daid_list):
         qreq_.internal_daids_mask = None  # Invalidate mask
         qreq_.internal_daids = np.array(daid_list)
+        qreq_._data_preloaded = False
         # Use new annotation objects
         config = qreq_.get_internal_data_config2()
         qreq_._internal_dannots = qreq_.ibs.annots(qreq_.internal_daids,
@@ -1047,17 +1059,22 @@ class QueryRequest(ut.NiceRepr):
         if prog_hook is not None:
             prog_hook.initialize_subhooks(4)
 
+        # The database side only needs to be loaded once per set of daids
+        data = not getattr(qreq_, '_data_preloaded', False)
+
         qreq_.qannots.preload('nids')
-        qreq_.dannots.preload('nids')
+        if data:
+            qreq_.dannots.preload('nids')
 
         subhook = None if prog_hook is None else prog_hook.next_subhook()
-        qreq_.ensure_features(verbose=verbose, prog_hook=subhook)
+        qreq_.ensure_features(verbose=verbose, prog_hook=subhook, data=data)
 
         subhook = None if prog_hook is None else prog_hook.next_subhook()
         if subhook is not None:
             subhook(0, 1, 'preload featweights')
         if qreq_.qparams.fg_on is True:
-            qreq_.ensure_featweights(verbose=verbose)
+            qreq_.ensure_featweights(verbose=verbose, data=data)
+        qreq_._data_preloaded = True
 
         subhook = None if prog_hook is None else prog_hook.next_subhook()
         if subhook is not None:
@@ -1130,10 +1147,11 @@ class QueryRequest(ut.NiceRepr):
             config2_=qreq_.extern_data_config2, **externgetkw)
 
     @profile
-    def ensure_features(qreq_, verbose=ut.NOT_QUIET, prog_hook=None):
+    def ensure_features(qreq_, verbose=ut.NOT_QUIET, prog_hook=None, data=True):
         r""" ensure features are computed
         Args:
             verbose (bool):  verbosity flag(default = True)
+            data (bool): if False only the query features are ensured
 
         CommandLine:
             python -m ibeis.algo.hots.query_request --test-ensure_features
@@ -1162,17 +1180,19 @@ class QueryRequest(ut.NiceRepr):
         qreq_.qannots.preload('kpts', 'vecs')
         if prog_hook is not None:
             prog_hook(2, 3, 'ensure database features')
-        qreq_.dannots.preload('kpts')
+        if data:
+            qreq_.dannots.preload('kpts')
         if prog_hook is not None:
             prog_hook(3, 3, 'computed features')
 
     @profile
-    def ensure_featweights(qreq_, verbose=ut.NOT_QUIET):
+    def ensure_featweights(qreq_, verbose=ut.NOT_QUIET, data=True):
         """ ensure feature weights are computed """
         if verbose:
             print('[qreq] ensure_featweights')
         qreq_.qannots.preload('fgweights')
-        qreq_.dannots.preload('fgweights')
+        if data:
+            qreq_.dannots.preload('fgweights')
 
     @profile
     def load_indexer(qreq_, verbose=ut.NOT_QUIET, force=False, prog_hook=None):
@@ -1184,10 +1204,10 @@ class QueryRequest(ut.NiceRepr):
             index_method = qreq_.qparams.index_method
             if prog_hook is not None:
                 prog_hook.set_progress(0, 1, lbl='Loading %s indexer' % (index_method,))
-            if index_method == 'single':
+            if index_method in ['single', 'sharded']:
                 # TODO: SYSTEM updatable indexer
                 if ut.VERYVERBOSE or verbose:
-                    print('[qreq] loading single indexer normalizer')
+                    print('[qreq] loading %s indexer normalizer' % (index_method,))
                 indexer = neighbor_index_cache.request_ibeis_nnindexer(
                     qreq_, verbose=verbose, prog_hook=prog_hook,
                     **qreq_._indexer_request_params)
@@ -1203,6 +1223,16 @@ class QueryRequest(ut.NiceRepr):
             qreq_.indexer = indexer
             return True
 
+    def get_stage_profile(qreq_):
+        """
+        Returns the PipelineProfile that records per-stage timings, counts
+        and cache hits of this request.
+        """
+        if getattr(qreq_, 'stage_profile', None) is None:
+            # Requests pickled before profiling existed
+            qreq_.stage_profile = pipeline_profile.PipelineProfile()
+        return qreq_.stage_profile
+
     def get_infostr(qreq_):
         infostr_list = []
         app = infostr_list.append
@@ -1231,10 +1261,16 @@ class QueryRequest(ut.NiceRepr):
             fpath = join(dpath, fname)
             yield fpath
 
-    def execute(qreq_, qaids=None, prog_hook=None, use_cache=None, invalidate_supercache=None):
+    def execute(qreq_, qaids=None, prog_hook=None, use_cache=None,
+                invalidate_supercache=None, lazy=False):
         r"""
         Runs the hotspotter pipeline and returns chip match objects.
 
+        Args:
+            lazy (bool): cached chip matches only load their feature
+                correspondences when accessed. Use this when only the
+                scores are needed.
+
         CommandLine:
             python -m ibeis.algo.hots.query_request execute --show
 
@@ -1253,7 +1289,8 @@ class QueryRequest(ut.NiceRepr):
         if qaids is not None:
             shallow_qreq_ = qreq_.shallowcopy(qaids=qaids)
             cm_list = shallow_qreq_.execute(prog_hook=prog_hook, use_cache=use_cache,
-                                            invalidate_supercache=invalidate_supercache)
+                                            invalidate_supercache=invalidate_supercache,
+                                            lazy=lazy)
             #cm_list = qreq_.ibs.query_chips(
             #    qreq_=shallow_qreq_, use_bigcache=False )
         else:
@@ -1263,7 +1300,8 @@ class QueryRequest(ut.NiceRepr):
             cm_list = mc4.submit_query_request(
                 qreq_, use_cache=use_cache, use_bigcache=use_cache, verbose=True,
                 save_qcache=use_cache, use_supercache=use_cache,
-                invalidate_supercache=invalidate_supercache)
+                invalidate_supercache=invalidate_supercache, lazy=lazy)
+            qreq_.get_stage_profile().emit()
         return cm_list
 
 
@@ -28,7 +28,8 @@ class FinalResults(ut.NiceRepr):
 
 class TempQuery(ut.NiceRepr):
     """ queries that are incomplete """
-    def __init__(query, vecs, invalid_axs, get_neighbors, get_axs):
+    def __init__(query, vecs, invalid_axs, get_neighbors, get_axs,
+                 groupxs=None):
         # Static attributes
         query.invalid_axs = invalid_axs
         query.get_neighbors = get_neighbors
@@ -36,6 +37,9 @@ class TempQuery(ut.NiceRepr):
         # Dynamic attributes
         query.index = np.arange(len(vecs))
         query.vecs = vecs
+        # For stacked queries each row belongs to a group with its own
+        # invalid_axs. In this case invalid_axs are encoded group keys.
+        query.groupxs = groupxs
 
     def __nice__(query):
         return str(query.index)
@@ -45,7 +49,12 @@ class TempQuery(ut.NiceRepr):
         idxs = vt.atleast_nd(_idxs, 2)
         dists = vt.atleast_nd(_dists, 2)
         # Flag any neighbors that are invalid
-        validflags = ~in1d_shape(query.get_axs(idxs), query.invalid_axs)
+        axs = query.get_axs(idxs)
+        if query.groupxs is None:
+            validflags = ~in1d_shape(axs, query.invalid_axs)
+        else:
+            keys = group_keys(query.groupxs[:, None], axs)
+            validflags = ~in1d_shape(keys, query.invalid_axs)
         # Store results in an object
         cand = TempResults(query.index, idxs, dists, validflags)
         return cand
@@ -53,6 +62,8 @@ class TempQuery(ut.NiceRepr):
     def compress_inplace(query, flags):
         query.index = query.index.compress(flags, axis=0)
         query.vecs = query.vecs.compress(flags, axis=0)
+        if query.groupxs is not None:
+            query.groupxs = query.groupxs.compress(flags, axis=0)
 
 
 class TempResults(ut.NiceRepr):
@@ -111,12 +122,28 @@ def in1d_shape(arr1, arr2):
     return np.in1d(arr1, arr2).reshape(arr1.shape)
 
 
+def group_keys(groupxs, axs):
+    """
+    Encodes (group index, annot index) pairs as a single int64 key so
+    membership in per-group invalid sets can be tested with one in1d call.
+    """
+    groupxs = np.asarray(groupxs, dtype=np.int64)
+    axs = np.asarray(axs, dtype=np.int64)
+    return np.left_shift(groupxs, 32) | axs
+
+
 def requery_knn(get_neighbors, get_axs, qfx2_vec, num_neighbs, invalid_axs=[],
-                pad=2, limit=4, recover=True):
+                pad=2, limit=4, recover=True, qfx2_groupx=None):
     """
     Searches for `num_neighbs`, while ignoring certain matches.  K is
     increassed until enough valid neighbors are found or a limit is reached.
 
+    If `qfx2_groupx` is specified, then `qfx2_vec` is a stack of vectors from
+    multiple queries, `qfx2_groupx[i]` is the query that row `i` belongs to,
+    and `invalid_axs[g]` is the list of invalid annot indices for query `g`.
+    Each row obtains the same result it would get if its query was searched
+    by itself.
+
     Example:
         >>> # ENABLE_DOCTEST
         >>> from ibeis.algo.hots.neighbor_index import *  # NOQA
@@ -177,12 +204,44 @@ def requery_knn(get_neighbors, get_axs, qfx2_vec, num_neighbs, invalid_axs=[],
         >>>     get_neighbors, get_axs, qfx2_vec, num_neighbs, invalid_axs, pad,
         >>>     limit, recover=True)
         >>> qfx2_idx, qfx2_dist = res
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.hots.requery_knn import *  # NOQA
+        >>> # Stacked queries give the same result as individual queries
+        >>> rng = np.random.RandomState(0)
+        >>> max_k, n_pts, num_neighbs = 9, 6, 3
+        >>> tx2_idx_full = rng.randint(0, 10, size=(n_pts, max_k))
+        >>> tx2_dist_full = np.sort(rng.rand(n_pts, max_k), axis=1)
+        >>> def get_neighbors(vecs, temp_K):
+        >>>     return (tx2_idx_full[vecs.ravel(), 0:temp_K],
+        >>>             tx2_dist_full[vecs.ravel(), 0:temp_K])
+        >>> get_axs = ut.identity
+        >>> qvecs_list = [np.arange(0, 2)[:, None], np.arange(2, 6)[:, None]]
+        >>> invalid_axs_list = [np.array([0, 1, 2]), np.array([5, 7, 9])]
+        >>> single = [requery_knn(get_neighbors, get_axs, vecs, num_neighbs,
+        >>>                       invalid_axs, pad=0, limit=1)
+        >>>           for vecs, invalid_axs in zip(qvecs_list, invalid_axs_list)]
+        >>> qfx2_groupx = np.array([0, 0, 1, 1, 1, 1])
+        >>> stacked = requery_knn(get_neighbors, get_axs, np.vstack(qvecs_list),
+        >>>                       num_neighbs, invalid_axs_list, pad=0, limit=1,
+        >>>                       qfx2_groupx=qfx2_groupx)
+        >>> assert np.all(stacked[0] == np.vstack(ut.take_column(single, 0)))
+        >>> assert np.allclose(stacked[1], np.vstack(ut.take_column(single, 1)))
     """
+    if qfx2_groupx is not None:
+        qfx2_groupx = np.asarray(qfx2_groupx, dtype=np.int64)
+        invalid_keys_list = [
+            group_keys(np.full(len(axs), groupx, dtype=np.int64), axs)
+            for groupx, axs in enumerate(invalid_axs)]
+        invalid_axs = np.hstack(
+            [np.empty(0, dtype=np.int64)] + invalid_keys_list)
 
     # Alloc space for final results
     shape = (len(qfx2_vec), num_neighbs)
     final = FinalResults(shape)  # NOQA
-    query = TempQuery(qfx2_vec, invalid_axs, get_neighbors, get_axs)
+    query = TempQuery(qfx2_vec, invalid_axs, get_neighbors, get_axs,
+                      groupxs=qfx2_groupx)
 
     temp_K = num_neighbs + pad
     assert limit > 0, 'must have at least one iteration'
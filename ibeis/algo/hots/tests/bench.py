@@ -28,6 +28,70 @@ def benchmark_knn():
                                   verbose=verbose)
 
 
+def benchmark_stacked_knn():
+    r"""
+    Compares per-annotation FLANN calls to stacked multi-query calls
+
+    CommandLine:
+        python ~/code/ibeis/ibeis/algo/hots/tests/bench.py benchmark_stacked_knn
+        python ~/code/ibeis/ibeis/algo/hots/tests/bench.py benchmark_stacked_knn --db PZ_Master1
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from bench import *  # NOQA
+        >>> result = benchmark_stacked_knn()
+        >>> print(result)
+    """
+    import numpy as np
+    import ibeis
+    qreq_ = ibeis.testdata_qreq_(
+        defaultdb='PZ_MTEST',
+        t='default:K=4,requery=False',
+        a='default:qsize=100', verbose=1
+    )
+    qreq_.load_indexer()
+    indexer = qreq_.indexer
+    qannots = qreq_.internal_qannots
+    qvecs_list = qannots.vecs
+    impossible_aids_list = [[aid] for aid in qannots.aid]
+    num_vecs = sum(map(len, qvecs_list))
+    K = qreq_.qparams.K + qreq_.qparams.Knorm
+    K_list = [K + 1] * len(qvecs_list)
+    pad_list = [2] * len(qvecs_list)
+
+    n = ut.get_argval('--n', type_=int, default=3)
+    results = ut.odict()
+
+    def _bench(key, func):
+        t = ut.Timerit(n, label=key, verbose=0)
+        for timer in t:
+            with timer:
+                out = func()
+        results[key] = t.min()
+        return out
+
+    single = _bench('knn-single', lambda: [
+        indexer.knn(qfx2_vec, K_) for qfx2_vec, K_ in zip(qvecs_list, K_list)])
+    stacked = _bench('knn-stacked', lambda: indexer.stacked_knn(
+        qvecs_list, K_list))
+    for (idxs1, _), (idxs2, _) in zip(single, stacked):
+        assert np.all(idxs1 == idxs2), 'stacked knn results differ'
+
+    _bench('requery-single', lambda: [
+        indexer.requery_knn(qfx2_vec, K, pad, aids)
+        for qfx2_vec, pad, aids in zip(qvecs_list, pad_list,
+                                       impossible_aids_list)])
+    _bench('requery-stacked', lambda: indexer.stacked_requery_knn(
+        qvecs_list, K, pad_list, impossible_aids_list))
+
+    lines = ['nAnnots=%d, nVecs=%d, nIndexed=%d' % (
+        len(qvecs_list), num_vecs, indexer.num_indexed)]
+    for key, secs in results.items():
+        lines.append('%16s: %8.4fs  %10.1f vecs/s' % (key, secs, num_vecs / secs))
+    result = '\n'.join(lines)
+    return result
+
+
 if __name__ == '__main__':
     r"""
     CommandLine:
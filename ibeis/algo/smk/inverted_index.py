@@ -286,6 +286,23 @@ class InvertedAnnots(InvertedAnnotsExtras):
         inva.int_rvec = None
         inva.config = None
         inva.vocab_rowid = None
+        inva._postings = None
+
+    # Changing any of these rebuilds the index the postings were built from
+    _posting_attrs = {'aids', 'wx_lists', 'agg_rvecs', 'agg_flags',
+                      'wx_to_weight', 'wx_to_aids'}
+
+    def __setattr__(inva, key, value):
+        if key in InvertedAnnots._posting_attrs:
+            inva.invalidate_postings()
+        super(InvertedAnnots, inva).__setattr__(key, value)
+
+    def invalidate_postings(inva):
+        """
+        Drops the cached postings. Only needs to be called directly after
+        modifying the index arrays or weights in place.
+        """
+        inva.__dict__['_postings'] = None
 
     @property
     def wx_list(inva):
@@ -352,7 +369,9 @@ class InvertedAnnots(InvertedAnnotsExtras):
         ut.assert_lists_eq(nfeat_list1, nfeat_list3)
 
     def __getstate__(inva):
-        state = inva.__dict__
+        state = inva.__dict__.copy()
+        # postings are rebuilt on demand
+        state.pop('_postings', None)
         return state
 
     def __setstate__(inva, state):
@@ -370,6 +389,62 @@ class InvertedAnnots(InvertedAnnotsExtras):
             wx_to_aids = smk_funcs.invert_lists(inva.aids, inva.wx_lists)
             return wx_to_aids
 
+    @profile
+    def get_postings(inva):
+        """
+        Flat inverted lists used to score many annotations at once.
+
+        Postings are sorted by word, and by annotation index within a word.
+        Each posting is one (word, annotation) pair with columns:
+            wxs - word index
+            idxs - annotation index into inva.aids
+            wordxs - index of the word in the annotation (into its wx_list)
+            rowxs - row of the residual in the stacked rvecs / flags
+            weights - word weight of wxs
+
+        Built on first use, so wx_to_weight must already be computed. The
+        postings are rebuilt after any of the index attributes is reassigned.
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from ibeis.algo.smk.inverted_index import *  # NOQA
+            >>> inva = InvertedAnnots()
+            >>> inva.aids = [1, 2, 3]
+            >>> inva.wx_lists = [np.array([0, 5], dtype=np.int32),
+            >>>                  np.array([5], dtype=np.int32),
+            >>>                  np.array([0, 2, 5], dtype=np.int32)]
+            >>> inva.agg_rvecs = [np.ones((len(wxs), 2)) for wxs in inva.wx_lists]
+            >>> inva.agg_flags = [np.zeros((len(wxs), 1), dtype=np.bool) for wxs in inva.wx_lists]
+            >>> inva.wx_to_weight = {0: .5, 2: 1.0, 5: .25}
+            >>> postings = inva.get_postings()
+            >>> print(ut.repr2(postings['wxs']))
+            >>> print(ut.repr2(postings['idxs']))
+            >>> print(ut.repr2(postings['wordxs']))
+            np.array([0, 0, 2, 5, 5, 5])
+            np.array([0, 2, 2, 0, 1, 2])
+            np.array([0, 0, 1, 1, 0, 2])
+            >>> inva.wx_to_weight = {0: 1.0, 2: 1.0, 5: 1.0}
+            >>> assert np.all(inva.get_postings()['weights'] == 1.0)
+        """
+        if getattr(inva, '_postings', None) is None:
+            lens = np.array(ut.lmap(len, inva.wx_lists), dtype=np.int64)
+            offsets = np.cumsum(lens) - lens
+            flat_wxs = np.hstack(inva.wx_lists)
+            flat_idxs = np.repeat(np.arange(len(lens)), lens)
+            flat_wordxs = np.arange(len(flat_wxs)) - np.repeat(offsets, lens)
+            sortx = flat_wxs.argsort(kind='mergesort')
+            wxs = flat_wxs.take(sortx)
+            inva._postings = {
+                'wxs': wxs,
+                'idxs': flat_idxs.take(sortx),
+                'wordxs': flat_wordxs.take(sortx),
+                'rowxs': sortx,
+                'weights': np.array(ut.take(inva.wx_to_weight, wxs)),
+                'rvecs': np.vstack(inva.agg_rvecs),
+                'flags': np.vstack(inva.agg_flags),
+            }
+        return inva._postings
+
     @profile
     def compute_word_weights(inva, method='idf'):
         """
@@ -4,12 +4,19 @@ TODO: semantic_uuids should be replaced with PCC-like hashes pertaining to
 annotation clusters if any form of name scoring is used.
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
+import os
+import multiprocessing
 from os.path import exists, join
 from ibeis.algo.hots import chip_match
 import utool as ut
 import numpy as np
 (print, rrr, profile) = ut.inject2(__name__, '[mc5]')
 
+# Number of worker processes used to compute cache misses
+NUM_WORKERS = ut.get_argval('--mc5-workers', type_=int, default=0)
+# (parent pid, request) inherited by forked query workers
+_WORKER_QREQ = None
+
 
 class EstimatorRequest(ut.NiceRepr):
     def __init__(qreq_):
@@ -17,6 +24,7 @@ class EstimatorRequest(ut.NiceRepr):
         qreq_.use_bulk_cache = True
         qreq_.min_bulk_size = 64
         qreq_.chunksize = 256
+        qreq_.num_workers = NUM_WORKERS
         qreq_.prog_hook = None
 
     def __len__(qreq_):
@@ -255,28 +263,89 @@ def execute_singles(qreq_):
 
 
 def execute_and_save(qreq_miss):
+    r"""
+    Computes the chip matches of all queries in chunks and saves each one to
+    the single cache.
+
+    If qreq_miss.num_workers > 1 the chunks are computed by a pool of forked
+    worker processes. The workers share the read-only state of the request
+    (e.g. the inverted indexes) with the parent through copy-on-write memory.
+    Results are saved by the parent as they arrive.
+    """
+    qaids = qreq_miss.qaids
+    num_workers = qreq_miss.num_workers
+    use_workers = (num_workers > 1 and len(qaids) > 1 and
+                   _can_fork_workers())
+    chunksize = qreq_miss.chunksize
+    if use_workers:
+        # smaller chunks keep all of the workers busy
+        chunksize = min(chunksize, max(1, int(np.ceil(
+            len(qaids) / (4 * num_workers)))))
+    qaid_chunks = list(ut.ichunks(qaids, chunksize))
     # Iterate over vsone queries in chunks.
-    total_chunks = ut.get_num_chunks(len(qreq_miss.qaids), qreq_miss.chunksize)
-    qaid_chunk_iter = ut.ichunks(qreq_miss.qaids, qreq_miss.chunksize)
-    _prog = ut.ProgPartial(length=total_chunks, freq=1,
+    _prog = ut.ProgPartial(length=len(qaid_chunks), freq=1,
                            label='[mc5] query chunk: ',
                            prog_hook=qreq_miss.prog_hook, bs=False)
-    qaid_chunk_iter = iter(_prog(qaid_chunk_iter))
+    if use_workers:
+        cm_batch_iter = _execute_chunks_parallel(qreq_miss, qaid_chunks,
+                                                 num_workers)
+    else:
+        cm_batch_iter = (qreq_miss.shallowcopy(qaids=qaids).execute_pipeline()
+                         for qaids in qaid_chunks)
 
     qaid_to_cm = {}
-    for qaids in qaid_chunk_iter:
-        sub_qreq = qreq_miss.shallowcopy(qaids=qaids)
-        cm_batch = sub_qreq.execute_pipeline()
+    for qaids, cm_batch in _prog(zip(qaid_chunks, cm_batch_iter)):
         assert len(cm_batch) == len(qaids), 'bad alignment'
         assert all([qaid == cm.qaid for qaid, cm in zip(qaids, cm_batch)])
 
         # TODO: we already computed the fpaths
         # should be able to pass them in
-        fpath_list = sub_qreq.get_chipmatch_fpaths(qaids)
-        _prog = ut.ProgPartial(length=len(cm_batch), adjust=True, freq=1,
-                               label='saving chip matches', bs=True)
-        for cm, fpath in _prog(zip(cm_batch, fpath_list)):
+        fpath_list = qreq_miss.get_chipmatch_fpaths(qaids)
+        _prog2 = ut.ProgPartial(length=len(cm_batch), adjust=True, freq=1,
+                                label='saving chip matches', bs=True)
+        for cm, fpath in _prog2(zip(cm_batch, fpath_list)):
             cm.save_to_fpath(fpath, verbose=False)
         qaid_to_cm.update({cm.qaid: cm for cm in cm_batch})
 
     return qaid_to_cm
+
+
+def _can_fork_workers():
+    get_start_method = getattr(multiprocessing, 'get_start_method', None)
+    if get_start_method is not None and get_start_method() != 'fork':
+        print('[mc5] workers need the fork start method. Running serially')
+        return False
+    return True
+
+
+def _execute_chunks_parallel(qreq_, qaid_chunks, num_workers):
+    """ yields the cm_batch of each chunk in order """
+    global _WORKER_QREQ
+    _WORKER_QREQ = (os.getpid(), qreq_)
+    try:
+        # Workers must be forked after the global is set
+        for cm_batch in ut.generate2(_execute_chunk_worker, zip(qaid_chunks),
+                                     ntasks=len(qaid_chunks), ordered=True,
+                                     nprocs=num_workers, verbose=False):
+            yield cm_batch
+    finally:
+        _WORKER_QREQ = None
+
+
+def _get_worker_qreq():
+    global _WORKER_QREQ
+    parent_pid, qreq_ = _WORKER_QREQ
+    if parent_pid != os.getpid():
+        # The sqlite connections of the parent cannot be used after a fork
+        import ibeis
+        qreq_.ibs = ibeis.opendb(dbdir=qreq_.ibs.get_dbdir(), use_cache=False,
+                                 web=False, force_serial=True)
+        _WORKER_QREQ = (os.getpid(), qreq_)
+    return qreq_
+
+
+def _execute_chunk_worker(qaids):
+    qreq_ = _get_worker_qreq()
+    sub_qreq = qreq_.shallowcopy(qaids=qaids)
+    cm_batch = sub_qreq.execute_pipeline()
+    return cm_batch
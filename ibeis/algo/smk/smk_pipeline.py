@@ -282,6 +282,10 @@ class SMKRequest(mc5.EstimatorRequest):
         qreq_.qinva = qinva
         qreq_.dinva = dinva
 
+        if qreq_.qparams['agg']:
+            # Built once here so forked query workers share them
+            dinva.get_postings()
+
         print('loading keypoints')
         if qreq_.qparams.sv_on:
             qreq_.data_kpts = qreq_.ibs.get_annot_kpts(
@@ -395,7 +399,6 @@ class SMK(ut.NiceRepr):
         valid_flags = check_can_match(qaid, hit_daids, qreq_)
         valid_daids = hit_daids.compress(valid_flags)
 
-        shortlist = ut.Shortlist(shortsize)
         #gammaX = smk.gamma(X, wx_to_weight, agg, alpha, thresh)
         _prog = ut.ProgPartial(lbl='smk scoring qaid=%r' % (qaid,),
                                enabled=verbose, bs=True, adjust=True)
@@ -411,11 +414,10 @@ class SMK(ut.NiceRepr):
             daid = correct_aids[0]
 
         if agg:
-            for daid in _prog(valid_daids):
-                Y = qreq_.dinva.get_annot(daid)
-                item = match_kernel_agg(X, Y, wx_to_weight, alpha, thresh)
-                shortlist.insert(item)
+            shortlist = match_kernel_agg_bulk(X, qreq_.dinva, valid_daids,
+                                              alpha, thresh, shortsize)
         else:
+            shortlist = ut.Shortlist(shortsize)
             for daid in _prog(valid_daids):
                 Y = qreq_.dinva.get_annot(daid)
                 item = match_kernel_sep(X, Y, wx_to_weight, alpha, thresh)
@@ -490,6 +492,102 @@ def match_kernel_agg(X, Y, wx_to_weight, alpha, thresh):
     return item
 
 
+@profile
+def match_kernel_agg_bulk(X, dinva, daids, alpha, thresh, shortsize=None):
+    r"""
+    Vectorized match_kernel_agg of X against many database annotations.
+
+    Every (query word, database annotation) pair that shares a word is scored
+    at once using the flat inverted postings of dinva. Only the shortsize best
+    annotations (found with a partial sort) are turned into items.
+
+    Args:
+        X (SingleAnnot): query annotation
+        dinva (InvertedAnnots): database inverted index
+        daids (ndarray): database annotations that may be matched
+        alpha (float): selectivity power
+        thresh (float): selectivity threshold
+        shortsize (int): number of items to keep. None keeps all.
+
+    Returns:
+        list: items in ascending order of score. Items are the same as the
+            ones returned by match_kernel_agg.
+
+    CommandLine:
+        python -m ibeis.algo.smk.smk_pipeline match_kernel_agg_bulk
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from ibeis.algo.smk.smk_pipeline import *  # NOQA
+        >>> ibs, smk, qreq_ = testdata_smk()
+        >>> qreq_.ensure_data()
+        >>> X = qreq_.qinva.get_annot(qreq_.qaids[0])
+        >>> daids = np.array(qreq_.daids)
+        >>> alpha, thresh = 3.0, 0.0
+        >>> items = match_kernel_agg_bulk(X, qreq_.dinva, daids, alpha, thresh)
+        >>> wx_to_weight = qreq_.dinva.wx_to_weight
+        >>> for item in items:
+        >>>     item_ = match_kernel_agg(X, item[2], wx_to_weight, alpha, thresh)
+        >>>     assert item[0] == item_[0]
+        >>>     assert np.all(item[1] == item_[1])
+    """
+    postings = dinva.get_postings()
+    is_valid = np.zeros(len(dinva.aids), dtype=np.bool)
+    is_valid[ut.take(dinva.aid_to_idx, daids)] = True
+
+    # Find the postings of each query word (in ascending word order)
+    qsortx = X.wx_list.argsort()
+    qwxs = X.wx_list.take(qsortx)
+    starts = np.searchsorted(postings['wxs'], qwxs, 'left')
+    lens = np.searchsorted(postings['wxs'], qwxs, 'right') - starts
+    offsets = np.cumsum(lens) - lens
+    pxs = np.arange(lens.sum()) + np.repeat(starts - offsets, lens)
+    X_idx = np.repeat(qsortx, lens)
+    idxs = postings['idxs'].take(pxs)
+    flags = is_valid.take(idxs)
+    pxs, X_idx, idxs = pxs.compress(flags), X_idx.compress(flags), idxs.compress(flags)
+    # Group by database annotation while keeping the word order
+    groupx = idxs.argsort(kind='mergesort')
+    pxs, X_idx, idxs = pxs.take(groupx), X_idx.take(groupx), idxs.take(groupx)
+
+    # Score every shared word with the same operations as match_kernel_agg
+    rowxs = postings['rowxs'].take(pxs)
+    PhisX = X.agg_rvecs.take(X_idx, axis=0)
+    flagsX = X.agg_flags.take(X_idx, axis=0)
+    PhisY = postings['rvecs'].take(rowxs, axis=0)
+    flagsY = postings['flags'].take(rowxs, axis=0)
+    if X.int_rvec:
+        PhisX = smk_funcs.uncast_residual_integer(PhisX)
+    if dinva.int_rvec:
+        PhisY = smk_funcs.uncast_residual_integer(PhisY)
+    scores = smk_funcs.match_scores_agg(PhisX, PhisY, flagsX, flagsY, alpha,
+                                        thresh)
+    gammaXY = X.gamma * np.array(dinva.gamma_list).take(idxs)
+    norm_weights = (postings['weights'].take(pxs) * gammaXY)
+    scores *= norm_weights
+
+    if len(scores) == 0:
+        return []
+    unique_idxs, seg_starts = np.unique(idxs, return_index=True)
+    seg_stops = np.append(seg_starts[1:], len(idxs))
+    totals = np.add.reduceat(scores, seg_starts)
+    if shortsize is not None and shortsize < len(totals):
+        topxs = np.argpartition(-totals, shortsize - 1)[:shortsize]
+    else:
+        topxs = np.arange(len(totals))
+
+    items = []
+    for x in topxs:
+        lo, hi = seg_starts[x], seg_stops[x]
+        Y = dinva.get_annot(dinva.aids[unique_idxs[x]])
+        score_list = scores[lo:hi]
+        Y_idx = postings['wordxs'].take(pxs[lo:hi])
+        item = (score_list.sum(), score_list, Y, X_idx[lo:hi], Y_idx)
+        items.append(item)
+    items = sorted(items, key=lambda item: item[0])
+    return items
+
+
 def match_kernel_sep(X, Y, wx_to_weight, alpha, thresh):
     gammaXY = X.gamma * Y.gamma
     # Words in common define matches
@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
+import os
 import dtool_ibeis
 import utool as ut
 import vtool_ibeis as vt
 from vtool_ibeis._pyflann_backend import pyflann as pyflann
 from ibeis.algo.smk import pickle_flann
+from ibeis.other import process_memory
 import numpy as np
 import warnings
+from os.path import exists, join
 from ibeis.control.controller_inject import register_preprocs
 (print, rrr, profile) = ut.inject2(__name__)
 
@@ -21,6 +24,11 @@ class VocabConfig(dtool_ibeis.Config):
         ut.ParamInfo('num_words', 1000, 'n'),
         ut.ParamInfo('version', 2),
         ut.ParamInfo('n_init', 1),
+        # Number of annotations read at a time by the streaming algorithm
+        ut.ParamInfo('stream_chunksize', 256, 'scs',
+                     hideif=lambda cfg: cfg['algorithm'] != 'streaming'),
+        ut.ParamInfo('stream_passes', 3, 'sp',
+                     hideif=lambda cfg: cfg['algorithm'] != 'streaming'),
     ]
 
 
@@ -225,9 +233,20 @@ def compute_vocab(depc, fid_list, config):
 
     """
     print('[IBEIS] COMPUTE_VOCAB:')
+    num_words = config['num_words']
+    if config['algorithm'] == 'streaming':
+        ckpt_dpath = ut.ensuredir((depc.cache_dpath, 'vocab_checkpoints'))
+        ckpt_fname = 'vocab_ckpt_%s.cPkl' % (ut.hashstr27(
+            repr(list(fid_list)) + config.get_cfgstr()),)
+        words = train_streaming_vocab(
+            depc, fid_list, config, checkpoint_fpath=join(ckpt_dpath, ckpt_fname))
+        print('Constructing vocab')
+        vocab = VisualVocab(words)
+        print('Building vocab index')
+        vocab.build()
+        return (vocab,)
     vecs_list = depc.get_native('feat', fid_list, 'vecs')
     train_vecs = np.vstack(vecs_list).astype(np.float32)
-    num_words = config['num_words']
     print('[smk_index] Train Vocab(nWords=%d) using %d annots and %d descriptors' %
           (num_words, len(fid_list), len(train_vecs)))
     if config['algorithm'] == 'kdtree':
@@ -289,6 +308,223 @@ def compute_vocab(depc, fid_list, config):
     return (vocab,)
 
 
+def train_streaming_vocab(depc, fid_list, config, checkpoint_fpath=None,
+                          checkpoint_freq=10, verbose=ut.NOT_QUIET):
+    r"""
+    Mini-batch k-means that streams descriptors from the depcache.
+
+    Descriptors are read stream_chunksize annotations at a time, so memory
+    depends on the chunk size and the number of words, not on the total
+    number of training descriptors. Each chunk is assigned to its nearest
+    words using a FLANN index over the current words, then every word moves
+    to the running mean of all descriptors assigned to it so far. Words that
+    are never assigned in a pass are reset to random descriptors.
+
+    If checkpoint_fpath is given the state is saved every checkpoint_freq
+    chunks and an interrupted run resumes from the last checkpoint.
+
+    Args:
+        depc (DependencyCache):
+        fid_list (list): feature rowids of the training annotations
+        config (VocabConfig):
+        checkpoint_fpath (str): (default = None)
+        checkpoint_freq (int): (default = 10)
+
+    Returns:
+        ndarray: words
+
+    CommandLine:
+        python -m ibeis.algo.smk.vocab_indexer train_streaming_vocab
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from ibeis.algo.smk.vocab_indexer import *  # NOQA
+        >>> import ibeis
+        >>> ibs, aid_list = ibeis.testdata_aids('testdb1')
+        >>> depc = ibs.depc_annot
+        >>> fid_list = depc.get_rowids('feat', aid_list)
+        >>> config = VocabConfig(algorithm='streaming', num_words=64,
+        >>>                      stream_chunksize=4)
+        >>> words = train_streaming_vocab(depc, fid_list, config)
+        >>> assert words.shape == (64, 128)
+    """
+    num_words = config['num_words']
+    chunksize = config['stream_chunksize']
+    num_passes = config['stream_passes']
+    flann_params = vt.get_flann_params(random_seed=config['random_seed'])
+    num_feats_list = np.array(depc.get_native('feat', fid_list, 'num_feats'))
+    num_chunks = ut.get_num_chunks(len(fid_list), chunksize)
+    if verbose:
+        print('[vocab] Streaming Vocab(nWords=%d) using %d annots, '
+              '%d descriptors, %d chunks, %d passes' % (
+                  num_words, len(fid_list), num_feats_list.sum(), num_chunks,
+                  num_passes))
+
+    state = None
+    if checkpoint_fpath is not None and exists(checkpoint_fpath):
+        try:
+            state = ut.load_cPkl(checkpoint_fpath, verbose=False)
+        except Exception as ex:
+            ut.printex(ex, 'bad vocab checkpoint', iswarning=True)
+        else:
+            if verbose:
+                print('[vocab] resuming from pass %d chunk %d' % (
+                    state['passx'], state['chunkx']))
+    if state is None:
+        rng = np.random.RandomState(config['random_seed'])
+        words = _sample_stream_vecs(depc, fid_list, num_feats_list,
+                                    num_words, rng, chunksize)
+        state = {
+            'words': words.astype(np.float64),
+            'counts': np.zeros(num_words, dtype=np.int64),
+            'passx': 0,
+            'chunkx': 0,
+            'order': None,
+            'rng_state': rng.get_state(),
+        }
+    rng = np.random.RandomState()
+    rng.set_state(state['rng_state'])
+
+    max_chunk_nbytes = 0
+    while state['passx'] < num_passes:
+        if state['order'] is None:
+            state['order'] = rng.permutation(len(fid_list))
+            state['rng_state'] = rng.get_state()
+            # counts of this pass find words that are no longer used
+            state['pass_counts'] = np.zeros(num_words, dtype=np.int64)
+        chunk_iter = ut.ichunks(state['order'], chunksize)
+        _prog = ut.ProgPartial(length=num_chunks, bs=True, enabled=verbose,
+                               lbl='vocab pass %d' % (state['passx'],))
+        vecs = None
+        for chunkx, idxs in enumerate(_prog(chunk_iter)):
+            if chunkx < state['chunkx']:
+                continue
+            vecs_list = depc.get_native('feat', ut.take(fid_list, idxs), 'vecs')
+            vecs = np.vstack(vecs_list).astype(np.float32)
+            max_chunk_nbytes = max(max_chunk_nbytes, vecs.nbytes)
+            _update_stream_words(state, vecs, flann_params)
+            state['chunkx'] = chunkx + 1
+            if checkpoint_fpath is not None and chunkx % checkpoint_freq == 0:
+                _save_vocab_checkpoint(checkpoint_fpath, state)
+        # Reset words that were not assigned anything during this pass
+        dead_wxs = np.where(state['pass_counts'] == 0)[0]
+        if len(dead_wxs) > 0:
+            if verbose:
+                print('[vocab] resetting %d unused words' % (len(dead_wxs),))
+            state['words'][dead_wxs] = _sample_stream_vecs(
+                depc, fid_list, num_feats_list, len(dead_wxs), rng, chunksize)
+            state['counts'][dead_wxs] = 0
+        state['passx'] += 1
+        state['chunkx'] = 0
+        state['order'] = None
+        state['rng_state'] = rng.get_state()
+        if checkpoint_fpath is not None:
+            _save_vocab_checkpoint(checkpoint_fpath, state)
+
+    if verbose:
+        peak = process_memory.get_peak_rss()
+        print('[vocab] largest chunk = %s, peak memory = %s' % (
+            ut.byte_str2(max_chunk_nbytes),
+            'unknown' if peak is None else ut.byte_str2(peak)))
+    if checkpoint_fpath is not None:
+        ut.delete(checkpoint_fpath, verbose=False)
+    words = state['words'].astype(np.float32)
+    return words
+
+
+def _update_stream_words(state, vecs, flann_params):
+    """ moves words to the running mean of their assigned descriptors """
+    words, counts = state['words'], state['counts']
+    flann = pyflann.FLANN()
+    flann.build_index(words.astype(np.float32), **flann_params)
+    wxs, _ = flann.nn_index(vecs, 1, checks=flann_params['checks'])
+    flann.delete_index()
+    wxs = np.asarray(wxs).ravel()
+    sortx = wxs.argsort(kind='mergesort')
+    unique_wxs, starts = np.unique(wxs.take(sortx), return_index=True)
+    sums = np.add.reduceat(vecs.take(sortx, axis=0).astype(np.float64),
+                           starts, axis=0)
+    nums = np.diff(np.append(starts, len(wxs)))
+    old_counts = counts.take(unique_wxs)
+    new_counts = old_counts + nums
+    words[unique_wxs] = ((words[unique_wxs] * old_counts[:, None] + sums) /
+                         new_counts[:, None])
+    counts[unique_wxs] = new_counts
+    state['pass_counts'][unique_wxs] += nums
+
+
+def _sample_stream_vecs(depc, fid_list, num_feats_list, num, rng, chunksize):
+    """
+    uniformly samples distinct descriptors without loading all of them
+
+    CommandLine:
+        python -m ibeis.algo.smk.vocab_indexer _sample_stream_vecs
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.smk.vocab_indexer import *  # NOQA
+        >>> from ibeis.algo.smk.vocab_indexer import _sample_stream_vecs
+        >>> num_feats_list = np.array([5, 0, 3, 7, 1, 4])
+        >>> offsets = np.cumsum(num_feats_list) - num_feats_list
+        >>> # every descriptor is a distinct row
+        >>> fid_to_vecs = {
+        >>>     fid: np.arange(start, start + n)[:, None].repeat(4, axis=1)
+        >>>     for fid, start, n in zip(range(6), offsets, num_feats_list)}
+        >>> class FeatDepc(object):
+        >>>     def get_native(self, tablename, fids, colname):
+        >>>         return ut.take(fid_to_vecs, fids)
+        >>> rng = np.random.RandomState(0)
+        >>> for num in [1, 9, 20]:
+        >>>     words = _sample_stream_vecs(FeatDepc(), list(range(6)),
+        >>>                                 num_feats_list, num, rng, chunksize=2)
+        >>>     assert words.shape == (num, 4)
+        >>>     assert len(np.unique(words[:, 0])) == num
+        >>>     assert np.all(words == words[:, 0:1])
+    """
+    offsets = np.cumsum(num_feats_list)
+    total = offsets[-1] if len(offsets) else 0
+    if total < num:
+        raise ValueError('cannot train %d words from %d descriptors' % (
+            num, total))
+    flat_idxs = _sample_distinct_idxs(total, num, rng)
+    idx_list = np.searchsorted(offsets, flat_idxs, side='right')
+    fx_list = flat_idxs - (offsets - num_feats_list).take(idx_list)
+    unique_idxs, groupxs = ut.group_indices(idx_list)
+    samples = None
+    for chunk in ut.ichunks(list(range(len(unique_idxs))), chunksize):
+        chunk_fids = ut.take(fid_list, ut.take(unique_idxs, chunk))
+        vecs_list = depc.get_native('feat', chunk_fids, 'vecs')
+        for vecs, xs in zip(vecs_list, ut.take(groupxs, chunk)):
+            if samples is None:
+                samples = np.empty((num, vecs.shape[1]), dtype=np.float32)
+            samples[xs] = vecs.take(fx_list.take(xs), axis=0)
+    return samples
+
+
+def _sample_distinct_idxs(total, num, rng):
+    """
+    sorted sample of num distinct integers in range(total). Uses memory
+    proportional to num instead of total.
+    """
+    if num * 2 >= total:
+        # A permutation is at most twice the size of the sample here
+        return np.sort(rng.choice(total, num, replace=False))
+    flat_idxs = np.unique(rng.randint(0, total, size=num, dtype=np.int64))
+    while len(flat_idxs) < num:
+        extra = rng.randint(0, total, size=num - len(flat_idxs),
+                            dtype=np.int64)
+        flat_idxs = np.unique(np.hstack([flat_idxs, extra]))
+    return flat_idxs
+
+
+def _save_vocab_checkpoint(fpath, state):
+    # write then rename so an interrupt never leaves a partial checkpoint
+    tmp_fpath = fpath + '.tmp'
+    ut.save_cPkl(tmp_fpath, state, verbose=False)
+    ut.delete(fpath, verbose=False)
+    os.rename(tmp_fpath, fpath)
+
+
 def testdata_vocab(defaultdb='testdb1', **kwargs):
     """
     >>> from ibeis.algo.smk.vocab_indexer import *  # NOQA
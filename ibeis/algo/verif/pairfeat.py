@@ -3,15 +3,23 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import utool as ut
 import vtool_ibeis as vt
 import numpy as np
-import ubelt as ub
 import pandas as pd
 import dtool_ibeis as dt
-from os.path import join
+from os.path import join, exists
 from ibeis.algo.graph import nx_utils as nxu
+from ibeis.algo.verif import pairfeat_batch
 from ibeis.core_annots import ChipConfig
 print, rrr, profile = ut.inject2(__name__)
 
 
+# Number of edges requested from the pairwise_match table at a time. Progress
+# is reported after each block.
+PAIRWISE_MATCH_BLOCKSIZE = 2048
+
+# Features are float32, so this is the nearest value to 2 ** 30 - 1 they hold
+NA_FILL_VALUE = np.float32((2 ** 30) - 1)
+
+
 class PairFeatureConfig(dt.Config):
     """
     Config for building pairwise feature dimensions
@@ -171,9 +179,19 @@ class PairwiseFeatureExtractor(object):
         qaids = ut.take_column(edges, 0)
         daids = ut.take_column(edges, 1)
 
-        # The depcache does the pairwise matching procedure
-        match_list = ibs.depc.get('pairwise_match', (qaids, daids), 'match',
-                                  config=match_config)
+        # The depcache does the pairwise matching procedure. Edges are sorted
+        # so the chunks it computes (and commits) share their annotations.
+        sortx = ut.argsort(edges)
+        chunks = list(ut.ichunks(sortx, PAIRWISE_MATCH_BLOCKSIZE))
+        prog = ut.ProgIter(chunks, label='pairwise match', prog_hook=prog_hook,
+                           enabled=len(chunks) > 1)
+        match_list = [None] * len(edges)
+        for idxs in prog:
+            chunk_matches = ibs.depc.get(
+                'pairwise_match', (ut.take(qaids, idxs), ut.take(daids, idxs)),
+                'match', config=match_config)
+            for idx, match in zip(idxs, chunk_matches):
+                match_list[idx] = match
 
         # Hack: Postprocess matches to re-add ibeis annotation info
         # in lazy-dict format
@@ -358,19 +376,13 @@ class PairwiseFeatureExtractor(object):
         pairfeat_cfg = extr.pairfeat_cfg.copy()
         use_na = pairfeat_cfg.pop('use_na')
         pairfeat_cfg['summary_ops'] = set(pairfeat_cfg['summary_ops'])
-        X = pd.DataFrame([
-            m.make_feature_vector(**pairfeat_cfg)
-            for m in ut.ProgIter(matches, label='making pairwise feats')
-        ])
-        multi_index = True
-        if multi_index:
-            # Index features by edges
-            uv_index = nxu.ensure_multi_index(edges, ('aid1', 'aid2'))
-            X.index = uv_index
-        X[pd.isnull(X)] = np.nan
-        X[np.isinf(X)] = np.nan
-        # Re-order column names to ensure dimensions are consistent
-        X = X.reindex_axis(sorted(X.columns), axis=1)
+        X_arr, columns = pairfeat_batch.make_feature_matrix(matches,
+                                                            **pairfeat_cfg)
+        X_arr[np.isinf(X_arr)] = np.nan
+        # Index features by edges. Columns are sorted to ensure dimensions
+        # are consistent.
+        uv_index = nxu.ensure_multi_index(edges, ('aid1', 'aid2'))
+        X = pd.DataFrame(X_arr, columns=columns, index=uv_index)
 
         # hack to fix feature validity
         if 'global(speed)' in X.columns:
@@ -388,19 +400,16 @@ class PairwiseFeatureExtractor(object):
         if not use_na:
             # Fill nan values with very large values to workaround lack of nan
             # support in sklearn master.
-            X[pd.isnull(X)] = (2 ** 30) - 1
+            X = X.fillna(NA_FILL_VALUE)
         return matches, X
 
-    def _make_cfgstr(extr, edges):
+    def _make_cfgstr(extr):
+        """ identifies the configuration of the feature vector of an edge """
         ibs = extr.ibs
-        edge_uuids = ibs.unflat_map(ibs.get_annot_visual_uuids, edges)
-        edge_hashid = ut.hashid_arr(edge_uuids, 'edges')
-
         _cfg_lbl = ut.partial(ut.repr2, si=True, itemsep='', kvsep=':')
         match_configclass = ibs.depc_annot.configclass_dict['pairwise_match']
 
         cfgstr = '_'.join([
-            edge_hashid,
             _cfg_lbl(extr.match_config),
             _cfg_lbl(extr.pairfeat_cfg),
             'global(' + _cfg_lbl(extr.global_keys) + ')',
@@ -408,6 +417,25 @@ class PairwiseFeatureExtractor(object):
         ])
         return cfgstr
 
+    def _get_feat_store(extr):
+        """
+        the per-edge feature store of the current configuration. Stores are
+        kept open on the controller so their chunks are only read once.
+        """
+        from ibeis.algo.verif import pairfeat_store
+        ibs = extr.ibs
+        feat_cfgstr = extr._make_cfgstr()
+        dpath = join(ibs.get_cachedir(), 'pairfeat_store',
+                     ut.hashstr27(feat_cfgstr))
+        store = ibs._pairfeat_stores.get(dpath, None)
+        if store is None or not exists(dpath):
+            store = pairfeat_store.PairFeatureStore(dpath, feat_cfgstr)
+            ibs._pairfeat_stores[dpath] = store
+        else:
+            # pick up chunks written by other processes
+            store.reload()
+        return store
+
     def _postprocess_feats(extr, feats):
         # Take the filtered subset of columns
         if extr.feat_dims is not None:
@@ -456,32 +484,56 @@ class PairwiseFeatureExtractor(object):
             feats = pd.DataFrame(columns=extr.feat_dims, index=index)
             return feats
         else:
-            use_cache = not extr.need_lnbnn and len(edges) > 2
-            cache_dir = join(extr.ibs.get_cachedir(), 'infr_bulk_cache')
-            feat_cfgstr = extr._make_cfgstr(edges)
-            cacher = ub.Cacher(
-                'bulk_pairfeats_v3', feat_cfgstr, enabled=use_cache,
-                dpath=cache_dir, verbose=extr.verbose - 3)
-
-            # if cacher.exists() and extr.verbose > 3:
-            #     fpath = cacher.get_fpath()
-            #     print('Load match cache size: {}'.format(
-            #         ut.get_file_nBytes_str(fpath)))
-
-            data = cacher.tryload()
-            if data is None:
-                data = extr._make_pairwise_features(edges)
-                cacher.save(data)
-
-                # if cacher.enabled and extr.verbose > 3:
-                #     fpath = cacher.get_fpath()
-                #     print('Save match cache size: {}'.format(
-                #         ut.get_file_nBytes_str(fpath)))
-
-            matches, feats = data
+            if extr.need_lnbnn:
+                # LNBNN enriched features depend on the database annots
+                matches, feats = extr._make_pairwise_features(edges)
+            else:
+                feats = extr._stored_pairwise_features(edges)
             feats = extr._postprocess_feats(feats)
         return feats
 
+    def _stored_pairwise_features(extr, edges):
+        """
+        Loads the features of each edge from the per-edge feature store and
+        only computes features of edges that have not been stored yet.
+
+        CommandLine:
+            python -m ibeis.algo.verif.pairfeat _stored_pairwise_features
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from ibeis.algo.verif.pairfeat import *  # NOQA
+            >>> import ibeis
+            >>> ibs = ibeis.opendb('testdb1')
+            >>> extr = PairwiseFeatureExtractor(ibs)
+            >>> ut.delete(extr._get_feat_store().dpath)
+            >>> X1 = extr._stored_pairwise_features([(1, 2), (2, 3)])
+            >>> X2 = extr._stored_pairwise_features([(2, 3), (3, 4), (1, 2)])
+            >>> store = extr._get_feat_store()
+            >>> assert store is extr._get_feat_store()
+            >>> assert len(store) == 3 and len(store.chunk_fpaths) == 2
+            >>> assert np.all(X2.loc[(1, 2)] == X1.loc[(1, 2)])
+            >>> assert list(X2.index) == [(2, 3), (3, 4), (1, 2)]
+            >>> assert list(X2.columns) == list(X1.columns)
+        """
+        ibs = extr.ibs
+        edges = ut.lmap(tuple, edges)
+        store = extr._get_feat_store()
+        edge_uuids = ibs.unflat_map(ibs.get_annot_visual_uuids, edges)
+        keys = ut.lmap(tuple, edge_uuids)
+        key_to_edge = dict(zip(keys, edges))
+        missing_keys = ut.unique(store.missing(keys))
+        if extr.verbose:
+            print('[pairfeat] {} / {} edges have stored features'.format(
+                len(edges) - len(missing_keys), len(edges)))
+        if missing_keys:
+            missing_edges = ut.take(key_to_edge, missing_keys)
+            matches, X_new = extr._make_pairwise_features(missing_edges)
+            store.add(missing_keys, X_new)
+        feats = store.load(keys)
+        feats.index = nxu.ensure_multi_index(edges, ('aid1', 'aid2'))
+        return feats
+
 
 if __name__ == '__main__':
     r"""
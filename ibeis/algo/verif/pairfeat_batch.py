@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Batched construction of pairwise feature vectors.
+
+vt.PairwiseMatch.make_feature_vector builds one dict per match, which is
+slow for large numbers of candidate edges. Here the local measures of all
+matches are concatenated into flat arrays, and the summary statistics of
+every match (and every ratio bin) are computed with segmented numpy
+reductions. The result is written into a single preallocated matrix with
+the same dimensions as the dict-based construction.
+
+CommandLine:
+    python -m ibeis.algo.verif.pairfeat_batch --allexamples
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import warnings
+import numpy as np
+import utool as ut
+import vtool_ibeis as vt
+(print, rrr, profile) = ut.inject2(__name__)
+
+
+SEGMENT_OPS = {'sum', 'mean', 'std', 'med', 'invsum'}
+
+
+def _segment_starts(lens):
+    starts = np.zeros(len(lens), dtype=np.int64)
+    np.cumsum(lens[:-1], out=starts[1:])
+    return starts
+
+
+def _segment_sum(flat, starts, lens):
+    """ per-segment sums (empty segments sum to 0) """
+    if len(lens) == 0:
+        return np.zeros(0, dtype=np.float64)
+    # Pad so reduceat never indexes past the end for trailing empty segments
+    padded = np.append(flat, 0)
+    sums = np.add.reduceat(padded, starts).astype(np.float64)
+    sums[lens == 0] = 0
+    return sums
+
+
+def _segment_median(flat, starts, lens):
+    """ per-segment medians (nan for empty segments or segments with nans) """
+    seg_ids = np.repeat(np.arange(len(lens)), lens)
+    sortx = np.lexsort((flat, seg_ids))
+    sorted_ = flat[sortx]
+    nonempty = lens > 0
+    lo = starts[nonempty] + (lens[nonempty] - 1) // 2
+    hi = starts[nonempty] + lens[nonempty] // 2
+    medians = np.full(len(lens), np.nan)
+    medians[nonempty] = (sorted_[lo] + sorted_[hi]) / 2
+    has_nan = _segment_sum(np.isnan(flat), starts, lens) > 0
+    medians[has_nan] = np.nan
+    return medians
+
+
+def segment_summary(flat, lens, opname):
+    r"""
+    Applies a vt.matching.SUM_OPS summary to each segment of a flat array
+
+    Args:
+        flat (ndarray): concatenated values of all segments
+        lens (ndarray): length of each segment
+        opname (str): sum, mean, std, med, or invsum
+
+    CommandLine:
+        python -m ibeis.algo.verif.pairfeat_batch segment_summary
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.verif.pairfeat_batch import *  # NOQA
+        >>> rng = np.random.RandomState(0)
+        >>> lens = np.array([3, 0, 1, 4, 0])
+        >>> flat = rng.rand(lens.sum()) + .1
+        >>> parts = np.split(flat, np.cumsum(lens)[:-1])
+        >>> for opname in sorted(SEGMENT_OPS):
+        >>>     op = vt.matching.SUM_OPS[opname]
+        >>>     with warnings.catch_warnings():
+        >>>         warnings.simplefilter('ignore', category=RuntimeWarning)
+        >>>         expected = np.array([op(vs) for vs in parts])
+        >>>         result = segment_summary(flat, lens, opname)
+        >>>     assert np.allclose(result, expected, equal_nan=True), opname
+    """
+    flat = np.asarray(flat, dtype=np.float64)
+    lens = np.asarray(lens, dtype=np.int64)
+    starts = _segment_starts(lens)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if opname == 'sum':
+            return _segment_sum(flat, starts, lens)
+        elif opname == 'invsum':
+            return _segment_sum(1 / flat, starts, lens)
+        elif opname == 'mean':
+            return _segment_sum(flat, starts, lens) / lens
+        elif opname == 'std':
+            means = _segment_sum(flat, starts, lens) / lens
+            devs = np.abs(flat - np.repeat(means, lens)) ** 2
+            return np.sqrt(_segment_sum(devs, starts, lens) / lens)
+        elif opname == 'med':
+            return _segment_median(flat, starts, lens)
+        else:
+            raise KeyError('Unknown summary op=%r' % (opname,))
+
+
+def _local_summary_columns(matches, local_keys, summary_ops, bin_key, bins):
+    """
+    Yields the name and values of each local summary dimension in the same
+    order as PairwiseMatch._make_local_summary_feature_vector.
+    """
+    if summary_ops is None:
+        summary_ops = {'sum', 'mean', 'std', 'len'}
+    if summary_ops == 'all':
+        summary_ops = set(vt.matching.SUM_OPS.keys()).union({'len'})
+    if local_keys is None:
+        local_keys = ut.unique(ut.flatten(m.local_measures.keys()
+                                          for m in matches))
+
+    lens = np.array([len(m.fm) for m in matches], dtype=np.int64)
+
+    def _flat_measure(key):
+        parts = [m.local_measures[key] for m in matches]
+        if len(parts) == 0:
+            return np.zeros(0, dtype=np.float64)
+        return np.hstack(parts).astype(np.float64)
+
+    flat_measures = ut.odict([(key, _flat_measure(key)) for key in local_keys])
+    opnames = sorted(set(summary_ops) - {'len'})
+
+    if bin_key is not None:
+        if bins is None:
+            raise ValueError('must choose bins')
+        if isinstance(bins, int):
+            bins = np.linspace(0, 1.0, bins + 1)
+        else:
+            bins = list(bins)
+        bin_ids = np.searchsorted(bins, _flat_measure(bin_key))
+        seg_ids = np.repeat(np.arange(len(matches)), lens)
+        dimkey_fmt = '{opname}({measure}[{bin_key}<{binval}])'
+        for binid, binval in enumerate(bins, start=1):
+            flags = bin_ids <= binid
+            bin_lens = np.bincount(seg_ids[flags], minlength=len(matches))
+            if 'len' in summary_ops:
+                dimkey = dimkey_fmt.format(opname='len', measure='matches',
+                                           bin_key=bin_key, binval=binval)
+                yield dimkey, bin_lens
+            for opname in opnames:
+                for key, flat in flat_measures.items():
+                    dimkey = dimkey_fmt.format(opname=opname, measure=key,
+                                               bin_key=bin_key, binval=binval)
+                    yield dimkey, segment_summary(flat[flags], bin_lens,
+                                                  opname)
+    else:
+        dimkey_fmt = '{opname}({measure})'
+        if 'len' in summary_ops:
+            yield dimkey_fmt.format(opname='len', measure='matches'), lens
+        for opname in opnames:
+            for key, flat in flat_measures.items():
+                dimkey = dimkey_fmt.format(opname=opname, measure=key)
+                yield dimkey, segment_summary(flat, lens, opname)
+
+
+def make_feature_matrix(matches, local_keys=None, global_keys=None,
+                        summary_ops=None, sorters='ratio', indices=3,
+                        bin_key=None, bins=None, dtype=np.float32):
+    r"""
+    Batched equivalent of calling PairwiseMatch.make_feature_vector on each
+    match.
+
+    Args:
+        matches (list): vt.PairwiseMatch objects with local and global
+            measures
+        dtype (type): dtype of the feature matrix
+
+    Returns:
+        tuple: (X, columns) the (len(matches), len(columns)) feature matrix
+            and its sorted dimension names
+
+    CommandLine:
+        python -m ibeis.algo.verif.pairfeat_batch make_feature_matrix
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.verif.pairfeat_batch import *  # NOQA
+        >>> import pandas as pd
+        >>> matches = testdata_matches(num=20)
+        >>> cfg = dict(summary_ops={'len', 'sum', 'mean', 'std', 'med'},
+        >>>            bin_key='ratio', bins=[.5, .8], indices=[],
+        >>>            global_keys=['qual', 'time'])
+        >>> X, columns = make_feature_matrix(matches, dtype=np.float64, **cfg)
+        >>> with warnings.catch_warnings():
+        >>>     warnings.simplefilter('ignore', category=RuntimeWarning)
+        >>>     df = pd.DataFrame([m.make_feature_vector(**cfg) for m in matches])
+        >>> df = df[sorted(df.columns)]
+        >>> assert columns == list(df.columns)
+        >>> assert np.allclose(X, df.values.astype(np.float64), equal_nan=True)
+    """
+    num = len(matches)
+    col_values = ut.odict()
+
+    # Global measures are a handful of python values per match, and their
+    # dimensions depend on the values (e.g. missing gps), so they are still
+    # built per match.
+    global_rows = [m._make_global_feature_vector(global_keys)
+                   for m in matches]
+    for rowx, feat in enumerate(global_rows):
+        for key, value in feat.items():
+            if key not in col_values:
+                col_values[key] = np.full(num, np.nan)
+            col_values[key][rowx] = np.nan if value is None else value
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        for key, values in _local_summary_columns(
+                matches, local_keys, summary_ops, bin_key, bins):
+            col_values[key] = values
+
+        # Top features are off by default (indices=[]) and their
+        # dimensions depend on the number of matches, so they are not batched
+        if not (isinstance(indices, (list, tuple)) and len(indices) == 0):
+            for rowx, match in enumerate(matches):
+                feat = match._make_local_top_feature_vector(
+                    local_keys, sorters=sorters, indices=indices)
+                for key, value in feat.items():
+                    if key not in col_values:
+                        col_values[key] = np.full(num, np.nan)
+                    col_values[key][rowx] = value
+
+    columns = sorted(col_values.keys())
+    X = np.empty((num, len(columns)), dtype=dtype)
+    for colx, key in enumerate(columns):
+        X[:, colx] = col_values[key]
+    return X, columns
+
+
+def testdata_matches(num=10, seed=0):
+    """ matches with random local and global measures """
+    rng = np.random.RandomState(seed)
+    matches = []
+    for aid in range(1, num + 1):
+        match = vt.PairwiseMatch({'aid': aid}, {'aid': aid + num})
+        nfm = rng.randint(0, 8)
+        match.fm = np.vstack([np.arange(nfm), np.arange(nfm)]).T
+        match.fs = rng.rand(nfm)
+        match.local_measures = ut.odict([
+            ('ratio', rng.rand(nfm)),
+            ('match_dist', rng.rand(nfm)),
+            ('fgweights', rng.rand(nfm)),
+        ])
+        match.global_measures = {
+            'qual': (rng.randint(1, 5), None if aid % 3 == 0 else 2),
+            'time': (rng.rand() * 1000, rng.rand() * 1000),
+        }
+        matches.append(match)
+    return matches
+
+
+if __name__ == '__main__':
+    r"""
+    CommandLine:
+        python -m ibeis.algo.verif.pairfeat_batch
+        python -m ibeis.algo.verif.pairfeat_batch --allexamples
+    """
+    import multiprocessing
+    multiprocessing.freeze_support()  # for win32
+    import utool as ut  # NOQA
+    ut.doctest_funcs()
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent per-edge store of pairwise feature vectors.
+
+A store directory holds the feature vectors of a single feature
+configuration (match config, pair feature config and global keys). Rows are
+keyed by the visual uuids of the two annotations of an edge, so they stay
+valid when the set of requested edges changes. Each call to ``add`` appends a
+chunk file containing:
+
+    * uuid_pairs - (N, 32) uint8 array of concatenated visual uuid bytes
+    * columns    - the feature dimension names
+    * values     - (D, N) float64 array stored column by column
+
+Because values are stored column by column, ``values.T`` is the (N, D) feature
+matrix without a copy, which is the layout pandas uses for a single float
+block. All chunks of a store have the same columns in the same order. Once
+there are more than ``max_chunks`` chunks they are merged by ``compact``.
+
+Several processes may share one store. Chunks are written, merged and read
+while holding ``store.lock`` in the store directory, and a process that finds
+that its chunks were merged by another one reloads all chunks.
+
+CommandLine:
+    python -m ibeis.algo.verif.pairfeat_store --allexamples
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import os
+import uuid
+import lockfile
+import numpy as np
+import utool as ut
+import pandas as pd
+from os.path import join, exists, basename
+(print, rrr, profile) = ut.inject2(__name__)
+
+
+CHUNK_EXT = '.pairfeat.npz'
+PAIRFEAT_MAX_CHUNKS = ut.get_argval('--pairfeat-max-chunks', type_=int,
+                                    default=16)
+
+
+def _edge_key(uuid1, uuid2):
+    return uuid1.bytes + uuid2.bytes
+
+
+class PairFeatureStore(ut.NiceRepr):
+    r"""
+    Args:
+        dpath (str): directory of the store (created if it does not exist)
+        cfgstr (str): description of the feature configuration. Written to
+            the store directory for reference only.
+        max_chunks (int): number of chunks that triggers a compaction
+
+    CommandLine:
+        python -m ibeis.algo.verif.pairfeat_store PairFeatureStore
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.algo.verif.pairfeat_store import *  # NOQA
+        >>> dpath = ut.ensure_app_resource_dir('ibeis', 'test_pairfeat_store')
+        >>> ut.delete(dpath)
+        >>> store = PairFeatureStore(dpath, max_chunks=2)
+        >>> uuids = [uuid.UUID(int=i) for i in range(5)]
+        >>> keys = list(ut.itertwo(uuids))
+        >>> X = pd.DataFrame([[1., 3.], [2., 4.]], columns=['b', 'a'])
+        >>> store.add(keys[0:2], X)
+        >>> assert store.missing(keys) == keys[2:4]
+        >>> # Rows are stored in the column order of the first chunk
+        >>> store.add(keys[2:3], pd.DataFrame({'a': [6.], 'b': [5.]}))
+        >>> X2 = store.load(keys[2::-1])
+        >>> assert list(X2.columns) == ['b', 'a']
+        >>> assert X2['b'].tolist() == [5., 2., 1.]
+        >>> # Features with a different set of columns are an error
+        >>> try:
+        >>>     store.add(keys[3:4], pd.DataFrame({'a': [7.], 'c': [8.]}))
+        >>> except ValueError:
+        >>>     pass
+        >>> else:
+        >>>     assert False, 'should have raised'
+        >>> # A third chunk goes over max_chunks and merges all chunks
+        >>> store.add(keys[3:4], pd.DataFrame({'b': [7.], 'a': [8.]}))
+        >>> store = PairFeatureStore(dpath)
+        >>> assert len(store.chunk_fpaths) == 1 and len(store) == 4
+        >>> assert np.all(store.load(keys[2::-1]) == X2)
+        >>> # Chunks merged by another store replace the loaded chunks
+        >>> other = PairFeatureStore(dpath)
+        >>> store.add([(uuids[4], uuids[0])], pd.DataFrame({'b': [9.], 'a': [0.]}))
+        >>> other.reload()
+        >>> other.compact()
+        >>> store.reload()
+        >>> assert len(store.chunk_fpaths) == 1 and len(store) == 5
+        >>> assert np.all(store.load(keys[2::-1]) == X2)
+        >>> ut.delete(dpath)
+    """
+
+    def __init__(store, dpath, cfgstr=None, max_chunks=None):
+        if max_chunks is None:
+            max_chunks = PAIRFEAT_MAX_CHUNKS
+        store.dpath = dpath
+        store.max_chunks = max_chunks
+        store.lock_fpath = join(dpath, 'store.lock')
+        ut.ensuredir(dpath)
+        if cfgstr is not None:
+            cfg_fpath = join(dpath, 'cfgstr.txt')
+            if not exists(cfg_fpath):
+                ut.writeto(cfg_fpath, cfgstr, verbose=False)
+        store._reset()
+        store.reload()
+
+    def __nice__(store):
+        return 'nEdges=%d, nChunks=%d' % (len(store), len(store._chunks))
+
+    def __len__(store):
+        return len(store._key_to_loc)
+
+    def __contains__(store, key):
+        return _edge_key(*key) in store._key_to_loc
+
+    def _lock(store):
+        ut.ensuredir(store.dpath)
+        return lockfile.LockFile(store.lock_fpath)
+
+    def _reset(store):
+        # Maps the key of each stored edge to its chunk index and row
+        store._key_to_loc = {}
+        store._chunks = []
+        store._columns = None
+        store.chunk_fpaths = []
+
+    def reload(store):
+        """ reads chunks written since the last reload (possibly by others) """
+        with store._lock():
+            store._reload()
+
+    def _reload(store):
+        """ must be called with the lock held """
+        fnames = sorted(fname for fname in os.listdir(store.dpath)
+                        if fname.endswith(CHUNK_EXT))
+        known = set(map(basename, store.chunk_fpaths))
+        if not known.issubset(fnames):
+            # Another process merged chunks that are loaded here
+            store._reset()
+            known = set()
+        for fname in fnames:
+            if fname not in known:
+                store._load_chunk(join(store.dpath, fname))
+
+    def _load_chunk(store, fpath):
+        with np.load(fpath, allow_pickle=False) as data:
+            chunk = {
+                'uuid_pairs': data['uuid_pairs'],
+                'columns': data['columns'].tolist(),
+                'values': data['values'],
+            }
+        if store._columns is None:
+            store._columns = chunk['columns']
+        elif chunk['columns'] != store._columns:
+            raise ValueError('chunk %r has columns %r, but the store has %r' % (
+                fpath, chunk['columns'], store._columns))
+        chunkx = len(store._chunks)
+        store._chunks.append(chunk)
+        store.chunk_fpaths.append(fpath)
+        key_iter = (row.tobytes() for row in chunk['uuid_pairs'])
+        # Later chunks win if an edge was stored twice
+        store._key_to_loc.update(
+            (key, (chunkx, rowx)) for rowx, key in enumerate(key_iter))
+
+    def missing(store, keys):
+        """
+        Args:
+            keys (list): (uuid1, uuid2) tuples
+
+        Returns:
+            list: the keys that have not been stored
+        """
+        return [key for key in keys if _edge_key(*key) not in store._key_to_loc]
+
+    @property
+    def columns(store):
+        """ the feature dimensions in stored order """
+        return [] if store._columns is None else list(store._columns)
+
+    def load(store, keys, columns=None):
+        """
+        Args:
+            keys (list): (uuid1, uuid2) tuples. All must be stored.
+            columns (list): dimensions to load (default = all stored dims)
+
+        Returns:
+            pd.DataFrame: feature rows in the order of keys with a default
+                integer index
+        """
+        if columns is None:
+            columns = store.columns
+        locs = [store._key_to_loc[_edge_key(*key)] for key in keys]
+        values = np.empty((len(columns), len(locs)), dtype=np.float64)
+        colxs = ut.take(ut.make_index_lookup(store.columns), columns)
+        chunkxs = np.array([loc[0] for loc in locs], dtype=np.int64)
+        rowxs = np.array([loc[1] for loc in locs], dtype=np.int64)
+        for chunkx in np.unique(chunkxs):
+            chunk = store._chunks[chunkx]
+            outxs = np.where(chunkxs == chunkx)[0]
+            chunk_rowxs = rowxs[outxs]
+            for outcolx, colx in enumerate(colxs):
+                values[outcolx, outxs] = chunk['values'][colx].take(chunk_rowxs)
+        # values.T is fortran ordered, so pandas keeps it as its block
+        X = pd.DataFrame(values.T, columns=columns)
+        return X
+
+    def add(store, keys, X):
+        """
+        Appends a chunk with the feature rows of X and compacts the store if
+        it has too many chunks.
+
+        Args:
+            keys (list): (uuid1, uuid2) tuples, one per row of X
+            X (pd.DataFrame): numeric feature rows. Must have the same
+                columns as the rows already stored (in any order).
+        """
+        assert len(keys) == len(X), 'need a key per row'
+        if len(keys) == 0:
+            return
+        with store._lock():
+            store._reload()
+            store._add(keys, X)
+
+    def _add(store, keys, X):
+        columns = [str(col) for col in X.columns]
+        if store._columns is not None and columns != store._columns:
+            if sorted(columns) != sorted(store._columns):
+                raise ValueError('cannot add columns %r to a store with %r' % (
+                    columns, store._columns))
+            col_lookup = dict(zip(columns, X.columns))
+            X = X[ut.take(col_lookup, store._columns)]
+            columns = store.columns
+        uuid_pairs = np.frombuffer(
+            b''.join(_edge_key(*key) for key in keys), dtype=np.uint8)
+        uuid_pairs = uuid_pairs.reshape(len(keys), 32)
+        values = np.ascontiguousarray(X.values.astype(np.float64).T)
+        store._write_chunk(uuid_pairs, columns, values)
+        if len(store._chunks) > store.max_chunks:
+            store._compact()
+
+    def _write_chunk(store, uuid_pairs, columns, values):
+        fname = uuid.uuid4().hex + CHUNK_EXT
+        fpath = join(store.dpath, fname)
+        # Write to a temporary file so readers never see partial chunks
+        tmp_fpath = fpath + '.tmp'
+        with open(tmp_fpath, 'wb') as file_:
+            np.savez(file_, uuid_pairs=uuid_pairs, values=values,
+                     columns=np.array(columns))
+        os.rename(tmp_fpath, fpath)
+        store._load_chunk(fpath)
+
+    def compact(store):
+        """ merges all chunks into a single chunk """
+        with store._lock():
+            store._reload()
+            store._compact()
+
+    def _compact(store):
+        if len(store._chunks) < 2:
+            return
+        old_fpaths = list(store.chunk_fpaths)
+        key_list = list(store._key_to_loc.keys())
+        keys = [(uuid.UUID(bytes=key[:16]), uuid.UUID(bytes=key[16:]))
+                for key in key_list]
+        X = store.load(keys)
+        columns = store.columns
+        store._reset()
+        uuid_pairs = np.frombuffer(b''.join(key_list), dtype=np.uint8)
+        uuid_pairs = uuid_pairs.reshape(len(key_list), 32)
+        values = np.ascontiguousarray(X.values.T)
+        store._write_chunk(uuid_pairs, columns, values)
+        for fpath in old_fpaths:
+            ut.delete(fpath, verbose=False)
+
+
+if __name__ == '__main__':
+    r"""
+    CommandLine:
+        python -m ibeis.algo.verif.pairfeat_store
+        python -m ibeis.algo.verif.pairfeat_store --allexamples
+    """
+    import multiprocessing
+    multiprocessing.freeze_support()  # for win32
+    import utool as ut  # NOQA
+    ut.doctest_funcs()
@@ -45,7 +45,7 @@ from os.path import join, split
 from ibeis.init import sysres
 from ibeis.dbio import ingest_hsdb
 from ibeis import constants as const
-from ibeis.control import accessor_decors, controller_inject
+from ibeis.control import accessor_decors, controller_inject, feat_store
 # Inject utool functions
 (print, rrr, profile) = ut.inject2(__name__)
 
@@ -311,6 +311,12 @@ class IBEISController(BASE_CLASS):
         # by default use serial because warpAffine is weird with multiproc
         ibs._parallel_chips = False
 
+        # Read kpts and vecs from memory-mapped feature stores (--feat-store)
+        ibs._use_feat_store = feat_store.FEAT_STORE
+        ibs._feat_stores = {}
+        # Open per-edge pairwise feature stores keyed by directory
+        ibs._pairfeat_stores = {}
+
         ibs.containerized = ut.get_argflag('--containerized')
         if ibs.containerized:
             print('[ibs.__init__] CONTAINERIZED: True\n')
@@ -389,14 +395,10 @@ class IBEISController(BASE_CLASS):
         """
         Returns info about the underlying SQL cache memory
         """
-        total_size_str = ut.get_object_size_str(ibs.table_cache,
-                                                lbl='size(table_cache): ')
         total_size_str = '\nlen(table_cache) = %r' % (len(ibs.table_cache))
-        table_size_str_list = [
-            ut.get_object_size_str(val, lbl='size(table_cache[%s]): ' % (key,))
-            for key, val in six.iteritems(ibs.table_cache)]
+        stats_str = ibs.table_cache.get_stats_str()
         cachestats_str = (
-            total_size_str + ut.indentjoin(table_size_str_list, '\n  * '))
+            total_size_str + ut.indentjoin(stats_str.split('\n'), '\n  * '))
         return cachestats_str
 
     def print_cachestats_str(ibs):
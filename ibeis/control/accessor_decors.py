@@ -4,6 +4,7 @@ import six
 import utool as ut
 from six.moves import builtins
 from utool._internal.meta_util_six import get_funcname
+from ibeis.control import table_cache
 print, rrr, profile = ut.inject2(__name__)
 
 DEBUG_ADDERS = False
@@ -66,7 +67,7 @@ def default_decorator(input_):
 def init_tablecache():
     r"""
     Returns:
-       defaultdict: tablecache
+       TableCache: tablecache
 
     CommandLine:
         python -m ibeis.control.accessor_decors --test-init_tablecache
@@ -79,7 +80,7 @@ def init_tablecache():
     """
     # 4 levels of dictionaries
     # tablename, colname, kwargs, and then rowids
-    tablecache = ut.ddict(lambda: ut.ddict(lambda: ut.ddict(dict)))
+    tablecache = table_cache.TableCache()
     return tablecache
 
 
@@ -176,7 +177,7 @@ def cache_getter(tblname, colname=None, cfgkeys=None, force=False, debug=False):
             cached_rowid_list = ut.filterfalse_items(rowid_list, ismiss_list)
             cache_ = ibs.table_cache[tblname][colname][kwargs_hash]
             # Load cached values for each rowid
-            cache_vals_list = ut.dict_take_list(cache_, cached_rowid_list, None)
+            cache_vals_list = [cache_.get(rowid, None) for rowid in cached_rowid_list]
             db_vals_list = getter_func(ibs, cached_rowid_list, **kwargs)
             # Assert everything is valid
             msg_fmt = ut.codeblock(
@@ -266,12 +267,12 @@ def cache_getter(tblname, colname=None, cfgkeys=None, force=False, debug=False):
                 for index, val in zip(miss_indices, miss_vals):
                     vals_list[index] = val  # Output write
                 # cache save
-                for rowid, val in zip(miss_rowids, miss_vals):
-                    cache_[rowid] = val     # Cache write
+                cache_.update_rows(miss_rowids, miss_vals)
 
             def wrp_getter_cacher(ibs, rowid_list, **kwargs):
                 """
-                Wrapper function that caches rowid values in a dictionary
+                Wrapper function that caches rowid values in a memory bounded
+                table_cache.RowCache
                 """
                 kwargs.pop('debug', False)
                 kwargs_hash = (
@@ -281,11 +282,8 @@ def cache_getter(tblname, colname=None, cfgkeys=None, force=False, debug=False):
                 # There are 3 levels of caches
                 # All caches for this table, caches for the this column, and caches for this kwargs configuration
                 cache_ = ibs.table_cache[tblname][colname][kwargs_hash]
-                # Load cached values for each rowid
-                vals_list = [cache_.get(rowid, None) for rowid in rowid_list]
-                # Mark rowids with cache misses
-                ismiss_list = [val is None for val in vals_list]
-                # END HACK
+                # Load cached values for each rowid and mark cache misses
+                vals_list, ismiss_list = cache_.take(rowid_list)
                 if any(ismiss_list):
                     handle_cache_misses(ibs, getter_func, rowid_list, ismiss_list, vals_list, cache_, kwargs)
                 return vals_list
@@ -342,7 +340,7 @@ def cache_invalidator(tblname, colnames=None, rowidx=None, force=False):
                     # We know the rowids to delete
                     # iterate over all getter kwargs values
                     for cache_ in six.itervalues(kwargs_cache_):
-                        ut.delete_dict_keys(cache_, rowid_list)
+                        cache_.delete_rows(rowid_list)
 
             # Preform set/delete action
             if DEBUG_API_CACHE:
@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+"""
+Memory-mapped store of the keypoints and descriptors of the feat table.
+
+The feat table keeps the kpts and vecs of every row as an individually
+pickled sqlite blob. A FeatStore holds the same columns for a single feat
+config (including its chip config) in contiguous append-only files:
+
+    kpts.<gen>.bin - (N, 6) keypoint rows of all annotations
+    vecs.<gen>.bin - (N, 128) descriptor rows of all annotations
+    index.npz      - visual uuid bytes, first row and number of rows of each
+                     annotation, the dtype and width of each column, and the
+                     generation of the column files
+    store.lock     - held while the files above are changed
+
+Rows are only ever appended to the column files of a generation. ``compact``
+writes the next generation and then swaps the index, so existing views are
+never truncated. The previous generation is deleted by the following
+``compact``.
+
+Annotations without features are stored as zero rows. Until the store has
+seen a column it only records their keys.
+
+The bin files are memory mapped, so rows are read without unpickling, and
+the rows of many annotations are stacked with a single gather (see
+FeatRows). ``take`` and ``gather`` return read-only views unless a copy is
+requested. Callers that modify rows in place must ask for copies.
+
+Annotations are keyed by visual uuid, which changes whenever the chip of an
+annotation would change. Several processes may share one store. Every change
+happens under the lock, starting from the index on disk, so appends from
+different processes cannot overwrite each other.
+
+CommandLine:
+    python -m ibeis.control.feat_store --allexamples
+"""
+from __future__ import absolute_import, division, print_function
+import os
+import lockfile
+import numpy as np
+import utool as ut
+from os.path import join, exists
+print, rrr, profile = ut.inject2(__name__)
+
+
+# Read feature columns through a FeatStore instead of the sqlite blobs
+FEAT_STORE = ut.get_argflag('--feat-store')
+
+INDEX_FNAME = 'index.npz'
+
+
+class FeatRows(list):
+    """
+    Per-annotation rows of a store column. Behaves like a list of arrays, and
+    ``stack`` returns the rows of all annotations with a single gather
+    instead of a vstack over the list.
+
+    Args:
+        column (ndarray): the memory-mapped column
+        rowxs_list (list): the store rows of each annotation
+        copy (bool): if True each item is a writable copy instead of a
+            read-only view (default = False)
+    """
+
+    def __init__(self, column, rowxs_list, copy=False):
+        self.column = column
+        self.rowxs_list = rowxs_list
+        rows_list = [_take_rows(column, rowxs) for rowxs in rowxs_list]
+        if copy:
+            rows_list = [rows if rows.flags.owndata else rows.copy()
+                         for rows in rows_list]
+        list.__init__(self, rows_list)
+
+    def stack(self):
+        if len(self.rowxs_list) == 0:
+            return self.column[0:0].copy()
+        rowxs = np.hstack(self.rowxs_list)
+        if len(rowxs) > 0 and np.all(np.diff(rowxs) == 1):
+            # Annots appended together are copied as one block
+            return self.column[rowxs[0]:rowxs[-1] + 1].copy()
+        return self.column.take(rowxs, axis=0)
+
+
+def _take_rows(column, rowxs):
+    """ a view if the rows are contiguous, otherwise a copy """
+    if len(rowxs) == 0:
+        return column[0:0]
+    start = rowxs[0]
+    if rowxs[-1] - start + 1 == len(rowxs) and np.all(np.diff(rowxs) == 1):
+        return column[start:start + len(rowxs)]
+    return column.take(rowxs, axis=0)
+
+
+class FeatStore(ut.NiceRepr):
+    r"""
+    Args:
+        dpath (str): directory of the store (created if it does not exist)
+        cfgstr (str): description of the feature configuration. Written to
+            the store directory for reference only.
+
+    CommandLine:
+        python -m ibeis.control.feat_store FeatStore
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.control.feat_store import *  # NOQA
+        >>> import uuid
+        >>> import vtool_ibeis as vt
+        >>> dpath = ut.ensure_app_resource_dir('ibeis', 'test_feat_store')
+        >>> ut.delete(dpath)
+        >>> store = FeatStore(dpath)
+        >>> rng = np.random.RandomState(0)
+        >>> keys = [uuid.UUID(int=i) for i in range(4)]
+        >>> nfeat_list = [3, 0, 5, 2]
+        >>> kpts_list = [rng.rand(n, 6).astype(np.float32) for n in nfeat_list]
+        >>> vecs_list = [rng.randint(0, 255, (n, 128)).astype(np.uint8) for n in nfeat_list]
+        >>> store.add(keys[0:2], {'kpts': kpts_list[0:2], 'vecs': vecs_list[0:2]})
+        >>> assert store.missing(keys) == [2, 3]
+        >>> store.add(keys[2:4], {'kpts': kpts_list[2:4], 'vecs': vecs_list[2:4]})
+        >>> store = FeatStore(dpath)
+        >>> assert store.missing(keys) == []
+        >>> vecs_views = store.take(keys[::-1], 'vecs')
+        >>> assert all(np.all(v1 == v2) for v1, v2 in zip(vecs_views, vecs_list[::-1]))
+        >>> assert np.shares_memory(vecs_views[0], store.columns['vecs'])
+        >>> fxs_list = [np.arange(3), np.arange(0), np.array([1, 4])]
+        >>> rows = store.gather(keys[0:3], 'vecs', fxs_list)
+        >>> assert np.all(rows.stack() == np.vstack(vt.ziptake(vecs_list[0:3], fxs_list, axis=0)))
+        >>> assert np.all(rows[2] == vecs_list[2][[1, 4]])
+        >>> assert not rows[0].flags.writeable
+        >>> rows = store.gather(keys[0:3], 'vecs', copy=True)
+        >>> rows[0][:] = 0
+        >>> assert np.all(store.take(keys[0:1], 'vecs')[0] == vecs_list[0])
+        >>> # A stale store appends after the rows added by another one
+        >>> new_keys = [uuid.UUID(int=i) for i in range(4, 6)]
+        >>> other = FeatStore(dpath)
+        >>> other.add(new_keys[0:1], {'kpts': kpts_list[0:1], 'vecs': vecs_list[0:1]})
+        >>> store.add(new_keys[1:2], {'kpts': kpts_list[3:4], 'vecs': vecs_list[3:4]})
+        >>> assert store.num_rows == 15
+        >>> assert np.all(store.take(new_keys, 'vecs')[0] == vecs_list[0])
+        >>> store.remove(new_keys)
+        >>> store.remove(keys[0:1])
+        >>> store.compact()
+        >>> store = FeatStore(dpath)
+        >>> assert store.missing(keys) == [0]
+        >>> assert store.num_rows == 7
+        >>> assert np.all(store.take(keys[2:3], 'kpts')[0] == kpts_list[2])
+        >>> ut.delete(dpath)
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.control.feat_store import *  # NOQA
+        >>> import uuid
+        >>> dpath = ut.ensure_app_resource_dir('ibeis', 'test_feat_store_empty')
+        >>> ut.delete(dpath)
+        >>> store = FeatStore(dpath)
+        >>> keys = [uuid.UUID(int=i) for i in range(3)]
+        >>> # The layout is unknown, but the annot without features is recorded
+        >>> store.add(keys[0:1], {'kpts': [np.empty(0)], 'vecs': [np.empty(0)]})
+        >>> assert store.missing(keys) == [1, 2]
+        >>> kpts_list = [np.ones((n, 6), dtype=np.float32) for n in [2, 3]]
+        >>> vecs_list = [np.ones((n, 128), dtype=np.uint8) for n in [2, 3]]
+        >>> store.add(keys[1:3], {'kpts': kpts_list, 'vecs': vecs_list})
+        >>> assert [len(rows) for rows in store.gather(keys, 'vecs')] == [0, 2, 3]
+        >>> # Readers that have not reloaded keep the previous generation
+        >>> stale = FeatStore(dpath)
+        >>> store.remove(keys[1:2])
+        >>> store.compact()
+        >>> assert exists(stale._bin_fpath('vecs'))
+        >>> assert np.all(stale.take(keys[2:3], 'vecs')[0] == vecs_list[1])
+        >>> ut.delete(dpath)
+    """
+
+    def __init__(store, dpath, cfgstr=None):
+        store.dpath = dpath
+        store.lock_fpath = join(dpath, 'store.lock')
+        ut.ensuredir(dpath)
+        if cfgstr is not None:
+            cfg_fpath = join(dpath, 'cfgstr.txt')
+            if not exists(cfg_fpath):
+                ut.writeto(cfg_fpath, cfgstr, verbose=False)
+        store.reload()
+
+    def __nice__(store):
+        return 'nAnnots=%d, nRows=%d' % (len(store), store.num_rows)
+
+    def __len__(store):
+        return len(store._key_to_pos)
+
+    def __contains__(store, key):
+        return key.bytes in store._key_to_pos
+
+    def _lock(store):
+        ut.ensuredir(store.dpath)
+        return lockfile.LockFile(store.lock_fpath)
+
+    def _bin_fpath(store, colname, generation=None):
+        if generation is None:
+            generation = store.generation
+        return join(store.dpath, '%s.%d.bin' % (colname, generation))
+
+    def reload(store):
+        """ reads the index and maps the column files """
+        index_fpath = join(store.dpath, INDEX_FNAME)
+        if exists(index_fpath):
+            with np.load(index_fpath, allow_pickle=False) as data:
+                store._keys = data['keys']
+                store._offsets = data['offsets']
+                store._lens = data['lens']
+                store.num_rows = int(data['num_rows'])
+                store.generation = int(data['generation'])
+                store.colspecs = ut.odict([
+                    (colname, (np.dtype(dtype), int(dim)))
+                    for colname, dtype, dim in zip(
+                        data['colnames'].tolist(), data['dtypes'].tolist(),
+                        data['dims'].tolist())
+                ])
+        else:
+            store._keys = np.zeros((0, 16), dtype=np.uint8)
+            store._offsets = np.zeros(0, dtype=np.int64)
+            store._lens = np.zeros(0, dtype=np.int64)
+            store.num_rows = 0
+            store.generation = 0
+            store.colspecs = ut.odict()
+        store._key_to_pos = {
+            key.tobytes(): pos for pos, key in enumerate(store._keys)}
+        store.columns = ut.odict()
+        for colname, (dtype, dim) in store.colspecs.items():
+            if store.num_rows == 0:
+                store.columns[colname] = np.zeros((0, dim), dtype=dtype)
+            else:
+                # Only the first num_rows rows are valid. A write interrupted
+                # before the index was updated leaves unindexed trailing rows.
+                mmap = np.memmap(store._bin_fpath(colname), dtype=dtype,
+                                 mode='r', shape=(store.num_rows, dim))
+                # Plain ndarray views pickle as regular arrays
+                store.columns[colname] = np.asarray(mmap)
+
+    def missing(store, keys):
+        """
+        Args:
+            keys (list): annotation visual uuids
+
+        Returns:
+            list: indices of the keys that are not stored
+        """
+        key_to_pos = store._key_to_pos
+        return [idx for idx, key in enumerate(keys)
+                if key.bytes not in key_to_pos]
+
+    def _positions(store, keys):
+        return np.array([store._key_to_pos[key.bytes] for key in keys],
+                        dtype=np.int64)
+
+    def take(store, keys, colname):
+        """
+        Returns:
+            list: a read-only view of the rows of each key
+        """
+        column = store.columns[colname]
+        pos_list = store._positions(keys)
+        starts = store._offsets.take(pos_list)
+        stops = starts + store._lens.take(pos_list)
+        return [column[start:stop] for start, stop in zip(starts, stops)]
+
+    def gather(store, keys, colname, fxs_list=None, copy=False):
+        """
+        Args:
+            keys (list): annotation visual uuids
+            colname (str): kpts or vecs
+            fxs_list (list): feature indices to take from each annotation
+                (default = all features)
+            copy (bool): return writable copies instead of read-only views
+                (default = False)
+
+        Returns:
+            FeatRows: the selected rows of each key
+        """
+        pos_list = store._positions(keys)
+        starts = store._offsets.take(pos_list)
+        if fxs_list is None:
+            lens = store._lens.take(pos_list)
+            rowxs_list = [np.arange(start, start + n)
+                          for start, n in zip(starts, lens)]
+        else:
+            rowxs_list = [start + np.asarray(fxs, dtype=np.int64)
+                          for start, fxs in zip(starts, fxs_list)]
+        return FeatRows(store.columns[colname], rowxs_list, copy=copy)
+
+    def add(store, keys, data):
+        """
+        Appends the rows of new annotations. Keys that are already stored are
+        ignored.
+
+        Args:
+            keys (list): annotation visual uuids
+            data (dict): maps each column name to a list with an array per
+                key. Every column must have the same number of rows per key.
+        """
+        with store._lock():
+            # Rows may have been appended by another process
+            store.reload()
+            store._add(keys, data)
+
+    def _add(store, keys, data):
+        colnames = list(data.keys())
+        if len(store.colspecs) > 0:
+            assert set(colnames) == set(store.colspecs.keys()), (
+                'columns must match the stored columns')
+        seen = set()
+        flags = []
+        for key in keys:
+            flag = key.bytes not in store._key_to_pos and key.bytes not in seen
+            seen.add(key.bytes)
+            flags.append(flag)
+        keys = ut.compress(keys, flags)
+        if len(keys) == 0:
+            return
+        data = {colname: ut.compress(arrs, flags)
+                for colname, arrs in data.items()}
+        lens = np.array([len(arr) for arr in data[colnames[0]]],
+                        dtype=np.int64)
+        for colname in colnames:
+            assert [len(arr) for arr in data[colname]] == lens.tolist(), (
+                'columns have a different number of rows')
+
+        colspecs = ut.odict(store.colspecs)
+        for colname in colnames:
+            if colname not in colspecs:
+                # Empty 2d arrays also have the dtype and width of a column
+                arrs = ([arr for arr in data[colname] if len(arr) > 0] or
+                        [arr for arr in data[colname] if np.ndim(arr) == 2])
+                if len(arrs) > 0:
+                    colspecs[colname] = (arrs[0].dtype, arrs[0].shape[1])
+        if len(colspecs) < len(colnames):
+            # Nothing to infer the layout from yet. The new annots have no
+            # rows, so only their keys are recorded.
+            assert lens.sum() == 0
+            colspecs = store.colspecs
+            colnames = []
+        for colname in colnames:
+            arrs = [arr for arr in data[colname] if len(arr) > 0]
+            dtype, dim = colspecs[colname]
+            rowbytes = dtype.itemsize * dim
+            # Overwrite any unindexed rows of an interrupted write
+            mode = 'r+b' if exists(store._bin_fpath(colname)) else 'wb'
+            with open(store._bin_fpath(colname), mode) as file_:
+                file_.seek(store.num_rows * rowbytes)
+                for arr in arrs:
+                    arr = np.ascontiguousarray(arr, dtype=dtype)
+                    assert arr.shape[1] == dim, 'bad %s width' % (colname,)
+                    file_.write(arr.tobytes())
+                file_.truncate()
+
+        new_offsets = store.num_rows + np.hstack([[0], np.cumsum(lens)[:-1]])
+        keys_arr = np.frombuffer(b''.join(key.bytes for key in keys),
+                                 dtype=np.uint8).reshape(len(keys), 16)
+        store._write_index(
+            np.vstack([store._keys, keys_arr]),
+            np.hstack([store._offsets, new_offsets]).astype(np.int64),
+            np.hstack([store._lens, lens]).astype(np.int64),
+            store.num_rows + int(lens.sum()), colspecs, store.generation)
+        store.reload()
+
+    def _write_index(store, keys, offsets, lens, num_rows, colspecs,
+                     generation):
+        index_fpath = join(store.dpath, INDEX_FNAME)
+        # Write to a temporary file so readers never see a partial index
+        tmp_fpath = index_fpath + '.tmp'
+        with open(tmp_fpath, 'wb') as file_:
+            np.savez(file_, keys=keys, offsets=offsets, lens=lens,
+                     num_rows=np.array(num_rows),
+                     generation=np.array(generation),
+                     colnames=np.array(list(colspecs.keys())),
+                     dtypes=np.array([dtype.str for dtype, _ in
+                                      colspecs.values()]),
+                     dims=np.array([dim for _, dim in colspecs.values()]))
+        os.rename(tmp_fpath, index_fpath)
+
+    def remove(store, keys):
+        """ removes keys from the index. Their rows are reclaimed by compact """
+        with store._lock():
+            store.reload()
+            store._remove(keys)
+
+    def _remove(store, keys):
+        flags = np.ones(len(store._keys), dtype=np.bool_)
+        for key in keys:
+            pos = store._key_to_pos.get(key.bytes, None)
+            if pos is not None:
+                flags[pos] = False
+        if np.all(flags):
+            return
+        store._write_index(store._keys[flags], store._offsets[flags],
+                           store._lens[flags], store.num_rows, store.colspecs,
+                           store.generation)
+        store.reload()
+
+    def compact(store):
+        """ rewrites the column files without the rows of removed keys """
+        with store._lock():
+            store.reload()
+            store._compact()
+
+    def _compact(store):
+        if store.num_rows == int(store._lens.sum()):
+            return
+        old_generation = store.generation
+        new_generation = old_generation + 1
+        lens = store._lens
+        new_offsets = np.hstack([[0], np.cumsum(lens)[:-1]]).astype(np.int64)
+        rowxs = np.hstack([np.arange(start, start + n) for start, n in
+                           zip(store._offsets, lens)] + [[]]).astype(np.int64)
+        for colname in store.colspecs.keys():
+            column = store.columns[colname]
+            with open(store._bin_fpath(colname, new_generation), 'wb') as file_:
+                for chunk in ut.ichunks(rowxs, 2 ** 16):
+                    file_.write(column.take(chunk, axis=0).tobytes())
+        store._write_index(store._keys, new_offsets, lens, int(lens.sum()),
+                           store.colspecs, new_generation)
+        store.reload()
+        # Processes that have not reloaded yet still read the old generation,
+        # so it is kept until the next compact
+        for colname in store.colspecs.keys():
+            ut.delete(store._bin_fpath(colname, old_generation - 1),
+                      verbose=False)
+
+
+if __name__ == '__main__':
+    r"""
+    CommandLine:
+        python -m ibeis.control.feat_store
+        python -m ibeis.control.feat_store --allexamples
+    """
+    import multiprocessing
+    multiprocessing.freeze_support()  # for win32
+    import utool as ut  # NOQA
+    ut.doctest_funcs()
@@ -1136,7 +1136,7 @@ def get_annot_exemplar_flags(ibs, aid_list):
 @register_ibs_method
 @ut.accepts_numpy
 @accessor_decors.getter_1to1
-#@cache_getter(const.ANNOTATION_TABLE, 'image_rowid')
+@accessor_decors.cache_getter(const.ANNOTATION_TABLE, IMAGE_ROWID)
 @register_api('/api/annot/image/rowid/', methods=['GET'])
 def get_annot_gids(ibs, aid_list, assume_unique=False):
     r"""
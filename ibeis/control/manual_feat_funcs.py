@@ -8,6 +8,7 @@ from __future__ import absolute_import, division, print_function
 import six  # NOQA
 from ibeis.control.accessor_decors import (getter_1to1, getter_1toM, deleter)
 import utool as ut
+from os.path import join
 from ibeis.control import controller_inject
 print, rrr, profile = ut.inject2(__name__)
 
@@ -58,6 +59,9 @@ def delete_annot_feats(ibs, aid_list, config2_=None):
     """
     if ut.VERBOSE:
         print('[ibs] deleting %d annots leaf nodes' % len(aid_list))
+    if ibs._use_feat_store:
+        vuuid_list = ibs.get_annot_visual_uuids(aid_list)
+        ibs.get_feat_store(config2_=config2_).remove(vuuid_list)
     return ibs.depc_annot.delete_property('feat', aid_list, config=config2_)
 
 
@@ -151,6 +155,10 @@ def get_annot_kpts(ibs, aid_list, ensure=True, eager=True, nInput=None,
         >>> ibeis.viz.interact.interact_chip.ishow_chip(ibs, aid_list[0], config2_=qreq2_.extern_query_config2, ori=True, fnum=2)
         >>> ut.show_if_requested()
     """
+    if ibs._use_feat_store and ensure:
+        # Callers may modify the keypoints in place
+        return ibs.get_annot_feat_store_rows(aid_list, 'kpts', copy=True,
+                                             config2_=config2_)
     return ibs.depc_annot.get('feat', aid_list, 'kpts', config=config2_,
                                ensure=ensure, eager=eager)
 
@@ -163,10 +171,70 @@ def get_annot_vecs(ibs, aid_list, ensure=True, eager=True, nInput=None,
     Returns:
         vecs_list (list): annotation descriptor vectors
     """
+    if ibs._use_feat_store and ensure:
+        return ibs.get_annot_feat_store_rows(aid_list, 'vecs', copy=True,
+                                             config2_=config2_)
     return ibs.depc_annot.get('feat', aid_list, 'vecs', config=config2_,
                                ensure=ensure, eager=eager)
 
 
+@register_ibs_method
+def get_feat_store(ibs, config2_=None):
+    """
+    Returns:
+        FeatStore: the memory-mapped kpts and vecs of a feat config
+    """
+    from ibeis.control import feat_store
+    cfgstr = ibs.depc_annot.get_config_trail_str('feat', config2_)
+    store = ibs._feat_stores.get(cfgstr, None)
+    if store is None:
+        dpath = join(ibs.get_cachedir(), 'feat_store', ut.hashstr27(cfgstr))
+        store = feat_store.FeatStore(dpath, cfgstr=cfgstr)
+        ibs._feat_stores[cfgstr] = store
+    return store
+
+
+@register_ibs_method
+def get_annot_feat_store_rows(ibs, aid_list, colname, fxs_list=None,
+                              copy=False, config2_=None):
+    """
+    Reads a feature column through the feat store. Features of annotations
+    that are not stored yet are read from the feat table and appended.
+
+    Args:
+        aid_list (list):  list of annotation ids
+        colname (str): kpts or vecs
+        fxs_list (list): feature indices to take from each annotation
+            (default = all features)
+        copy (bool): return writable copies instead of read-only views. Must
+            be set by callers that modify the features in place.
+            (default = False)
+
+    Returns:
+        FeatRows: the features of each annotation. ``stack`` gathers all of
+            them into one array.
+    """
+    store = ibs.get_feat_store(config2_=config2_)
+    vuuid_list = ibs.get_annot_visual_uuids(aid_list)
+    missing_idxs = store.missing(vuuid_list)
+    if len(missing_idxs) > 0:
+        missing_aids = ut.take(aid_list, missing_idxs)
+        feat_list = ibs.depc_annot.get('feat', missing_aids, ('kpts', 'vecs'),
+                                       config=config2_)
+        store.add(ut.take(vuuid_list, missing_idxs),
+                  {'kpts': ut.take_column(feat_list, 0),
+                   'vecs': ut.take_column(feat_list, 1)})
+    if colname not in store.colspecs:
+        # The store cannot infer its layout from annots without features
+        data_list = ibs.depc_annot.get('feat', aid_list, colname,
+                                       config=config2_)
+        if fxs_list is not None:
+            data_list = [data.take(fxs, axis=0)
+                         for data, fxs in zip(data_list, fxs_list)]
+        return data_list
+    return store.gather(vuuid_list, colname, fxs_list, copy=copy)
+
+
 @register_ibs_method
 @getter_1to1
 def get_annot_num_feats(ibs, aid_list, ensure=True, eager=True, nInput=None,
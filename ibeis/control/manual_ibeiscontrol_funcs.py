@@ -33,6 +33,27 @@ def new_query_request(ibs, qaid_list, daid_list, cfgdict=None,
     return qreq_
 
 
+@register_ibs_method
+def new_query_engine(ibs, daid_list, cfgdict=None, verbose=ut.NOT_QUIET,
+                     **kwargs):
+    """
+    alias for ibeis.algo.hots.query_engine.QueryEngine
+
+    Args:
+        daid_list (list):
+        cfgdict (None):
+        verbose (bool):
+
+    Returns:
+        ibeis.algo.hots.query_engine.QueryEngine: engine - reusable query
+            request for a fixed set of database annotations
+    """
+    from ibeis.algo.hots import query_engine
+    engine = query_engine.QueryEngine(ibs, daid_list, cfgdict=cfgdict,
+                                      verbose=verbose, **kwargs)
+    return engine
+
+
 @register_ibs_method
 def get_annot_kpts_distinctiveness(ibs, aid_list, config2_=None, **kwargs):
     """
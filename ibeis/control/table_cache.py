@@ -0,0 +1,570 @@
+# -*- coding: utf-8 -*-
+"""
+Memory bounded cache behind accessor_decors.cache_getter.
+
+The cache is a nest of dictionaries:
+    ibs.table_cache[tblname][colname][kwargs_hash] -> RowCache
+
+A RowCache maps rowids to getter values. All RowCaches of a table share one
+memory budget. When the budget is exceeded, entries are evicted from the
+least recently used RowCache first, and within a RowCache in least recently
+used order.
+
+A RowCache whose rowids are integers and whose values are all python ints
+(or all python floats) stores them in sorted numpy arrays. Lookups then use
+a vectorized membership test and gather instead of a python loop over the
+rows. New rowids are buffered in a small append log that is merged into the
+sorted arrays once it fills up, so single-row writes stay cheap. Any other
+value switches the RowCache to an ordered dict.
+
+Evictions free a tenth of the table budget beyond the overflow, so a table
+at its budget does not evict on every write.
+
+CommandLine:
+    python -m ibeis.control.table_cache --allexamples
+"""
+from __future__ import absolute_import, division, print_function
+import sys
+import six
+import numpy as np
+import utool as ut
+from collections import OrderedDict
+print, rrr, profile = ut.inject2(__name__)
+
+
+# Default memory budget of each table in megabytes
+TABLE_CACHE_MB = ut.get_argval('--table-cache-mb', type_=float, default=256)
+
+# Approximate bytes a dict entry costs in addition to its value
+_ENTRY_OVERHEAD = 100
+# Bytes per entry of the numpy backend (key, value and lru stamp)
+_NUMPY_ENTRY_NBYTES = 24
+# New rowids of the numpy backend buffered before a merge
+_LOG_MAX = 4096
+# Fraction of the budget an eviction frees in addition to the overflow
+EVICT_FRACTION = .1
+
+
+def _sizeof(val):
+    """ approximate memory used by a cached value """
+    if isinstance(val, np.ndarray):
+        return val.nbytes + 96
+    nbytes = sys.getsizeof(val)
+    if isinstance(val, (list, tuple)):
+        nbytes += sum(_sizeof(item) for item in val)
+    return nbytes
+
+
+def _numpy_dtype(vals):
+    """ the numpy backend dtype for vals or None if they do not fit one """
+    types = set(map(type, vals))
+    if types and types.issubset(set(six.integer_types)):
+        return np.int64
+    if types == {float}:
+        return np.float64
+    return None
+
+
+def _as_rowid_array(rowid_list):
+    """ rowids as an int64 array or None if some rowids are not integers """
+    arr = np.asarray(rowid_list)
+    if len(arr) == 0:
+        return np.empty(0, dtype=np.int64)
+    if arr.ndim != 1 or arr.dtype.kind not in 'iu':
+        return None
+    return arr.astype(np.int64)
+
+
+class RowCache(ut.NiceRepr):
+    r"""
+    Cached values of a single column (and getter config) keyed by rowid.
+    Values of None are never stored because cache_getter treats them as
+    misses.
+
+    Args:
+        table (TableColumnCache): the caches of the table (owns the budget)
+
+    CommandLine:
+        python -m ibeis.control.table_cache RowCache
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.control.table_cache import *  # NOQA
+        >>> # Room for four integer entries
+        >>> table_cache = TableCache(max_bytes=24 * 4)
+        >>> cache = table_cache['annotations']['image_rowid'][None]
+        >>> cache.update_rows([1, 2, 3], [10, 20, 30])
+        >>> assert cache.mode == 'numpy'
+        >>> vals, ismiss = cache.take([3, 4, None, 1])
+        >>> assert vals == [30, None, None, 10]
+        >>> assert ismiss == [False, True, True, False]
+        >>> assert (cache.hits, cache.misses) == (2, 2)
+        >>> cache.update_rows([3], [31])
+        >>> # Exceeding the budget evicts the least recently used rowids
+        >>> cache.update_rows([4, 5], [40, 50])
+        >>> assert sorted(cache.keys()) == [3, 4, 5]
+        >>> assert cache.take([3, 5])[0] == [31, 50]
+        >>> cache.delete_rows([3])
+        >>> table_cache.set_budget('annotations', 10000)
+        >>> cache.update_rows([6], ['sixty'])
+        >>> assert cache.mode == 'object'
+        >>> assert cache.take([4, 6])[0] == [40, 'sixty']
+        >>> assert table_cache.get_stats()[('annotations', 'image_rowid')]['hits'] == 6
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> # Writes go through the append log and match a dict
+        >>> from ibeis.control.table_cache import *  # NOQA
+        >>> cache = RowCache()
+        >>> rng = np.random.RandomState(0)
+        >>> expected = {}
+        >>> for _ in range(100):
+        >>>     rowids = rng.randint(0, 20000, rng.randint(1, 200)).tolist()
+        >>>     vals = rng.randint(0, 10 ** 6, len(rowids)).tolist()
+        >>>     cache.update_rows(rowids, vals)
+        >>>     expected.update(zip(rowids, vals))
+        >>>     removed = rng.randint(0, 20000, 10).tolist()
+        >>>     cache.delete_rows(removed)
+        >>>     ut.delete_dict_keys(expected, removed)
+        >>> assert len(cache._log) > 0 and len(cache._keys) > 0
+        >>> assert len(cache) == len(expected)
+        >>> query = rng.randint(0, 20000, 5000).tolist()
+        >>> assert cache.take(query)[0] == [expected.get(r) for r in query]
+        >>> assert dict(cache.items()) == expected
+    """
+
+    def __init__(cache, table=None):
+        cache.table = table
+        cache.hits = 0
+        cache.misses = 0
+        cache.evictions = 0
+        cache.last_used = 0
+        cache.mode = None
+        cache._init_storage()
+
+    def _init_storage(cache):
+        # numpy backend
+        cache._keys = None
+        cache._vals = None
+        cache._stamps = None
+        # new rowids of the numpy backend: rowid -> (val, stamp)
+        cache._log = {}
+        # object backend
+        cache._odict = OrderedDict()
+        cache._sizes = {}
+        cache._obj_nbytes = 0
+
+    def __nice__(cache):
+        return 'mode=%s, n=%d, nbytes=%s' % (cache.mode, len(cache),
+                                              ut.byte_str2(cache.nbytes))
+
+    @property
+    def nbytes(cache):
+        if cache.mode == 'numpy':
+            return len(cache) * _NUMPY_ENTRY_NBYTES
+        return cache._obj_nbytes
+
+    def _tick(cache):
+        if cache.table is None:
+            cache.last_used += 1
+        else:
+            cache.last_used = cache.table._next_tick()
+        return cache.last_used
+
+    def __len__(cache):
+        if cache.mode == 'numpy':
+            # log rowids are never in the sorted keys
+            return len(cache._keys) + len(cache._log)
+        return len(cache._odict)
+
+    def _numpy_lookup(cache, rowids):
+        """ positions of rowids in the sorted keys and a found flag """
+        keys = cache._keys
+        if len(keys) == 0:
+            return (np.zeros(len(rowids), dtype=np.int64),
+                    np.zeros(len(rowids), dtype=np.bool_))
+        first = keys[0]
+        if keys[-1] - first + 1 == len(keys):
+            # Contiguous rowids (the usual case) are found by their offset
+            pos = rowids - first
+            found = (pos >= 0) & (pos < len(keys))
+            pos[~found] = 0
+            return pos, found
+        # Sorted needles make the binary searches cache friendly
+        sortx = rowids.argsort()
+        pos = np.empty(len(rowids), dtype=np.int64)
+        pos[sortx] = np.searchsorted(keys, rowids.take(sortx))
+        pos[pos >= len(keys)] = 0
+        found = keys.take(pos) == rowids
+        return pos, found
+
+    def take(cache, rowid_list):
+        """
+        Returns:
+            tuple: (vals_list, ismiss_list) where missing values are None
+        """
+        tick = cache._tick()
+        if cache.mode == 'numpy' and len(cache) > 0:
+            rowids = _as_rowid_array(rowid_list)
+            validxs = None
+            if rowids is None:
+                # Invalid rowids (e.g. None) are always misses
+                validxs = [x for x, rowid in enumerate(rowid_list)
+                           if isinstance(rowid, six.integer_types + (np.integer,))]
+                rowids = np.array(ut.take(rowid_list, validxs), dtype=np.int64)
+            pos, found = cache._numpy_lookup(rowids)
+            if len(cache._keys) > 0:
+                cache._stamps[pos[found]] = tick
+                vals_list = cache._vals.take(pos).tolist()
+            else:
+                vals_list = [None] * len(rowids)
+            log = cache._log
+            for index in np.where(~found)[0]:
+                rowid = rowids[index].item()
+                entry = log.get(rowid, None)
+                if entry is None:
+                    vals_list[index] = None
+                else:
+                    vals_list[index] = entry[0]
+                    log[rowid] = (entry[0], tick)
+                    found[index] = True
+            if validxs is None:
+                ismiss_list = (~found).tolist()
+            else:
+                valid_vals = vals_list
+                vals_list = [None] * len(rowid_list)
+                for x, val in zip(validxs, valid_vals):
+                    vals_list[x] = val
+                ismiss_list = [val is None for val in vals_list]
+        else:
+            vals_list = [cache.get(rowid, None) for rowid in rowid_list]
+            ismiss_list = [val is None for val in vals_list]
+            if cache.mode == 'object':
+                odict = cache._odict
+                for rowid, ismiss in zip(rowid_list, ismiss_list):
+                    if not ismiss:
+                        # mark as most recently used
+                        odict[rowid] = odict.pop(rowid)
+        num_miss = sum(ismiss_list)
+        cache.misses += num_miss
+        cache.hits += len(ismiss_list) - num_miss
+        return vals_list, ismiss_list
+
+    def update_rows(cache, rowid_list, vals_list):
+        """ caches vals_list and evicts entries if the budget is exceeded """
+        items = [(rowid, val) for rowid, val in zip(rowid_list, vals_list)
+                 if val is not None]
+        if len(items) == 0:
+            return
+        rowids, vals = zip(*items)
+        tick = cache._tick()
+        if cache.mode is None:
+            dtype = _numpy_dtype(vals)
+            if dtype is not None and _as_rowid_array(rowids) is not None:
+                cache.mode = 'numpy'
+                cache._keys = np.empty(0, dtype=np.int64)
+                cache._vals = np.empty(0, dtype=dtype)
+                cache._stamps = np.empty(0, dtype=np.int64)
+            else:
+                cache.mode = 'object'
+        if cache.mode == 'numpy':
+            rowid_arr = _as_rowid_array(rowids)
+            dtype = _numpy_dtype(vals)
+            if rowid_arr is None or dtype != cache._vals.dtype:
+                cache._to_object_mode()
+        if cache.mode == 'numpy':
+            cache._numpy_insert(rowid_arr, np.array(vals, dtype=dtype), tick)
+        else:
+            odict = cache._odict
+            sizes = cache._sizes
+            for rowid, val in items:
+                if rowid in odict:
+                    cache._obj_nbytes -= sizes[rowid]
+                    del odict[rowid]
+                size = _sizeof(val) + _ENTRY_OVERHEAD
+                odict[rowid] = val
+                sizes[rowid] = size
+                cache._obj_nbytes += size
+        if cache.table is not None:
+            cache.table.enforce_budget(cache)
+
+    def _numpy_insert(cache, rowids, vals, tick):
+        """
+        Overwrites cached rowids in place and adds new rowids to the log
+        """
+        pos, found = cache._numpy_lookup(rowids)
+        if found.any():
+            cache._vals[pos[found]] = vals[found]
+            cache._stamps[pos[found]] = tick
+            rowids = rowids[~found]
+            vals = vals[~found]
+        log = cache._log
+        log.update(zip(rowids.tolist(), [(val, tick) for val in vals.tolist()]))
+        if len(log) > _LOG_MAX:
+            cache._merge_log()
+
+    def _merge_log(cache):
+        """ moves the log rowids into the sorted arrays """
+        log = cache._log
+        if len(log) == 0:
+            return
+        log_keys = np.fromiter(log.keys(), dtype=np.int64, count=len(log))
+        log_vals, log_stamps = zip(*log.values())
+        sortx = log_keys.argsort()
+        log_keys = log_keys.take(sortx)
+        log_vals = np.array(log_vals, dtype=cache._vals.dtype).take(sortx)
+        log_stamps = np.array(log_stamps, dtype=np.int64).take(sortx)
+        # The log rowids are not in the sorted keys, so a single insert keeps
+        # them sorted and unique
+        inspos = np.searchsorted(cache._keys, log_keys)
+        cache._keys = np.insert(cache._keys, inspos, log_keys)
+        cache._vals = np.insert(cache._vals, inspos, log_vals)
+        cache._stamps = np.insert(cache._stamps, inspos, log_stamps)
+        cache._log = {}
+
+    def _to_object_mode(cache):
+        if cache.mode == 'numpy':
+            cache._merge_log()
+        items = list(cache.items())
+        stamps = [] if cache.mode != 'numpy' else cache._stamps.tolist()
+        cache.mode = 'object'
+        cache._init_storage()
+        # Insert in lru order
+        for _, (rowid, val) in sorted(zip(stamps, items)):
+            size = _sizeof(val) + _ENTRY_OVERHEAD
+            cache._odict[rowid] = val
+            cache._sizes[rowid] = size
+            cache._obj_nbytes += size
+
+    def evict(cache, nbytes):
+        """ evicts least recently used entries until nbytes are freed """
+        if cache.mode == 'numpy':
+            cache._merge_log()
+            num = min(len(cache), int(np.ceil(nbytes / _NUMPY_ENTRY_NBYTES)))
+            if num == 0:
+                return
+            keep = np.ones(len(cache._keys), dtype=np.bool_)
+            if num < len(keep):
+                # The num oldest stamps in linear time
+                keep[np.argpartition(cache._stamps, num - 1)[:num]] = False
+            else:
+                keep[:] = False
+            cache._keys = cache._keys[keep]
+            cache._vals = cache._vals[keep]
+            cache._stamps = cache._stamps[keep]
+            cache.evictions += num
+        else:
+            freed = 0
+            while freed < nbytes and cache._odict:
+                rowid, _ = cache._odict.popitem(last=False)
+                size = cache._sizes.pop(rowid)
+                cache._obj_nbytes -= size
+                freed += size
+                cache.evictions += 1
+
+    def delete_rows(cache, rowid_list):
+        if cache.mode == 'numpy':
+            rowids = _as_rowid_array([rowid for rowid in rowid_list
+                                      if rowid is not None])
+            if rowids is None:
+                cache._to_object_mode()
+            else:
+                for rowid in rowids.tolist():
+                    cache._log.pop(rowid, None)
+                keepx = ~np.in1d(cache._keys, rowids)
+                cache._keys = cache._keys[keepx]
+                cache._vals = cache._vals[keepx]
+                cache._stamps = cache._stamps[keepx]
+                return
+        for rowid in rowid_list:
+            if rowid in cache._odict:
+                del cache._odict[rowid]
+                cache._obj_nbytes -= cache._sizes.pop(rowid)
+
+    def clear(cache):
+        cache.mode = None
+        cache._init_storage()
+
+    # --- dict interface
+
+    def keys(cache):
+        if cache.mode == 'numpy':
+            return cache._keys.tolist() + list(cache._log.keys())
+        return list(cache._odict.keys())
+
+    def items(cache):
+        if cache.mode == 'numpy':
+            return (list(zip(cache._keys.tolist(), cache._vals.tolist())) +
+                    [(rowid, entry[0]) for rowid, entry in cache._log.items()])
+        return list(cache._odict.items())
+
+    def get(cache, rowid, default=None):
+        """ lookup without touching the lru order or counters """
+        if cache.mode == 'numpy':
+            if not isinstance(rowid, six.integer_types + (np.integer,)):
+                return default
+            pos, found = cache._numpy_lookup(np.array([rowid], dtype=np.int64))
+            if found[0]:
+                return cache._vals[pos[0]].item()
+            entry = cache._log.get(int(rowid), None)
+            return default if entry is None else entry[0]
+        return cache._odict.get(rowid, default)
+
+    def __contains__(cache, rowid):
+        return cache.get(rowid, None) is not None
+
+    def __getitem__(cache, rowid):
+        val = cache.get(rowid, None)
+        if val is None:
+            raise KeyError(rowid)
+        return val
+
+    def __setitem__(cache, rowid, val):
+        cache.update_rows([rowid], [val])
+
+    def __delitem__(cache, rowid):
+        if rowid not in cache:
+            raise KeyError(rowid)
+        cache.delete_rows([rowid])
+
+
+class _ColumnConfigCaches(dict):
+    """ kwargs_hash -> RowCache for one column """
+    def __init__(self, table):
+        super(_ColumnConfigCaches, self).__init__()
+        self.table = table
+
+    def __missing__(self, kwargs_hash):
+        cache = self[kwargs_hash] = RowCache(self.table)
+        return cache
+
+
+class TableColumnCache(dict):
+    """ colname -> kwargs_hash -> RowCache for one table with its budget """
+    def __init__(self, parent, max_bytes):
+        super(TableColumnCache, self).__init__()
+        self.parent = parent
+        self.max_bytes = max_bytes
+
+    def __missing__(self, colname):
+        configs = self[colname] = _ColumnConfigCaches(self)
+        return configs
+
+    def _next_tick(self):
+        return self.parent._next_tick()
+
+    def iter_row_caches(self):
+        for colname, configs in self.items():
+            for kwargs_hash, cache in configs.items():
+                yield colname, kwargs_hash, cache
+
+    @property
+    def nbytes(self):
+        return sum(cache.nbytes for _, _, cache in self.iter_row_caches())
+
+    def enforce_budget(self, current=None):
+        """
+        Evicts from the least recently used caches of this table until it
+        fits its budget with EVICT_FRACTION of the budget to spare. The cache
+        that was just written is evicted from last.
+        """
+        excess = self.nbytes - self.max_bytes
+        if excess <= 0:
+            return
+        excess += int(self.max_bytes * EVICT_FRACTION)
+        caches = sorted((cache for _, _, cache in self.iter_row_caches()
+                         if len(cache) > 0),
+                        key=lambda c: (c is current, c.last_used))
+        for cache in caches:
+            before = cache.nbytes
+            cache.evict(excess)
+            excess -= before - cache.nbytes
+            if excess <= 0:
+                break
+
+
+class TableCache(dict):
+    r"""
+    tblname -> colname -> kwargs_hash -> RowCache
+
+    Args:
+        max_bytes (int): default memory budget of each table
+
+    CommandLine:
+        python -m ibeis.control.table_cache TableCache
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.control.table_cache import *  # NOQA
+        >>> table_cache = TableCache()
+        >>> assert not table_cache
+        >>> table_cache.set_budget('names', 2000)
+        >>> texts = table_cache['names']['name_text'][None]
+        >>> uuids = table_cache['names']['name_uuid'][None]
+        >>> texts.update_rows(list(range(10)), ['name%d' % x for x in range(10)])
+        >>> uuids.update_rows(list(range(10)), [str(x) * 40 for x in range(10)])
+        >>> assert table_cache['names'].nbytes <= 2000
+        >>> # The older cache is evicted from first
+        >>> assert len(texts) < 10 and len(uuids) > 0
+        >>> print(table_cache.get_stats_str())
+    """
+
+    def __init__(self, max_bytes=None):
+        super(TableCache, self).__init__()
+        if max_bytes is None:
+            max_bytes = int(TABLE_CACHE_MB * 2 ** 20)
+        self.max_bytes = max_bytes
+        self._budgets = {}
+        self._tick = 0
+
+    def __missing__(self, tblname):
+        max_bytes = self._budgets.get(tblname, self.max_bytes)
+        table = self[tblname] = TableColumnCache(self, max_bytes)
+        return table
+
+    def _next_tick(self):
+        self._tick += 1
+        return self._tick
+
+    def set_budget(self, tblname, max_bytes):
+        """ sets the memory budget of a table (in bytes) """
+        self._budgets[tblname] = max_bytes
+        if tblname in self:
+            self[tblname].max_bytes = max_bytes
+            self[tblname].enforce_budget()
+
+    def get_stats(self):
+        stats = ut.odict()
+        for tblname, table in sorted(self.items()):
+            for colname, configs in sorted(table.items()):
+                caches = list(configs.values())
+                stats[(tblname, colname)] = ut.odict([
+                    ('len', sum(map(len, caches))),
+                    ('nbytes', sum(c.nbytes for c in caches)),
+                    ('hits', sum(c.hits for c in caches)),
+                    ('misses', sum(c.misses for c in caches)),
+                    ('evictions', sum(c.evictions for c in caches)),
+                ])
+        return stats
+
+    def get_stats_str(self):
+        lines = []
+        for (tblname, colname), info in self.get_stats().items():
+            lines.append(
+                '%s.%s: n=%d, %s, hits=%d, misses=%d, evictions=%d' % (
+                    tblname, colname, info['len'],
+                    ut.byte_str2(info['nbytes']), info['hits'],
+                    info['misses'], info['evictions']))
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    r"""
+    CommandLine:
+        python -m ibeis.control.table_cache
+        python -m ibeis.control.table_cache --allexamples
+    """
+    import multiprocessing
+    multiprocessing.freeze_support()  # for win32
+    import utool as ut  # NOQA
+    ut.doctest_funcs()
@@ -54,6 +54,7 @@ import utool as ut
 import vtool_ibeis as vt
 import numpy as np
 import cv2
+from os.path import basename
 from ibeis.control.controller_inject import register_preprocs, register_subprops
 from ibeis.algo.hots.chip_match import ChipMatch
 from ibeis.algo.hots import neighbor_index
@@ -345,14 +346,31 @@ def compute_chip(depc, aid_list, config=None):
     bbox_list = ibs.get_annot_bboxes(aid_list)
     theta_list = ibs.get_annot_thetas(aid_list)
 
+    fused = getattr(ibs, '_fused_feats', None)
+    hesaff_params = None if fused is None else fused.chip_hesaff_params(config)
+
     result_list = gen_chip_configure_and_compute(ibs, gid_list, aid_list,
-                                                 bbox_list, theta_list, config)
-    for result in result_list:
-        yield result
+                                                 bbox_list, theta_list, config,
+                                                 hesaff_params=hesaff_params)
+    if hesaff_params is None:
+        for result in result_list:
+            yield result
+    else:
+        # Keep the features until compute_feats asks for these chips
+        chip_fnames = depc['chips'].get_extern_fnames(
+            [(aid,) for aid in aid_list], config)
+        for chip_fname, result in zip(chip_fnames, result_list):
+            fused.stash([chip_fname], [result[4]])
+            yield result[0:4]
     print('Done Preprocessing Chips')
 
 
-def gen_chip_configure_and_compute(ibs, gid_list, rowid_list, bbox_list, theta_list, config):
+def gen_chip_configure_and_compute(ibs, gid_list, rowid_list, bbox_list, theta_list, config,
+                                   hesaff_params=None):
+    """
+    Yields (chipBGR, width, height, M) for each annotation. If hesaff_params
+    is given, the features detected in each chip are appended to its tuple.
+    """
     #ext = config['ext']
     pad = config['pad']
     dim_size = config['dim_size']
@@ -438,48 +456,43 @@ def gen_chip_configure_and_compute(ibs, gid_list, rowid_list, bbox_list, theta_l
                 'clipLimit': config['adapteq_limit'],
             })
         )
-    ipreproc = image_filters.IntensityPreproc()
-
     warpkw = dict(flags=cv2.INTER_LANCZOS4, borderMode=cv2.BORDER_CONSTANT)
 
     _parallel_chips = getattr(ibs, '_parallel_chips', True)
 
+    # Chips are computed one image at a time so each image is decoded once,
+    # even when the annotations of an image are not adjacent
+    groupxs = group_indices_by_image(gid_list)
+    unique_gids = [gid_list[idxs[0]] for idxs in groupxs]
     if _parallel_chips:
-        gpath_list = ibs.get_image_paths(gid_list)
-        orient_list = ibs.get_image_orientation(gid_list)
-        args_gen = zip(gpath_list, orient_list, M_list, newsize_list)
-
-        gen_kw = {'filter_list': filter_list, 'warpkw': warpkw}
-        gen = ut.generate2(gen_chip_worker, args_gen, gen_kw, nTasks=len(gpath_list),
-                           force_serial=ibs.force_serial)
-        for chipBGR, width, height, M in gen:
-            yield chipBGR, width, height, M
+        gpath_list = ibs.get_image_paths(unique_gids)
+        orient_list = ibs.get_image_orientation(unique_gids)
+        args_gen = (
+            (gpath, orient, ut.take(M_list, idxs), ut.take(newsize_list, idxs))
+            for gpath, orient, idxs in zip(gpath_list, orient_list, groupxs)
+        )
+        gen_kw = {'filter_list': filter_list, 'warpkw': warpkw,
+                  'hesaff_params': hesaff_params}
+        gen = ut.generate2(gen_chip_group_worker, args_gen, gen_kw,
+                           nTasks=len(groupxs), force_serial=ibs.force_serial)
     else:
-        #arg_iter = zip(cfpath_list, gid_list, newsize_list, M_list)
-        arg_iter = zip(gid_list, M_list, newsize_list)
-        arg_list = list(arg_iter)
-
-        last_gid = None
-        for tup in ut.ProgIter(arg_list, lbl='computing chips', bs=True):
-            # FIXME: THE GPATH SHOULD BE PASSED HERE WITH AN ORIENTATION FLAG
-            #cfpath, gid, new_size, M = tup
-            gid, M, new_size = tup
-            # Read parent image # TODO: buffer this?
-            # If the gids are sorted, no need to load the image more than once, if so
-            if gid != last_gid:
-                imgBGR = ibs.get_images(gid)
-                last_gid = gid
-            # Warp chip
-            new_size = tuple([
-                int(np.around(val))
-                for val in new_size
-            ])
-            chipBGR = cv2.warpAffine(imgBGR, M[0:2], new_size, **warpkw)
-            # Do intensity normalizations
-            if filter_list:
-                chipBGR = ipreproc.preprocess(chipBGR, filter_list)
-            width, height = vt.get_size(chipBGR)
-            yield (chipBGR, width, height, M)
+        gen = (
+            extract_image_chips(ibs.get_images(gid), ut.take(M_list, idxs),
+                                ut.take(newsize_list, idxs), filter_list,
+                                warpkw, hesaff_params)
+            for gid, idxs in zip(ut.ProgIter(unique_gids, lbl='computing chips',
+                                             bs=True), groupxs)
+        )
+    # Groups are ordered by their first annotation, so results can be
+    # yielded in input order as soon as all earlier chips are done.
+    buffered = {}
+    next_idx = 0
+    for idxs, group_results in zip(groupxs, gen):
+        buffered.update(zip(idxs, group_results))
+        while next_idx in buffered:
+            yield buffered.pop(next_idx)
+            next_idx += 1
+    assert len(buffered) == 0
 
 
 def gen_chip_worker(gpath, orient, M, new_size, filter_list, warpkw):
@@ -498,6 +511,72 @@ def gen_chip_worker(gpath, orient, M, new_size, filter_list, warpkw):
     return (chipBGR, width, height, M)
 
 
+def gen_chip_group_worker(gpath, orient, M_list, new_size_list, filter_list,
+                          warpkw, hesaff_params=None):
+    """
+    Decodes an image once and extracts all of its requested chips (see
+    extract_image_chips).
+    """
+    imgBGR = vt.imread(gpath, orient=orient)
+    return extract_image_chips(imgBGR, M_list, new_size_list, filter_list,
+                               warpkw, hesaff_params)
+
+
+def extract_image_chips(imgBGR, M_list, new_size_list, filter_list, warpkw,
+                        hesaff_params=None):
+    """
+    Returns:
+        list: a (chipBGR, width, height, M) tuple for each transform of the
+            decoded image. If hesaff_params is given the tuples end with the
+            chip features.
+    """
+    ipreproc = image_filters.IntensityPreproc() if filter_list else None
+    result_list = []
+    for M, new_size in zip(M_list, new_size_list):
+        # Warp chip
+        new_size = tuple([
+            int(np.around(val))
+            for val in new_size
+        ])
+        chipBGR = cv2.warpAffine(imgBGR, M[0:2], new_size, **warpkw)
+        # Do intensity normalizations
+        if filter_list:
+            chipBGR = ipreproc.preprocess(chipBGR, filter_list)
+        width, height = vt.get_size(chipBGR)
+        if hesaff_params is None:
+            result_list.append((chipBGR, width, height, M))
+        else:
+            feat = detect_chip_feats(chipBGR, None, hesaff_params)
+            result_list.append((chipBGR, width, height, M, feat))
+    return result_list
+
+
+def group_indices_by_image(gid_list):
+    """
+    Groups the indices of annotations that share a parent image. Groups are
+    ordered by their first index.
+
+    CommandLine:
+        python -m ibeis.core_annots group_indices_by_image
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.core_annots import *  # NOQA
+        >>> gid_list = [3, 1, 3, 2, 1, 3]
+        >>> groupxs = group_indices_by_image(gid_list)
+        >>> result = ('groupxs = %r' % (groupxs,))
+        >>> print(result)
+        groupxs = [[0, 2, 5], [1, 4], [3]]
+    """
+    gid_to_idxs = ut.odict()
+    for idx, gid in enumerate(gid_list):
+        if gid not in gid_to_idxs:
+            gid_to_idxs[gid] = []
+        gid_to_idxs[gid].append(idx)
+    groupxs = list(gid_to_idxs.values())
+    return groupxs
+
+
 @register_subprop('chips', 'dlen_sqrd')
 def compute_dlen_sqrd(depc, aid_list, config=None):
     size_list = np.array(
@@ -1095,6 +1174,14 @@ def compute_feats(depc, cid_list, config=None):
             print('full_params = ' + ut.repr2())
 
     ibs = depc.controller
+    fused = getattr(ibs, '_fused_feats', None)
+    if feat_type == 'hesaff+sift' and fused is not None and maskmethod is None:
+        # Use features detected while the chips were computed
+        chip_fpath_list = list(chip_fpath_list)
+        fused_feats = fused.pop_feats(chip_fpath_list, hesaff_params)
+    else:
+        fused_feats = [None] * nInput
+
     if feat_type == 'hesaff+sift':
         # Multiprocessing parallelization
         dictargs_iter = (hesaff_params for _ in range(nInput))
@@ -1102,10 +1189,18 @@ def compute_feats(depc, cid_list, config=None):
         # eager evaluation.
         # TODO: Check if there is any benefit to just passing in the iterator.
         arg_list = list(arg_iter)
-        featgen = ut.generate2(
-            gen_feat_worker, arg_list, nTasks=nInput, ordered=True,
-            force_serial=ibs.force_serial, progkw={'freq': 1}
-        )
+        missing_idxs = [idx for idx, feat in enumerate(fused_feats)
+                        if feat is None]
+        if len(missing_idxs) > 0:
+            missing_gen = ut.generate2(
+                gen_feat_worker, ut.take(arg_list, missing_idxs),
+                nTasks=len(missing_idxs), ordered=True,
+                force_serial=ibs.force_serial, progkw={'freq': 1}
+            )
+        else:
+            missing_gen = iter([])
+        featgen = (next(missing_gen) if feat is None else feat
+                   for feat in fused_feats)
     elif feat_type == 'hesaff+siam128':
         from ibeis_cnn import _plugin
         assert maskmethod is None, 'not implemented'
@@ -1147,9 +1242,11 @@ def gen_feat_worker(chip_fpath, probchip_fpath, hesaff_params):
         >>> maskmethod = ut.get_argval('--maskmethod', type_=str, default='cnn')
         >>> probchip_fpath = ibs.depc_annot.get('probchip', aid_list[0], 'img', config=config, read_extern=False) if feat_config['maskmethod'] == 'cnn' else None
         >>> hesaff_params = feat_config.asdict()
+        >>> chip = vt.imread(chip_fpath)
+        >>> probchip = None if probchip_fpath is None else vt.imread(probchip_fpath, grayscale=True)
         >>> # Exec function source
         >>> masked_chip, num_kpts, kpts, vecs = ut.exec_func_src(
-        >>>     gen_feat_worker, key_list=['masked_chip', 'num_kpts', 'kpts', 'vecs'],
+        >>>     detect_chip_feats, key_list=['masked_chip', 'num_kpts', 'kpts', 'vecs'],
         >>>     sentinal='num_kpts = kpts.shape[0]')
         >>> result = ('(num_kpts, kpts, vecs) = %s' % (ut.repr2((num_kpts, kpts, vecs)),))
         >>> print(result)
@@ -1162,10 +1259,24 @@ def gen_feat_worker(chip_fpath, probchip_fpath, hesaff_params):
         >>> interact.start()
         >>> ut.show_if_requested()
     """
-    import pyhesaff
     chip = vt.imread(chip_fpath)
     if probchip_fpath is not None:
         probchip = vt.imread(probchip_fpath, grayscale=True)
+    else:
+        probchip = None
+    return detect_chip_feats(chip, probchip, hesaff_params)
+
+
+def detect_chip_feats(chip, probchip, hesaff_params):
+    """
+    Detects features in an in-memory chip, optionally masked by a grayscale
+    probchip.
+
+    Returns:
+        tuple: (num_kpts, kpts, vecs)
+    """
+    import pyhesaff
+    if probchip is not None:
         probchip = vt.resize_mask(probchip, chip)
         #vt.blend_images_multiply(chip, probchip)
         masked_chip = (
@@ -1177,6 +1288,78 @@ def gen_feat_worker(chip_fpath, probchip_fpath, hesaff_params):
     return (num_kpts, kpts, vecs)
 
 
+class FusedChipFeatures(object):
+    r"""
+    Context in which chip computation also detects the features of each chip
+    while it is still in memory. compute_feats then uses these features
+    instead of reading the freshly written chips back from disk.
+
+    Only hesaff+sift features of unmasked chips stored in a lossless format
+    are fused. Everything else is computed as usual.
+
+    Args:
+        ibs (IBEISController):  ibeis controller object
+        config (dict): config of the requested features (default = None)
+
+    CommandLine:
+        python -m ibeis.core_annots FusedChipFeatures
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from ibeis.core_annots import *  # NOQA
+        >>> ibs, depc, aid_list = testdata_core(size=4)
+        >>> config = {'dim_size': 450}
+        >>> depc.delete_property('chips', aid_list, config=config)
+        >>> with FusedChipFeatures(ibs, config) as fused:
+        >>>     vecs1 = depc.get('feat', aid_list, 'vecs', config=config)
+        >>>     assert len(fused._chip_feats) == 0
+        >>> depc.delete_property('feat', aid_list, config=config)
+        >>> vecs2 = depc.get('feat', aid_list, 'vecs', config=config)
+        >>> assert all(np.all(v1 == v2) for v1, v2 in zip(vecs1, vecs2))
+    """
+
+    def __init__(fused, ibs, config=None):
+        feat_config = FeatConfig()
+        if config is not None:
+            feat_config.update(**config)
+        fused.ibs = ibs
+        fused.enabled = (feat_config['feat_type'] == 'hesaff+sift' and
+                         feat_config['maskmethod'] is None)
+        fused.hesaff_params = feat_config.get_hesaff_params()
+        # Maps chip extern filenames to their detected features
+        fused._chip_feats = {}
+        fused._prev = None
+
+    def __enter__(fused):
+        fused._prev = getattr(fused.ibs, '_fused_feats', None)
+        fused.ibs._fused_feats = fused
+        return fused
+
+    def __exit__(fused, type_, value, trace):
+        fused.ibs._fused_feats = fused._prev
+        fused._chip_feats.clear()
+
+    def chip_hesaff_params(fused, chip_config):
+        """ params to detect with while computing chips, or None """
+        # Lossy chips would not decode to the chips the features came from
+        if fused.enabled and chip_config['ext'] == '.png':
+            return fused.hesaff_params
+        return None
+
+    def stash(fused, chip_fnames, feat_list):
+        fused._chip_feats.update(zip(chip_fnames, feat_list))
+
+    def pop_feats(fused, chip_fpath_list, hesaff_params):
+        """
+        Returns:
+            list: stashed features of each chip or None if there are none
+        """
+        if hesaff_params != fused.hesaff_params:
+            return [None] * len(chip_fpath_list)
+        return [fused._chip_feats.pop(basename(fpath), None)
+                for fpath in chip_fpath_list]
+
+
 class FeatWeightConfig(dtool_ibeis.Config):
     _param_info_list = [
         ut.ParamInfo('featweight_enabled', True, 'enabled='),
@@ -1329,6 +1512,11 @@ class VsOneConfig(dtool_ibeis.Config):
     ]
 
 
+# Smallest number of edges in a chunk before vsone matching uses processes
+VSONE_MIN_PARALLEL = ut.get_argval('--vsone-min-parallel', type_=int,
+                                   default=128)
+
+
 @derived_attribute(
     tablename='pairwise_match', parents=['annotations', 'annotations'],
     colnames=['match'], coltypes=[vt.PairwiseMatch],
@@ -1362,6 +1550,15 @@ def compute_pairwise_vsone(depc, qaids, daids, config):
     configured_lazy_annots = make_configured_annots(
         ibs, qaids, daids, qannot_cfg, dannot_cfg, preload=True)
 
+    nprocs = 1 if ibs.force_serial else ut.get_default_numprocs()
+    if nprocs > 1 and len(qaids) >= VSONE_MIN_PARALLEL:
+        lazy_annots = configured_lazy_annots[config]
+        match_list = _parallel_pairwise_vsone(lazy_annots, qaids, daids,
+                                              config, nprocs)
+        for match in match_list:
+            yield (match,)
+        return
+
     unique_lazy_annots = ut.flatten(
         [x.values() for x in configured_lazy_annots.values()])
 
@@ -1383,6 +1580,105 @@ def compute_pairwise_vsone(depc, qaids, daids, config):
         yield (match,)
 
 
+def _vsone_worker_annot(data):
+    """ rebuilds a matchable annotation from its preloaded feature data """
+    annot = ut.LazyDict(data)
+    flann_params = {'algorithm': 'kdtree', 'trees': 4}
+    vt.matching.ensure_metadata_flann(annot, flann_params)
+    vt.matching.ensure_metadata_normxy(annot)
+    return annot
+
+
+def _vsone_group_worker(annot_data, edges, config):
+    """
+    Matches a group of edges in a worker process. Each annotation in the group
+    is unpacked and gets its flann index built once.
+    """
+    annots = {aid: _vsone_worker_annot(data)
+              for aid, data in annot_data.items()}
+    match_list = []
+    for qaid, daid in edges:
+        match = vt.PairwiseMatch(annots[qaid], annots[daid])
+        match.apply_all(config)
+        match_list.append(match)
+    return match_list
+
+
+def _group_vsone_edges(qaids, max_size):
+    """
+    Splits edges into groups of at most max_size edges. Edges with the same
+    query annotation are kept together, so the data of a query annot is sent
+    to as few workers as possible.
+
+    Returns:
+        list: edge indices of each group
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.core_annots import *  # NOQA
+        >>> qaids = [1, 2, 1, 3, 1, 2]
+        >>> result = _group_vsone_edges(qaids, max_size=2)
+        >>> print(result)
+        [[0, 2], [4], [1, 5], [3]]
+    """
+    unique_qaids, groupxs = ut.group_indices(qaids)
+    groups = []
+    current = []
+    for idxs in groupxs:
+        for chunk in ut.ichunks(idxs, max_size):
+            if len(current) + len(chunk) > max_size:
+                groups.append(current)
+                current = []
+            current.extend(chunk)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _parallel_pairwise_vsone(lazy_annots, qaids, daids, config, nprocs):
+    """
+    Runs one-vs-one matching in a process pool. Only the feature data needed
+    by the edges of a group is sent to the worker that matches the group.
+    """
+    weight_key = config['weight']
+    cfgdict = config.asdict()
+
+    def _annot_data(aid):
+        annot = lazy_annots[aid]
+        width, height = annot['chip_size']
+        data = {
+            'aid': aid,
+            'kpts': annot['kpts'],
+            'vecs': annot['vecs'],
+            'chip_size': annot['chip_size'],
+            'dlen_sqrd': width ** 2 + height ** 2,
+        }
+        if weight_key is not None:
+            data[weight_key] = annot[weight_key]
+        return data
+
+    # Several groups per process balance the load when group sizes differ
+    max_size = max(1, int(np.ceil(len(qaids) / (nprocs * 4))))
+    groups = _group_vsone_edges(qaids, max_size)
+    unique_data = {aid: _annot_data(aid) for aid in set(qaids) | set(daids)}
+
+    def _gen_args():
+        for idxs in groups:
+            edges = list(zip(ut.take(qaids, idxs), ut.take(daids, idxs)))
+            annot_data = {aid: unique_data[aid]
+                          for aid in set(ut.flatten(edges))}
+            yield annot_data, edges, cfgdict
+
+    match_list = [None] * len(qaids)
+    group_results = ut.generate2(
+        _vsone_group_worker, _gen_args(), nTasks=len(groups), ordered=True,
+        nprocs=nprocs, progkw={'lbl': 'compute vsone (parallel)', 'freq': 1})
+    for idxs, group_matches in zip(groups, group_results):
+        for idx, match in zip(idxs, group_matches):
+            match_list[idx] = match
+    return match_list
+
+
 def make_configured_annots(ibs, qaids, daids, qannot_cfg, dannot_cfg,
                            preload=False, return_view_cache=False):
     """
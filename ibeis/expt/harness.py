@@ -219,7 +219,7 @@ def make_single_testres(ibs, qaids, daids, pipecfg_list, cfgx2_lbl,
                         # Clear features to preserve memory
                         ibs.clear_table_cache()
                         #qreq_.ibs.print_cachestats_str()
-                cm_list = qreq_.execute()
+                cm_list = qreq_.execute(lazy=True)
                 cmsinfo = test_result.build_cmsinfo(cm_list, qreq_)
                 # record previous feature configuration
                 if ibs.table_cache:
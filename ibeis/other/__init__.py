@@ -9,6 +9,7 @@ from ibeis.other import detectcore
 from ibeis.other import detectfuncs
 from ibeis.other import detecttrain
 from ibeis.other import ibsfuncs
+from ibeis.other import process_memory
 import utool
 print, rrr, profile = utool.inject2(__name__, '[ibeis.other]')
 
@@ -85,6 +86,7 @@ IMPORT_TUPLES = [
     ('detectgrave', None),
     ('detecttrain', None),
     ('ibsfuncs', None),
+    ('process_memory', None),
 ]
 """
 Regen Command:
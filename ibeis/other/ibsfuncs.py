@@ -150,9 +150,29 @@ def compute_all_chips(ibs, aid_list=None, **kwargs):
     return cid_list
 
 
+@register_ibs_method
+def compute_fused_chip_feats(ibs, aid_list, config2_=None, blocksize=256):
+    """
+    Computes chips and features together. Features are detected while each
+    chip is in memory instead of being read back from the written chip.
+    Annotations are processed in blocks to bound the features held in memory.
+    """
+    from ibeis import core_annots
+    fid_list = []
+    with core_annots.FusedChipFeatures(ibs, config2_):
+        chunk_iter = ut.ProgChunks(aid_list, blocksize,
+                                   lbl='[ibs] fused chips+feats')
+        for aids in chunk_iter:
+            fid_list.extend(ibs.depc_annot.get_rowids('feat', aids,
+                                                      config=config2_))
+    return fid_list
+
+
 @register_ibs_method
 def ensure_annotation_data(ibs, aid_list, chips=True, feats=True,
-                           featweights=False):
+                           featweights=False, fused=False):
+    if fused and (feats or featweights):
+        ibs.compute_fused_chip_feats(aid_list)
     if featweights:
         ibs.depc_annot.get_rowids('featweight', aid_list)
     elif feats:
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Resident memory of the current process
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import os
+import sys
+import utool as ut
+(print, rrr, profile) = ut.inject2(__name__)
+
+
+def get_peak_rss():
+    """
+    high-water mark of the resident memory of this process over its whole
+    lifetime in bytes (None if unknown)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        # linux reports kilobytes
+        peak *= 1024
+    return peak
+
+
+def get_current_rss():
+    """ current resident memory of this process in bytes (None if unknown) """
+    try:
+        import psutil
+    except ImportError:
+        pass
+    else:
+        return psutil.Process(os.getpid()).memory_info().rss
+    try:
+        with open('/proc/self/statm') as file_:
+            num_pages = int(file_.read().split()[1])
+    except (IOError, ValueError, IndexError):
+        return None
+    return num_pages * os.sysconf('SC_PAGE_SIZE')
+
+
+if __name__ == '__main__':
+    r"""
+    CommandLine:
+        python -m ibeis.other.process_memory
+        python -m ibeis.other.process_memory --allexamples
+    """
+    import multiprocessing
+    multiprocessing.freeze_support()  # for win32
+    import utool as ut  # NOQA
+    ut.doctest_funcs()
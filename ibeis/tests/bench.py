@@ -0,0 +1,141 @@
+import utool as ut
+
+
+def testdata_survey_images(dpath, num_images=8, annots_per_image=30,
+                           dsize=(4000, 3000), seed=0):
+    """
+    Writes random JPEG images with many small annotations each, similar to
+    aerial survey imagery.
+
+    Returns:
+        tuple: (gpath_list, gid_list, bbox_list) with one gid and bbox per
+            annotation. Annotations of an image are interleaved with other
+            images to exercise the reordering of results.
+    """
+    import numpy as np
+    import vtool_ibeis as vt
+    from os.path import join
+    rng = np.random.RandomState(seed)
+    ut.ensuredir(dpath)
+    width, height = dsize
+    gpath_list = []
+    for gx in range(num_images):
+        # Low-frequency noise keeps the jpeg size realistic
+        small = rng.randint(0, 255, (height // 16, width // 16, 3))
+        imgBGR = vt.resize(small.astype(np.uint8), dsize)
+        gpath = join(dpath, 'survey_%03d.jpg' % (gx,))
+        vt.imwrite(gpath, imgBGR)
+        gpath_list.append(gpath)
+    gid_list = []
+    bbox_list = []
+    for gx in range(num_images):
+        for _ in range(annots_per_image):
+            w, h = rng.randint(50, 400, size=2)
+            x = rng.randint(0, width - w)
+            y = rng.randint(0, height - h)
+            gid_list.append(gx)
+            bbox_list.append((x, y, w, h))
+    sortx = rng.permutation(len(gid_list))
+    gid_list = ut.take(gid_list, sortx)
+    bbox_list = ut.take(bbox_list, sortx)
+    return gpath_list, gid_list, bbox_list
+
+
+def benchmark_chips():
+    r"""
+    Compares per-annotation chip tasks (each decoding its parent image) to
+    per-image chip tasks on a set of images with many annotations.
+
+    CommandLine:
+        python ~/code/ibeis/ibeis/tests/bench.py benchmark_chips
+        python ~/code/ibeis/ibeis/tests/bench.py benchmark_chips --num-images=20 --annots-per-image=50
+        python ~/code/ibeis/ibeis/tests/bench.py benchmark_chips --serial
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from bench import *  # NOQA
+        >>> result = benchmark_chips()
+        >>> print(result)
+    """
+    import numpy as np
+    import cv2
+    import vtool_ibeis as vt
+    from ibeis import core_annots
+    num_images = ut.get_argval('--num-images', type_=int, default=8)
+    annots_per_image = ut.get_argval('--annots-per-image', type_=int,
+                                     default=30)
+    force_serial = ut.get_argflag('--serial')
+    n = ut.get_argval('--n', type_=int, default=3)
+
+    dpath = ut.ensure_app_resource_dir('ibeis', 'bench_chips')
+    gpath_list, gid_list, bbox_list = testdata_survey_images(
+        dpath, num_images, annots_per_image)
+
+    dim_size = 700
+    newsize_list = [vt.ScaleStrat.maxwh(dim_size, bbox[2:4], 0)
+                    for bbox in bbox_list]
+    M_list = [vt.get_image_to_chip_transform(bbox, new_size, 0)
+              for bbox, new_size in zip(bbox_list, newsize_list)]
+    gen_kw = {'filter_list': [],
+              'warpkw': dict(flags=cv2.INTER_LANCZOS4,
+                             borderMode=cv2.BORDER_CONSTANT)}
+
+    def per_annot():
+        args_gen = zip(ut.take(gpath_list, gid_list), [None] * len(gid_list),
+                       M_list, newsize_list)
+        return list(ut.generate2(
+            core_annots.gen_chip_worker, args_gen, gen_kw,
+            nTasks=len(gid_list), force_serial=force_serial, verbose=False))
+
+    def per_image():
+        groupxs = core_annots.group_indices_by_image(gid_list)
+        args_gen = [
+            (gpath_list[gid_list[idxs[0]]], None, ut.take(M_list, idxs),
+             ut.take(newsize_list, idxs))
+            for idxs in groupxs
+        ]
+        gen = ut.generate2(core_annots.gen_chip_group_worker, args_gen,
+                           gen_kw, nTasks=len(groupxs),
+                           force_serial=force_serial, verbose=False)
+        results = [None] * len(gid_list)
+        for idxs, group_results in zip(groupxs, gen):
+            for idx, result in zip(idxs, group_results):
+                results[idx] = result
+        return results
+
+    results = ut.odict()
+
+    def _bench(key, func):
+        t = ut.Timerit(n, label=key, verbose=0)
+        for timer in t:
+            with timer:
+                out = func()
+        results[key] = t.min()
+        return out
+
+    chips1 = _bench('per-annot', per_annot)
+    chips2 = _bench('per-image', per_image)
+    for tup1, tup2 in zip(chips1, chips2):
+        assert np.all(tup1[0] == tup2[0]), 'chips differ'
+        assert tup1[1:3] == tup2[1:3], 'chip sizes differ'
+
+    lines = ['nImages=%d, nAnnots=%d, serial=%r' % (
+        len(gpath_list), len(gid_list), force_serial)]
+    for key, secs in results.items():
+        lines.append('%10s: %8.4fs  %10.1f chips/s' % (
+            key, secs, len(gid_list) / secs))
+    result = '\n'.join(lines)
+    return result
+
+
+if __name__ == '__main__':
+    r"""
+    CommandLine:
+        export PYTHONPATH=$PYTHONPATH:/home/joncrall/code/ibeis/ibeis/tests
+        python ~/code/ibeis/ibeis/tests/bench.py
+        python ~/code/ibeis/ibeis/tests/bench.py --allexamples
+    """
+    import multiprocessing
+    multiprocessing.freeze_support()  # for win32
+    import utool as ut  # NOQA
+    ut.doctest_funcs()
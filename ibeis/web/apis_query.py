@@ -119,6 +119,32 @@ def query_chips_simple_dict(ibs, *args, **kwargs):
     return ibs.query_chips(*args, **kwargs)
 
 
+@register_ibs_method
+def query_chips_simple_dict_batch(ibs, qaids_list, daid_list, cfgdict=None):
+    """
+    Runs the queries of several query_chips_simple_dict jobs that share a
+    database and config as a single query request.
+
+    Args:
+        qaids_list (list): the qaid_list (or qaid) of each job
+        daid_list (list): database annotations shared by all jobs
+        cfgdict (dict): config shared by all jobs
+
+    Returns:
+        list: the query_chips_simple_dict result of each job
+    """
+    all_qaids = ut.unique(ut.flatten(
+        [ut.wrap_iterable(qaids)[0] for qaids in qaids_list]))
+    cm_list = ibs.query_chips_simple_dict(all_qaids, daid_list, cfgdict)
+    qaid2_cm = {cm['qaid']: cm for cm in cm_list}
+    result_list = []
+    for qaids in qaids_list:
+        qaids_, was_scalar = ut.wrap_iterable(qaids)
+        result = ut.take(qaid2_cm, qaids_)
+        result_list.append(result[0] if was_scalar else result)
+    return result_list
+
+
 @register_ibs_method
 @register_api('/api/query/chip/dict/', methods=['GET'])
 def query_chips_dict(ibs, *args, **kwargs):
@@ -571,6 +597,53 @@ def query_chips_test(ibs, **kwargs):
 @register_api('/api/query/graph/', methods=['GET', 'POST'])
 def query_chips_graph(ibs, qaid_list, daid_list, user_feedback=None,
                       query_config_dict={}, echo_query_params=True):
+    cm_list, qreq_ = ibs.query_chips(qaid_list=qaid_list, daid_list=daid_list,
+                                     cfgdict=query_config_dict, return_request=True)
+    result_dict = _make_query_chips_graph_result(
+        ibs, qreq_, cm_list, qaid_list, daid_list, user_feedback,
+        query_config_dict, echo_query_params)
+    return result_dict
+
+
+@register_ibs_method
+def query_chips_graph_batch(ibs, qaids_list, daid_list, user_feedback_list,
+                            query_config_dict={}, echo_query_params_list=None):
+    """
+    Runs the queries of several query_chips_graph jobs that share a database
+    and config as a single query request. The inference of each job only
+    uses its own queries and feedback.
+
+    Args:
+        qaids_list (list): the qaid_list of each job
+        daid_list (list): database annotations shared by all jobs
+        user_feedback_list (list): the user_feedback of each job
+        query_config_dict (dict): config shared by all jobs
+        echo_query_params_list (list): the echo_query_params of each job
+
+    Returns:
+        list: the query_chips_graph result of each job
+    """
+    if echo_query_params_list is None:
+        echo_query_params_list = [True] * len(qaids_list)
+    all_qaids = ut.unique(ut.flatten(qaids_list))
+    cm_list, qreq_ = ibs.query_chips(qaid_list=all_qaids, daid_list=daid_list,
+                                     cfgdict=query_config_dict, return_request=True)
+    qaid2_cm = {cm.qaid: cm for cm in cm_list}
+    result_list = []
+    _iter = zip(qaids_list, user_feedback_list, echo_query_params_list)
+    for qaid_list, user_feedback, echo_query_params in _iter:
+        job_qreq_ = qreq_.shallowcopy(qaids=qaid_list)
+        job_cm_list = ut.take(qaid2_cm, qaid_list)
+        result_dict = _make_query_chips_graph_result(
+            ibs, job_qreq_, job_cm_list, qaid_list, daid_list, user_feedback,
+            query_config_dict, echo_query_params)
+        result_list.append(result_dict)
+    return result_list
+
+
+def _make_query_chips_graph_result(ibs, qreq_, cm_list, qaid_list, daid_list,
+                                   user_feedback, query_config_dict,
+                                   echo_query_params):
     from ibeis.unstable.orig_graph_iden import OrigAnnotInference
     import theano  # NOQA
     import uuid
@@ -583,8 +656,6 @@ def query_chips_graph(ibs, qaid_list, daid_list, user_feedback=None,
             uuid_ = nid
         return uuid_
 
-    cm_list, qreq_ = ibs.query_chips(qaid_list=qaid_list, daid_list=daid_list,
-                                     cfgdict=query_config_dict, return_request=True)
     cm_dict = {
         str(ibs.get_annot_uuids(cm.qaid)): {
             # 'qaid'                  : cm.qaid,
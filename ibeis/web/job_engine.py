@@ -61,6 +61,7 @@ import uuid  # NOQA
 import numpy as np
 import shelve
 import random
+import collections
 from os.path import join
 from functools import partial
 from ibeis.control import controller_inject
@@ -78,6 +79,25 @@ URL = 'tcp://127.0.0.1'
 NUM_ENGINES = 1
 VERBOSE_JOBS = ut.get_argflag('--bg') or ut.get_argflag('--fg') or ut.get_argflag('--verbose-jobs')
 
+# Identification jobs already waiting in the engine queue are always batched.
+# The engine additionally waits this many seconds for more compatible jobs,
+# trading the latency of the first job for throughput.
+ENGINE_BATCH_WINDOW = ut.get_argval('--engine-batch-window', type_=float, default=0.0)
+ENGINE_BATCH_MAX = ut.get_argval('--engine-batch-max', type_=int, default=32)
+
+# Identification actions whose jobs can share one query request, mapped to
+# the ibs function that runs a batch of them and to the action's arguments
+# with their defaults
+COALESCE_ACTIONS = {
+    'query_chips_simple_dict': ('query_chips_simple_dict_batch', [
+        ('qaid_list', ut.NoParam), ('daid_list', ut.NoParam),
+        ('cfgdict', None)]),
+    'query_chips_graph': ('query_chips_graph_batch', [
+        ('qaid_list', ut.NoParam), ('daid_list', ut.NoParam),
+        ('user_feedback', None), ('query_config_dict', {}),
+        ('echo_query_params', True)]),
+}
+
 
 def update_proctitle(procname):
     try:
@@ -324,15 +344,16 @@ def job_engine_tester():
         jobiface.wait_for_job_result(jobid1)
         jobid_list = []
 
-        args = ([1], [3, 4, 5])
+        # Identification jobs queued together are coalesced by the engine
         kwargs = dict(cfgdict={'K': 1})
-        identify_jobid = jobiface.queue_job('query_chips_simple_dict',
-                                            callback_url, callback_method,
-                                            *args, **kwargs)
+        for qaid in [1, 2, 3]:
+            args = ([qaid], [3, 4, 5])
+            identify_jobid = jobiface.queue_job('query_chips_simple_dict',
+                                                callback_url, callback_method,
+                                                *args, **kwargs)
+            jobid_list.append(identify_jobid)
         for jobid in jobid_list:
             jobiface.wait_for_job_result(jobid)
-
-        jobiface.wait_for_job_result(identify_jobid)
     print('FINISHED TEST SCRIPT')
 
 
@@ -795,32 +816,42 @@ def engine_loop(id_, port_dict, dbdir=None):
             print('connect collect_url1 = %r' % (port_dict['collect_url1'],))
             print('engine is initialized')
 
+        # Received (idents, engine_request) tuples that are not done yet
+        pending = collections.deque()
         try:
             while True:
-                idents, engine_request = rcv_multipart_json(engine_rout_sock, print=print)
-
-                action = engine_request['action']
-                jobid  = engine_request['jobid']
-                args   = engine_request['args']
-                kwargs = engine_request['kwargs']
-                callback_url = engine_request['callback_url']
-                callback_method = engine_request['callback_method']
-
-                engine_result = on_engine_request(ibs, jobid, action, args, kwargs)
-
-                # Store results in the collector
-                collect_request = dict(
-                    idents=idents,
-                    action='store',
-                    jobid=jobid,
-                    engine_result=engine_result,
-                    callback_url=callback_url,
-                    callback_method=callback_method,
-                )
-                if VERBOSE_JOBS:
-                    print('...done working. pushing result to collector')
-                # CALLS: collector_store
-                collect_deal_sock.send_json(collect_request)
+                if len(pending) == 0:
+                    pending.append(rcv_multipart_json(engine_rout_sock, print=print))
+                if _coalesce_key(pending[0][1]) is not None:
+                    # Collect compatible identification jobs
+                    pending.extend(_receive_waiting(
+                        engine_rout_sock, ENGINE_BATCH_WINDOW,
+                        ENGINE_BATCH_MAX - len(pending), print=print))
+                batch = _pop_engine_batch(pending, ENGINE_BATCH_MAX)
+                engine_request_list = ut.take_column(batch, 1)
+
+                if len(batch) == 1:
+                    engine_request = engine_request_list[0]
+                    engine_result_list = [on_engine_request(
+                        ibs, engine_request['jobid'], engine_request['action'],
+                        engine_request['args'], engine_request['kwargs'])]
+                else:
+                    engine_result_list = on_engine_batch(ibs, engine_request_list)
+
+                for (idents, engine_request), engine_result in zip(batch, engine_result_list):
+                    # Store results in the collector
+                    collect_request = dict(
+                        idents=idents,
+                        action='store',
+                        jobid=engine_request['jobid'],
+                        engine_result=engine_result,
+                        callback_url=engine_request['callback_url'],
+                        callback_method=engine_request['callback_method'],
+                    )
+                    if VERBOSE_JOBS:
+                        print('...done working. pushing result to collector')
+                    # CALLS: collector_store
+                    collect_deal_sock.send_json(collect_request)
         except KeyboardInterrupt:
             print('Caught ctrl+c in engine loop. Gracefully exiting')
         # ----
@@ -861,6 +892,172 @@ def on_engine_request(ibs, jobid, action, args, kwargs):
     return engine_result
 
 
+def _identify_args(engine_request):
+    """
+    Returns:
+        list: all arguments of an identification job in positional order, or
+            None if the job cannot be coalesced
+    """
+    action = engine_request['action']
+    if action not in COALESCE_ACTIONS:
+        return None
+    _, argspec = COALESCE_ACTIONS[action]
+    argnames = ut.take_column(argspec, 0)
+    args = list(engine_request['args'])
+    kwargs = engine_request['kwargs']
+    if len(args) > len(argspec) or not set(kwargs).issubset(argnames[len(args):]):
+        return None
+    for argname, default in argspec[len(args):]:
+        args.append(kwargs.get(argname, default))
+    if ut.NoParam in args:
+        return None
+    return args
+
+
+def _coalesce_key(engine_request):
+    """
+    Jobs with the same key can run as one query request
+
+    Returns:
+        tuple: (action, daids, config) or None if the job runs on its own
+
+    CommandLine:
+        python -m ibeis.web.job_engine _coalesce_key
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.web.job_engine import *  # NOQA
+        >>> request1 = dict(action='query_chips_simple_dict', kwargs={},
+        >>>                 args=[[1], [1, 2, 3], {'K': 4}])
+        >>> request2 = dict(action='query_chips_simple_dict',
+        >>>                 kwargs={'cfgdict': {'K': 4}},
+        >>>                 args=[[2, 3], [1, 2, 3]])
+        >>> request3 = dict(action='helloworld', kwargs={}, args=[])
+        >>> assert _coalesce_key(request1) == _coalesce_key(request2)
+        >>> assert _coalesce_key(request3) is None
+    """
+    args = _identify_args(engine_request)
+    if args is None:
+        return None
+    action = engine_request['action']
+    if action == 'query_chips_simple_dict':
+        _, daid_list, cfgdict = args
+    else:
+        _, daid_list, _, cfgdict, _ = args
+    # The order of the database matters to the results, so it must match
+    daids_key = None if daid_list is None else tuple(daid_list)
+    return (action, daids_key, ut.to_json(cfgdict))
+
+
+def _receive_waiting(sock, window, max_num, print=print):
+    """
+    Receives the requests that are already waiting or that arrive within
+    window seconds.
+    """
+    received = []
+    deadline = time.time() + window
+    while len(received) < max_num:
+        timeout = max(0, deadline - time.time())
+        if not sock.poll(timeout * 1000):
+            break
+        received.append(rcv_multipart_json(sock, print=print))
+    return received
+
+
+def _pop_engine_batch(pending, max_num):
+    """
+    Pops the first pending job and the compatible jobs queued after it.
+    Compatible jobs run ahead of incompatible jobs queued before them.
+
+    Args:
+        pending (deque): (idents, engine_request) tuples
+
+    Returns:
+        list: (idents, engine_request) tuples to run together
+
+    CommandLine:
+        python -m ibeis.web.job_engine _pop_engine_batch
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from ibeis.web.job_engine import *  # NOQA
+        >>> def _request(jobid, action, qaids=None, daids=None):
+        >>>     args = [] if qaids is None else [qaids, daids, {}]
+        >>>     return (None, dict(jobid=jobid, action=action, kwargs={}, args=args))
+        >>> pending = collections.deque([
+        >>>     _request('a', 'query_chips_simple_dict', [1], [1, 2]),
+        >>>     _request('b', 'helloworld'),
+        >>>     _request('c', 'query_chips_simple_dict', [2], [1, 2]),
+        >>>     _request('d', 'query_chips_simple_dict', [3], [2, 3]),
+        >>> ])
+        >>> batches = []
+        >>> while pending:
+        >>>     batch = _pop_engine_batch(pending, max_num=32)
+        >>>     batches.append([req['jobid'] for _, req in batch])
+        >>> result = ('batches = %r' % (batches,))
+        >>> print(result)
+        batches = [['a', 'c'], ['b'], ['d']]
+    """
+    head = pending.popleft()
+    key = _coalesce_key(head[1])
+    batch = [head]
+    if key is None:
+        return batch
+    remaining = []
+    while len(pending) > 0:
+        item = pending.popleft()
+        if len(batch) < max_num and _coalesce_key(item[1]) == key:
+            batch.append(item)
+        else:
+            remaining.append(item)
+    pending.extend(remaining)
+    return batch
+
+
+def on_engine_batch(ibs, engine_request_list):
+    """
+    Runs compatible identification jobs as a single query request and fans
+    the results back out to the individual jobs. If the batch fails, each job
+    is run on its own so errors are reported to the job that caused them.
+
+    Returns:
+        list: the engine result of each job
+    """
+    jobid_list = [req['jobid'] for req in engine_request_list]
+    action = engine_request_list[0]['action']
+    args_list = [_identify_args(req) for req in engine_request_list]
+    shared_args = args_list[0]
+    if VERBOSE_JOBS:
+        print('starting coalesced jobs=%r' % (jobid_list,))
+    batch_func = getattr(ibs, COALESCE_ACTIONS[action][0])
+    try:
+        if action == 'query_chips_simple_dict':
+            result_list = batch_func(ut.take_column(args_list, 0),
+                                     shared_args[1], shared_args[2])
+        else:
+            assert action == 'query_chips_graph', action
+            result_list = batch_func(ut.take_column(args_list, 0),
+                                     shared_args[1],
+                                     ut.take_column(args_list, 2),
+                                     shared_args[3],
+                                     ut.take_column(args_list, 4))
+    except Exception as ex:
+        ut.printex(ex, 'coalesced jobs failed. running them separately',
+                   keys=['jobid_list'], iswarning=True)
+        return [on_engine_request(ibs, req['jobid'], req['action'],
+                                  req['args'], req['kwargs'])
+                for req in engine_request_list]
+    engine_result_list = [
+        dict(
+            exec_status='ok',
+            json_result=ut.to_json(result),
+            jobid=jobid,
+        )
+        for jobid, result in zip(jobid_list, result_list)
+    ]
+    return engine_result_list
+
+
 def collector_loop(port_dict, dbdir, containerized):
     """
     Service that stores completed algorithm results